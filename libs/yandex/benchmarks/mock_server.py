@@ -0,0 +1,370 @@
+"""Local stand-in of Foundation Models API for offline benchmarks.
+
+Imitates completion (plain and streaming), deferred completion, tokenize, text embedding
+and operations endpoints with configurable latency, error rate and 429 injection.
+
+Run standalone::
+
+    python -m benchmarks.mock_server --port 8765 --latency lognormal:0.2:0.5 --throttle-rate 0.05
+"""
+from typing import Any, Optional
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+
+from aiohttp import web
+
+COMPLETION_PATH = "/foundationModels/v1/completion"
+COMPLETION_ASYNC_PATH = "/foundationModels/v1/completionAsync"
+TOKENIZE_PATH = "/foundationModels/v1/tokenize"
+TEXT_EMBEDDING_PATH = "/foundationModels/v1/textEmbedding"
+OPERATIONS_PATH = "/operations/{id}"
+
+EMBEDDING_DIMENSION = 256
+
+PARTIAL_STATUS = "ALTERNATIVE_STATUS_PARTIAL"
+FINAL_STATUS = "ALTERNATIVE_STATUS_FINAL"
+
+
+class Latency:
+    """Distribution of seconds the server waits before responding.
+
+    Specified as ``constant:SECONDS``, ``uniform:LOW:HIGH``
+    or ``lognormal:MEDIAN:SIGMA``, a bare number means constant.
+
+        :param spec: Distribution specification
+        :param seed: Seed of random generator for reproducible runs
+    """
+    def __init__(self, spec: str = "constant:0", seed: Optional[int] = None) -> None:
+        kind, _, params = spec.partition(":") if ":" in spec else ("constant", "", spec)
+        self.spec = spec
+        self._kind = kind
+        self._params = [float(param) for param in params.split(":") if param]
+        self._random = random.Random(seed)
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {spec}")
+
+    def sample(self) -> float:
+        if self._kind == "constant":
+            return self._params[0] if self._params else 0.0
+        if self._kind == "uniform":
+            low, high = self._params
+            return self._random.uniform(low, high)
+        median, sigma = self._params
+        return self._random.lognormvariate(math.log(median), sigma)
+
+
+class MockServerConfig:
+    """Behaviour of mock server
+
+        :param latency: Latency of completion and deferred completion requests
+        :param error_rate: Share of requests failed with error_status
+        :param error_status: Status code of injected errors
+        :param throttle_rate: Share of requests rejected with 429
+        :param retry_after: Value of Retry-After header sent with 429, None to omit it
+        :param stream_chunks: Number of partial chunks of streamed response
+        :param chunk_interval: Seconds between streamed chunks
+        :param text_size: Characters of generated text
+        :param operation_polls: Status checks before deferred operation is done
+        :param seed: Seed of random generator for reproducible runs
+    """
+    def __init__(
+            self,
+            latency: str = "constant:0",
+            error_rate: float = 0.0,
+            error_status: int = 500,
+            throttle_rate: float = 0.0,
+            retry_after: Optional[float] = 0.05,
+            stream_chunks: int = 8,
+            chunk_interval: float = 0.0,
+            text_size: int = 256,
+            operation_polls: int = 1,
+            seed: Optional[int] = None
+    ) -> None:
+        self.latency = Latency(latency, seed)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.stream_chunks = stream_chunks
+        self.chunk_interval = chunk_interval
+        self.text_size = text_size
+        self.operation_polls = operation_polls
+        self.random = random.Random(seed)
+
+
+class MockFoundationModelServer:
+    """Mock server running its own event loop in a background thread.
+
+        :param config: Behaviour of the server
+        :param host: Host to listen
+        :param port: Port to listen, 0 to pick a free one
+    """
+    def __init__(
+            self,
+            config: Optional[MockServerConfig] = None,
+            host: str = "127.0.0.1",
+            port: int = 0
+    ) -> None:
+        self.config = config or MockServerConfig()
+        self._host = host
+        self._port = port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._operations: dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "polls": 0, "aborted": 0}
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self._host}:{self._port}/foundationModels/v1"
+
+    @property
+    def operations_url(self) -> str:
+        return f"http://{self._host}:{self._port}/operations"
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post(COMPLETION_PATH, self._completion)
+        app.router.add_post(COMPLETION_ASYNC_PATH, self._completion_async)
+        app.router.add_post(TOKENIZE_PATH, self._tokenize)
+        app.router.add_post(TEXT_EMBEDDING_PATH, self._text_embedding)
+        app.router.add_get(OPERATIONS_PATH, self._operation)
+        return app
+
+    def start(self) -> "MockFoundationModelServer":
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self._host, self._port, backlog=1024)
+        self._loop.run_until_complete(site.start())
+        self._port = self._runner.addresses[0][1]
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def reset_stats(self) -> None:
+        for key in self.stats:
+            self.stats[key] = 0
+
+    def __enter__(self) -> "MockFoundationModelServer":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def _create_result(self, text: str, status: str = FINAL_STATUS) -> dict[str, Any]:
+        return {
+            "alternatives": [{"message": {"role": "assistant", "text": text}, "status": status}],
+            "usage": {
+                "inputTextTokens": "16",
+                "completionTokens": str(len(text) // 4),
+                "totalTokens": str(16 + len(text) // 4),
+                "completionTokensDetails": {"reasoningTokens": "0"}
+            },
+            "modelVersion": "mock"
+        }
+
+    def _injected_error(self) -> Optional[web.Response]:
+        config = self.config
+        if config.throttle_rate and config.random.random() < config.throttle_rate:
+            self.stats["throttled"] += 1
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None else None
+            return web.Response(status=429, text="Too many requests", headers=headers)
+        if config.error_rate and config.random.random() < config.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=self.config.error_status, text="Injected error")
+        return None
+
+    async def _completion(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        payload = await request.json()
+        await asyncio.sleep(self.config.latency.sample())
+        error = self._injected_error()
+        if error is not None:
+            return error
+        text = "x" * self.config.text_size
+        if not payload.get("completionOptions", {}).get("stream"):
+            return web.json_response({"result": self._create_result(text)})
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        chunks = max(1, self.config.stream_chunks)
+        try:
+            for index in range(1, chunks + 1):
+                partial = text[:len(text) * index // chunks]
+                status = FINAL_STATUS if index == chunks else PARTIAL_STATUS
+                line = json.dumps({"result": self._create_result(partial, status)}) + "\n"
+                await response.write(line.encode())
+                if self.config.chunk_interval and index < chunks:
+                    await asyncio.sleep(self.config.chunk_interval)
+        except ConnectionResetError:
+            # Client stopped reading, e.g. aborted generation
+            self.stats["aborted"] += 1
+            return response
+        await response.write_eof()
+        return response
+
+    async def _completion_async(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        await request.read()
+        error = self._injected_error()
+        if error is not None:
+            return error
+        operation_id = f"op{next(self._ids)}"
+        self._operations[operation_id] = 0
+        return web.json_response({"id": operation_id, "done": False})
+
+    async def _tokenize(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        payload = await request.json()
+        text = payload.get("text", "")
+        tokens = [
+            {"id": str(index), "text": text[index:index + 4], "special": False}
+            for index in range(0, len(text), 4)
+        ]
+        return web.json_response({"tokens": tokens, "modelVersion": "mock"})
+
+    async def _text_embedding(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        payload = await request.json()
+        await asyncio.sleep(self.config.latency.sample())
+        error = self._injected_error()
+        if error is not None:
+            return error
+        # Same text of the same model always gets the same vector
+        generator = random.Random(f"{payload.get('modelUri')}\0{payload.get('text', '')}")
+        embedding = [generator.uniform(-1.0, 1.0) for _ in range(EMBEDDING_DIMENSION)]
+        return web.json_response({
+            "embedding": embedding,
+            "numTokens": str(len(payload.get("text", "")) // 4),
+            "modelVersion": "mock"
+        })
+
+    async def _operation(self, request: web.Request) -> web.Response:
+        self.stats["polls"] += 1
+        operation_id = request.match_info["id"]
+        if operation_id not in self._operations:
+            return web.Response(status=404, text="Operation not found")
+        self._operations[operation_id] += 1
+        if self._operations[operation_id] < self.config.operation_polls:
+            return web.json_response({"id": operation_id, "done": False})
+        del self._operations[operation_id]
+        await asyncio.sleep(self.config.latency.sample())
+        return web.json_response({
+            "id": operation_id,
+            "done": True,
+            "response": self._create_result("x" * self.config.text_size)
+        })
+
+
+class MockServerProcess:
+    """Mock server running in a child process, so its work does not
+    compete with measured client for interpreter lock and is not traced
+    by client memory measurements.
+
+        :param config: Behaviour of the server
+        :param host: Host to listen
+    """
+    def __init__(self, config: Optional[MockServerConfig] = None, host: str = "127.0.0.1") -> None:
+        self.config = config or MockServerConfig()
+        self._host = host
+        self._port = 0
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self._host}:{self._port}/foundationModels/v1"
+
+    @property
+    def operations_url(self) -> str:
+        return f"http://{self._host}:{self._port}/operations"
+
+    def start(self) -> "MockServerProcess":
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=_serve,
+            args=(self.config, self._host, sender),
+            daemon=True
+        )
+        self._process.start()
+        self._port = receiver.recv()
+        return self
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self) -> "MockServerProcess":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+
+def _serve(config: MockServerConfig, host: str, sender: Any) -> None:
+    server = MockFoundationModelServer(config, host).start()
+    sender.send(server.port)
+    while True:
+        time.sleep(3600)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock Foundation Models API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="constant:0")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--chunk-interval", type=float, default=0.0)
+    parser.add_argument("--text-size", type=int, default=256)
+    parser.add_argument("--operation-polls", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = MockServerConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        throttle_rate=args.throttle_rate,
+        stream_chunks=args.stream_chunks,
+        chunk_interval=args.chunk_interval,
+        text_size=args.text_size,
+        operation_polls=args.operation_polls,
+        seed=args.seed
+    )
+    server = MockFoundationModelServer(config, args.host, args.port).start()
+    print(f"Serving {server.base_url}, operations {server.operations_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""Offline benchmarks of client overhead against local mock server.
+
+Results are written as JSON, so runs may be compared to track regressions::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --suites overhead,serialization --quick
+"""
+from typing import Any, Awaitable, Callable, Optional
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import aiohttp
+import requests
+from pydantic import create_model
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.tools import StructuredTool
+
+from langchain_yandex.chat_model import ChatFoundationModel
+from langchain_yandex.chat_model.utils import create_chat_result
+from langchain_yandex.clients.foundation import FoundationModelClient, RetryPolicy, get_codec
+from langchain_yandex.clients.foundation.codec import decode_completion, dumps
+from langchain_yandex.clients.foundation.encoding import encode_payload
+
+from .mock_server import MockServerConfig, MockServerProcess
+
+FOLDER_ID = "benchmark"
+API_KEY = "benchmark"
+MESSAGES = [{"role": "user", "text": "Hello"}]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Returns statistics of samples given in seconds, converted to milliseconds"""
+    ordered = sorted(samples)
+
+    def percentile(value: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * value))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000
+    }
+
+
+def measure(call: Callable[[], Any], iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started_at)
+    return samples
+
+
+async def ameasure(call: Callable[[], Awaitable[Any]], iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started_at)
+    return samples
+
+
+def create_client(server: MockServerProcess, **kwargs: Any) -> FoundationModelClient:
+    return FoundationModelClient(
+        folder_id=FOLDER_ID,
+        api_key=API_KEY,
+        base_url=server.base_url,
+        operations_url=server.operations_url,
+        **kwargs
+    )
+
+
+def bench_overhead(iterations: int) -> dict[str, Any]:
+    """Compares client calls with bare HTTP requests of the same body to zero latency server"""
+    results: dict[str, Any] = {}
+    with MockServerProcess(MockServerConfig()) as server:
+        client = create_client(server)
+        url = f"{server.base_url}/completion"
+        body = encode_payload(client._build_payload(MESSAGES))
+        headers = client._headers
+        session = requests.Session()
+
+        def raw_call() -> Any:
+            return json.loads(session.post(url, data=body, headers=headers).content)
+
+        measure(raw_call, 20)
+        raw = measure(raw_call, iterations)
+        measure(lambda: client.completion(MESSAGES), 20)
+        sync = measure(lambda: client.completion(MESSAGES), iterations)
+        session.close()
+        client.close()
+        results["sync"] = {
+            "raw": summarize(raw),
+            "client": summarize(sync),
+            "overhead_us": (statistics.fmean(sync) - statistics.fmean(raw)) * 1e6
+        }
+
+        async def run_async() -> dict[str, Any]:
+            async with create_client(server) as aclient, aiohttp.ClientSession() as asession:
+                async def araw_call() -> Any:
+                    async with asession.post(url, data=body, headers=headers) as response:
+                        return json.loads(await response.read())
+
+                async def aclient_call() -> Any:
+                    return await aclient.acompletion(MESSAGES)
+
+                await ameasure(araw_call, 20)
+                raw = await ameasure(araw_call, iterations)
+                await ameasure(aclient_call, 20)
+                client = await ameasure(aclient_call, iterations)
+            return {
+                "raw": summarize(raw),
+                "client": summarize(client),
+                "overhead_us": (statistics.fmean(client) - statistics.fmean(raw)) * 1e6
+            }
+
+        results["async"] = asyncio.run(run_async())
+    return results
+
+
+async def _run_concurrently(
+        call: Callable[[], Awaitable[Any]],
+        total: int,
+        concurrency: int
+) -> tuple[list[float], int, float]:
+    """Runs total calls keeping concurrency in flight, returns latencies, errors and elapsed time"""
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            started_at = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started_at
+
+
+def bench_throughput(levels: list[int], latency: str) -> dict[str, Any]:
+    """Measures acompletion throughput against server with fixed latency"""
+    results: dict[str, Any] = {"latency": latency, "levels": {}}
+    with MockServerProcess(MockServerConfig(latency=latency)) as server:
+        async def run() -> None:
+            async with create_client(server, pool_size=max(levels)) as client:
+                for concurrency in levels:
+                    total = max(100, concurrency * 8)
+                    latencies, errors, elapsed = await _run_concurrently(
+                        lambda: client.acompletion(MESSAGES), total, concurrency
+                    )
+                    results["levels"][str(concurrency)] = {
+                        "requests": total,
+                        "errors": errors,
+                        "requests_per_second": len(latencies) / elapsed,
+                        "latency": summarize(latencies)
+                    }
+
+        asyncio.run(run())
+    return results
+
+
+def bench_resilience(concurrency: int, total: int) -> dict[str, Any]:
+    """Measures throughput and retries against server injecting 429 and 5xx errors"""
+    config = MockServerConfig(latency="lognormal:0.02:0.5", throttle_rate=0.1, error_rate=0.05, seed=1)
+    with MockServerProcess(config) as server:
+        async def run() -> dict[str, Any]:
+            retries = 0
+
+            async def call() -> None:
+                nonlocal retries
+                response = await client.acompletion(MESSAGES)
+                retries += response.get("clientInfo", {}).get("retries", 0)
+
+            async with create_client(server, retry_policy=RetryPolicy(backoff=0.01, max_retries=5)) as client:
+                latencies, errors, elapsed = await _run_concurrently(call, total, concurrency)
+            return {
+                "concurrency": concurrency,
+                "requests": total,
+                "errors": errors,
+                "retries": retries,
+                "requests_per_second": len(latencies) / elapsed,
+                "latency": summarize(latencies)
+            }
+
+        return asyncio.run(run())
+
+
+def bench_streaming(iterations: int) -> dict[str, Any]:
+    """Measures time to first token and to the end of streamed response"""
+    config = MockServerConfig(latency="constant:0.02", stream_chunks=16, chunk_interval=0.005, text_size=2048)
+    with MockServerProcess(config) as server:
+        client = create_client(server)
+        first, total = [], []
+        for _ in range(iterations):
+            started_at = time.perf_counter()
+            chunks = client.stream_completion(MESSAGES)
+            next(chunks)
+            first.append(time.perf_counter() - started_at)
+            for _ in chunks:
+                pass
+            total.append(time.perf_counter() - started_at)
+        client.close()
+        results = {"sync": {"time_to_first_token": summarize(first), "total": summarize(total)}}
+
+        async def run() -> dict[str, Any]:
+            first, total = [], []
+            async with create_client(server) as aclient:
+                for _ in range(iterations):
+                    started_at = time.perf_counter()
+                    received = False
+                    async for _ in aclient.astream_completion(MESSAGES):
+                        if not received:
+                            first.append(time.perf_counter() - started_at)
+                            received = True
+                    total.append(time.perf_counter() - started_at)
+            return {"time_to_first_token": summarize(first), "total": summarize(total)}
+
+        results["async"] = asyncio.run(run())
+    return results
+
+
+def bench_memory(levels: list[int]) -> dict[str, Any]:
+    """Measures memory allocated by client per in-flight acompletion request"""
+    results: dict[str, Any] = {}
+    with MockServerProcess(MockServerConfig(latency="constant:0.5")) as server:
+        async def run(concurrency: int) -> dict[str, Any]:
+            async with create_client(server, pool_size=concurrency) as client:
+                await client.acompletion(MESSAGES)
+                gc.collect()
+                tracemalloc.start()
+                baseline, _ = tracemalloc.get_traced_memory()
+                tasks = [asyncio.ensure_future(client.acompletion(MESSAGES)) for _ in range(concurrency)]
+                await asyncio.sleep(0.25)
+                in_flight, _ = tracemalloc.get_traced_memory()
+                await asyncio.gather(*tasks)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            return {
+                "bytes_per_request": (in_flight - baseline) / concurrency,
+                "peak_bytes_per_request": (peak - baseline) / concurrency
+            }
+
+        for concurrency in levels:
+            results[str(concurrency)] = asyncio.run(run(concurrency))
+    return results
+
+
+def create_history(size: int) -> list[BaseMessage]:
+    history: list[BaseMessage] = [SystemMessage("You are a helpful assistant. " * 20)]
+    for index in range(size - 1):
+        text = f"Message {index} " + "lorem ipsum dolor sit amet " * 10
+        history.append(HumanMessage(text) if index % 2 == 0 else AIMessage(text))
+    return history
+
+
+def create_tools(count: int) -> list[StructuredTool]:
+    tools = []
+    for index in range(count):
+        schema = create_model(
+            f"Tool{index}Input",
+            query=(str, ...),
+            limit=(int, 10),
+            tags=(list[str], [])
+        )
+        tools.append(StructuredTool.from_function(
+            func=lambda **kwargs: kwargs,
+            name=f"tool_{index}",
+            description=f"Benchmark tool number {index}",
+            args_schema=schema
+        ))
+    return tools
+
+
+def bench_serialization(history_sizes: list[int], tool_counts: list[int], iterations: int) -> dict[str, Any]:
+    """Measures cost of building request body from history of messages and tools.
+
+    Cold runs convert new message objects every time, warm runs resend
+    the same history as multi-turn conversations do.
+    """
+    model = ChatFoundationModel(folder_id=FOLDER_ID, api_key=API_KEY)
+    client = model._client
+    results: dict[str, Any] = {}
+
+    def build(messages: list[BaseMessage], tools: list[StructuredTool]) -> bytes:
+        payload = model._build_payload(messages, tools=tools)
+        return encode_payload(client._build_payload(payload["messages"], payload["tools"], payload["stop"]))
+
+    for size in history_sizes:
+        history = create_history(size)
+        for count in tool_counts:
+            tools = create_tools(count)
+            copies = [[message.model_copy() for message in history] for _ in range(iterations)]
+            cold_tools = [create_tools(count) for _ in range(iterations)]
+            cold_inputs = iter(zip(copies, cold_tools))
+            cold = measure(lambda: build(*next(cold_inputs)), iterations)
+            build(history, tools)
+            warm = measure(lambda: build(history, tools), iterations)
+            results[f"history={size},tools={count}"] = {
+                "body_bytes": len(build(history, tools)),
+                "cold": summarize(cold),
+                "warm": summarize(warm)
+            }
+    return results
+
+
+def bench_chat_result(text_sizes: list[int], tool_call_counts: list[int], iterations: int) -> dict[str, Any]:
+    """Measures decoding of completion response and its conversion to chat result"""
+    results: dict[str, Any] = {}
+    for text_size in text_sizes:
+        for count in tool_call_counts:
+            message: dict[str, Any] = {"role": "assistant", "text": "x" * text_size}
+            if count:
+                message["toolCallList"] = {"toolCalls": [
+                    {"functionCall": {"name": f"tool_{index}", "arguments": {"query": "q" * 64, "limit": index}}}
+                    for index in range(count)
+                ]}
+            body = dumps({"result": {
+                "alternatives": [{"message": message, "status": "ALTERNATIVE_STATUS_FINAL"}],
+                "usage": {"inputTextTokens": "100", "completionTokens": "50", "totalTokens": "150"},
+                "modelVersion": "mock"
+            }})
+            decode = measure(lambda: decode_completion(body), iterations)
+            convert = measure(lambda: create_chat_result(decode_completion(body)), iterations)
+            results[f"text={text_size},tool_calls={count}"] = {
+                "body_bytes": len(body),
+                "decode": summarize(decode),
+                "decode_and_convert": summarize(convert)
+            }
+    return results
+
+
+IMPORT_TARGETS = {
+    "package": "import langchain_yandex",
+    "sync_client": "from langchain_yandex.clients.foundation import SyncFoundationModelClient",
+    "async_client": "from langchain_yandex.clients.foundation import AsyncFoundationModelClient",
+    "client": "from langchain_yandex.clients.foundation import FoundationModelClient",
+    "chat_model": "from langchain_yandex.chat_model import ChatFoundationModel",
+    "langchain_core_baseline": "from langchain_core.language_models import BaseChatModel"
+}
+HEAVY_MODULES = ("requests", "aiohttp", "langchain_core", "langchain_core.tools")
+IMPORT_PROBE = """
+import json, sys, time
+started_at = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started_at
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {modules!r} if name in sys.modules]}}))
+"""
+
+
+def bench_import_time(runs: int) -> dict[str, Any]:
+    """Measures cold start import of package entry points, every run in a fresh interpreter.
+
+    Heavy modules loaded by every target show what a process using it pays for,
+    and langchain_core baseline is the floor chat model import can't go below.
+    """
+    results: dict[str, Any] = {}
+    for name, statement in IMPORT_TARGETS.items():
+        samples = []
+        loaded: list[str] = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", IMPORT_PROBE.format(statement=statement, modules=HEAVY_MODULES)],
+                capture_output=True,
+                text=True,
+                cwd=Path(__file__).parent.parent,
+                check=True
+            ).stdout
+            probe = json.loads(output)
+            samples.append(probe["seconds"])
+            loaded = probe["loaded"]
+        results[name] = {"import": summarize(samples), "loaded": loaded}
+    return results
+
+
+def get_metadata() -> dict[str, Any]:
+    try:
+        commit: Optional[str] = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "codec": get_codec().name
+    }
+
+
+SUITES = (
+    "overhead",
+    "throughput",
+    "resilience",
+    "streaming",
+    "memory",
+    "serialization",
+    "chat_result",
+    "import_time"
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of langchain-yandex client")
+    parser.add_argument("--suites", default=",".join(SUITES), help="Comma separated suites to run")
+    parser.add_argument("--output", default=None, help="Path of JSON results, stdout by default")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations for smoke runs")
+    parser.add_argument("--latency", default="constant:0.05", help="Server latency of throughput suite")
+    args = parser.parse_args()
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+    iterations = 50 if args.quick else 500
+    runners: dict[str, Callable[[], dict[str, Any]]] = {
+        "overhead": lambda: bench_overhead(iterations),
+        "throughput": lambda: bench_throughput([1, 8, 32] if args.quick else [1, 8, 32, 128, 256], args.latency),
+        "resilience": lambda: bench_resilience(16, 100 if args.quick else 1000),
+        "streaming": lambda: bench_streaming(10 if args.quick else 100),
+        "memory": lambda: bench_memory([16] if args.quick else [16, 128, 512]),
+        "serialization": lambda: bench_serialization(
+            [10, 100] if args.quick else [10, 100, 1000],
+            [0, 8] if args.quick else [0, 8, 32],
+            10 if args.quick else 50
+        ),
+        "chat_result": lambda: bench_chat_result(
+            [256, 4096] if args.quick else [256, 4096, 65536],
+            [0, 8],
+            iterations
+        ),
+        "import_time": lambda: bench_import_time(5 if args.quick else 20)
+    }
+    report: dict[str, Any] = {"metadata": get_metadata(), "results": {}}
+    for suite in suites:
+        print(f"Running {suite}", file=sys.stderr)
+        started_at = time.perf_counter()
+        report["results"][suite] = runners[suite]()
+        report["results"][suite]["elapsed_seconds"] = time.perf_counter() - started_at
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
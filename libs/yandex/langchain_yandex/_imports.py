@@ -0,0 +1,27 @@
+from typing import Any, Callable
+
+import importlib
+
+
+def lazy_exports(package: str, exports: dict[str, str]) -> tuple[Callable[[str], Any], Callable[[], list[str]]]:
+    """Returns module __getattr__ and __dir__ importing exported names on first access,
+    so importing a package doesn't load modules and dependencies it may never use.
+
+    :param package: Name of the package
+    :param exports: Relative module defining every exported name
+    :return: __getattr__ and __dir__ of the package
+    """
+    namespace = importlib.import_module(package).__dict__
+
+    def __getattr__(name: str) -> Any:
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module, package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted({*namespace, *exports})
+
+    return __getattr__, __dir__
@@ -1,3 +1,48 @@
-__all__ = ("ChatFoundationModel",)
+from typing import TYPE_CHECKING
 
-from .foundation import ChatFoundationModel
+from .._imports import lazy_exports
+
+__all__ = (
+    "ChatFoundationModel",
+    "ToolRunner",
+    "StructuredOutputParser",
+    "IncrementalJsonParser",
+    "ContextWindow",
+    "BaseContextStrategy",
+    "DropToolResultsStrategy",
+    "TrimStrategy",
+    "SummarizeStrategy",
+    "BaseTokenCounter",
+    "EstimatingTokenCounter",
+    "TokenizerTokenCounter",
+)
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "ChatFoundationModel": ".foundation",
+    "ToolRunner": ".tools",
+    "StructuredOutputParser": ".structured",
+    "IncrementalJsonParser": ".structured",
+    "ContextWindow": ".context",
+    "BaseContextStrategy": ".context",
+    "DropToolResultsStrategy": ".context",
+    "TrimStrategy": ".context",
+    "SummarizeStrategy": ".context",
+    "BaseTokenCounter": ".context",
+    "EstimatingTokenCounter": ".context",
+    "TokenizerTokenCounter": ".context",
+})
+
+if TYPE_CHECKING:
+    from .foundation import ChatFoundationModel
+    from .tools import ToolRunner
+    from .structured import StructuredOutputParser, IncrementalJsonParser
+    from .context import (
+        ContextWindow,
+        BaseContextStrategy,
+        DropToolResultsStrategy,
+        TrimStrategy,
+        SummarizeStrategy,
+        BaseTokenCounter,
+        EstimatingTokenCounter,
+        TokenizerTokenCounter
+    )
@@ -1,15 +1,47 @@
 from functools import cached_property
-from typing import Optional
+from typing import Any, Optional, Union, TYPE_CHECKING
 
 from langchain_core.load.serializable import Serializable
+from pydantic import ConfigDict
 
-from .utils import MODEL2TYPE
+from .context import ContextWindow
+from .utils import MODEL2TYPE, YANDEXGPT_TYPE
 
-from ..clients.foundation import FoundationModelClient, FoundationModel, TEMPERATURE, URL
+from ..clients.foundation import (
+    RoutingFoundationModelClient,
+    TieringPolicy,
+    FoundationModel,
+    TEMPERATURE,
+    URL,
+    POOL_SIZE,
+    POOL_LIMIT_PER_HOST,
+    DNS_CACHE_TTL,
+    KEEPALIVE_TIMEOUT,
+    OPERATIONS_ENDPOINT,
+    BATCH_MAX_IN_FLIGHT,
+    PollingPolicy,
+    RateLimiter,
+    RetryPolicy,
+    HedgePolicy,
+    BaseCompletionCache,
+    BaseOperationJournal,
+    BaseInstrumentation,
+    BaseCredentials,
+    UsageLedger,
+    RequestScheduler,
+    Priority,
+    get_rate_limiter
+)
+from ..clients.foundation.base_client import BaseFoundationModelClient
+
+if TYPE_CHECKING:
+    from ..clients.foundation import FoundationModelClient, TieredFoundationModelClient
 
 
 class _BaseFoundationModel(Serializable):
-    folder_id: str
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    folder_id: Optional[str] = None
     api_key: Optional[str] = None
     iam_token: Optional[str] = None
     model: FoundationModel = FoundationModel.YANDEXGPT_LITE
@@ -20,24 +52,130 @@ class _BaseFoundationModel(Serializable):
     reasoning: bool = False
     timeout: Optional[float] = None
     verbose: bool = False
+    pool_size: int = POOL_SIZE
+    pool_limit_per_host: int = POOL_LIMIT_PER_HOST
+    dns_cache_ttl: Optional[int] = DNS_CACHE_TTL
+    keepalive_timeout: float = KEEPALIVE_TIMEOUT
+    polling_policy: Optional[PollingPolicy] = None
+    operations_url: str = OPERATIONS_ENDPOINT
+    batch_max_in_flight: int = BATCH_MAX_IN_FLIGHT
+    # Not named rate_limiter, which BaseChatModel reserves for langchain rate limiters
+    client_rate_limiter: Optional[RateLimiter] = None
+    requests_per_second: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    retry_policy: Optional[RetryPolicy] = None
+    hedge_policy: Optional[HedgePolicy] = None
+    completion_cache: Optional[BaseCompletionCache] = None
+    # Journals deferred operations, so they survive restarts and are not submitted twice
+    operation_journal: Optional[BaseOperationJournal] = None
+    force_cache: bool = False
+    coalesce: bool = False
+    instrumentation: Optional[BaseInstrumentation] = None
+    credentials: Optional[BaseCredentials] = None
+    # Ready client used instead of creating client from the fields above, e.g. routing one,
+    # or sync or async only client for processes using one of the calls
+    client: Optional[Union[BaseFoundationModelClient, RoutingFoundationModelClient]] = None
+    # Sends requests to model and escalates them to escalation_model when set
+    tiering_policy: Optional[TieringPolicy] = None
+    escalation_model: FoundationModel = FoundationModel.YANDEXGPT_PRO
+    # Shrinks long conversations to fit model context window when set
+    context_window: Optional[ContextWindow] = None
+    # Accounts token usage and enforces budgets of callers tagged by usage_tag run metadata when set
+    usage_ledger: Optional[UsageLedger] = None
+    usage_tag: Optional[str] = None
+    # Admits requests by priority class and tenant, overridden by priority, tenant and deadline kwargs or metadata.
+    # Deferred batches are bounded by batch_max_in_flight instead
+    scheduler: Optional[RequestScheduler] = None
+    priority: Priority = Priority.INTERACTIVE
+    tenant: Optional[str] = None
 
     @property
     def _llm_type(self) -> str:
+        if self.tiering_policy is not None:
+            return YANDEXGPT_TYPE
         return MODEL2TYPE[self.model]
 
     @property
-    def _identifying_params(self) -> dict[str, str]:
-        return {
+    def _identifying_params(self) -> dict[str, Any]:
+        params = {
             "temperature": self.temperature,
             "model": self.model,
             "streaming": self.streaming,
             "reasoning": self.reasoning,
             "max_tokens": self.max_tokens
         }
+        if self.tiering_policy is not None:
+            params["escalation_model"] = self.escalation_model
+            params["tiering_policy"] = self.tiering_policy.identifying_params()
+        return params
+
+    @property
+    def _uses_iam_token(self) -> bool:
+        """Whether IAM token is available, so deferred completions may be used"""
+        if self.client is not None:
+            return self.client.uses_iam_token
+        return bool(self.iam_token) or (self.credentials is not None and self.credentials.is_iam)
+
+    def _get_rate_limiter(self, model: FoundationModel) -> Optional[RateLimiter]:
+        """Returns explicit rate limiter or the one shared by folder and model quotas"""
+        if self.client_rate_limiter is not None:
+            return self.client_rate_limiter
+        if self.requests_per_second is None and self.tokens_per_second is None:
+            return None
+        return get_rate_limiter(
+            self.folder_id,
+            model,
+            requests_per_second=self.requests_per_second,
+            tokens_per_second=self.tokens_per_second
+        )
+
+    @cached_property
+    def _client(self) -> Union[BaseFoundationModelClient, RoutingFoundationModelClient, "TieredFoundationModelClient"]:
+        """Returns given or created foundation model API client, wrapped in tiered one when tiering is enabled"""
+        client = self.client or self._create_client()
+        if self.tiering_policy is None:
+            return client
+        from ..clients.foundation import TieredFoundationModelClient
+
+        if self.client is not None:
+            escalation_client = client.with_model(self.escalation_model)
+        else:
+            escalation_client = client.with_model(
+                self.escalation_model,
+                rate_limiter=self._get_rate_limiter(self.escalation_model)
+            )
+        return TieredFoundationModelClient(client, escalation_client, self.tiering_policy)
+
+    @property
+    def _top_model(self) -> FoundationModel:
+        """Most expensive model requests may be sent to"""
+        return self.escalation_model if self.tiering_policy is not None else self.model
 
     @cached_property
-    def _client(self) -> FoundationModelClient:
-        """Returns foundation model API client"""
+    def _downgraded_clients(self) -> dict[FoundationModel, BaseFoundationModelClient]:
+        return {}
+
+    def _get_model_client(
+            self,
+            model: FoundationModel
+    ) -> Union[BaseFoundationModelClient, RoutingFoundationModelClient, "TieredFoundationModelClient"]:
+        """Returns client sending requests to model admitted by usage ledger"""
+        if model == self._top_model:
+            return self._client
+        client = self._client.client if self.tiering_policy is not None else self._client
+        if model == client._model:
+            return client
+        downgraded_client = self._downgraded_clients.get(model)
+        if downgraded_client is None:
+            downgraded_client = self._downgraded_clients.setdefault(model, client.with_model(model))
+        return downgraded_client
+
+    def _create_client(self) -> "FoundationModelClient":
+        if self.folder_id is None:
+            raise ValueError("Either folder_id or client is required")
+        # Client modules are loaded by models creating their own client
+        from ..clients.foundation import FoundationModelClient
+
         return FoundationModelClient(
             folder_id=self.folder_id,
             api_key=self.api_key,
@@ -48,5 +186,58 @@ class _BaseFoundationModel(Serializable):
             max_tokens=self.max_tokens,
             streaming=self.streaming,
             reasoning=self.reasoning,
-            timeout=self.timeout
+            timeout=self.timeout,
+            pool_size=self.pool_size,
+            pool_limit_per_host=self.pool_limit_per_host,
+            dns_cache_ttl=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            polling_policy=self.polling_policy,
+            operations_url=self.operations_url,
+            rate_limiter=self._get_rate_limiter(self.model),
+            retry_policy=self.retry_policy,
+            hedge_policy=self.hedge_policy,
+            cache=self.completion_cache,
+            force_cache=self.force_cache,
+            coalesce=self.coalesce,
+            instrumentation=self.instrumentation,
+            credentials=self.credentials,
+            journal=self.operation_journal
         )
+
+    def close(self) -> None:
+        """Close pooled connections of the API clients created by the model"""
+        if "_client" not in self.__dict__:
+            return
+        for client in self.__dict__.get("_downgraded_clients", {}).values():
+            _close_client(client)
+        if self.client is None:
+            _close_client(self._client)
+        elif self.tiering_policy is not None:
+            _close_client(self._client.escalation_client)
+
+    async def aclose(self) -> None:
+        """Close pooled connections of the API clients created by the model"""
+        if "_client" not in self.__dict__:
+            return
+        for client in self.__dict__.get("_downgraded_clients", {}).values():
+            await _aclose_client(client)
+        if self.client is None:
+            await _aclose_client(self._client)
+        elif self.tiering_policy is not None:
+            await _aclose_client(self._client.escalation_client)
+
+
+def _close_client(client: Any) -> None:
+    """Closes client, async only client closes its session without awaiting"""
+    if hasattr(client, "close"):
+        client.close()
+    else:
+        client.close_asession()
+
+
+async def _aclose_client(client: Any) -> None:
+    """Closes client, sync only client has no async close"""
+    if hasattr(client, "aclose"):
+        await client.aclose()
+    else:
+        client.close()
@@ -0,0 +1,447 @@
+from typing import Any, Awaitable, Callable, Optional, Sequence, Union
+
+import asyncio
+import hashlib
+import inspect
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
+
+from .serialization import MESSAGE_OVERHEAD_TOKENS, estimate_message_tokens, serialize_message
+from .utils import MODEL2CONTEXT_SIZE
+
+from ..clients.foundation import FoundationModel
+
+TOKEN_CACHE_SIZE = 4096
+TOKENIZE_CONCURRENCY = 8
+COMPLETION_RESERVE_TOKENS = 2000
+TOOL_RESULT_PLACEHOLDER = "[Tool result omitted to fit context window]"
+SUMMARY_PROMPT = (
+    "Summarize the conversation below, keeping facts, decisions "
+    "and open questions needed to continue it."
+)
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+Summarizer = Callable[[list[BaseMessage]], Union[str, Awaitable[str]]]
+
+
+class BaseTokenCounter:
+    """Counts tokens of messages sent to the model"""
+    def count(self, messages: Sequence[BaseMessage], client: Any = None) -> list[int]:
+        raise NotImplementedError
+
+    async def acount(self, messages: Sequence[BaseMessage], client: Any = None) -> list[int]:
+        return self.count(messages, client)
+
+
+class EstimatingTokenCounter(BaseTokenCounter):
+    """Roughly estimates tokens by message length, estimates are cached with serialized messages"""
+    def count(self, messages: Sequence[BaseMessage], client: Any = None) -> list[int]:
+        return [estimate_message_tokens(message) for message in messages]
+
+
+class TokenizerTokenCounter(BaseTokenCounter):
+    """Counts tokens exactly with tokenize endpoint of the model.
+
+    Counts are cached by message text, texts not seen before are tokenized concurrently.
+
+        :param client: Client to tokenize with, client of the chat model if not set
+        :param cache_size: Number of cached counts
+        :param max_concurrency: Maximum number of concurrent tokenize requests
+    """
+    def __init__(
+            self,
+            client: Any = None,
+            cache_size: int = TOKEN_CACHE_SIZE,
+            max_concurrency: int = TOKENIZE_CONCURRENCY
+    ) -> None:
+        self._client = client
+        self._cache_size = cache_size
+        self._max_concurrency = max_concurrency
+        self._cache: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_client(self, client: Any) -> Any:
+        client = self._client or client
+        if client is None:
+            raise ValueError("Tokenizer token counter requires client")
+        return client
+
+    @staticmethod
+    def _get_key(client: Any, text: str) -> bytes:
+        return hashlib.blake2b(f"{client._model_uri}\n{text}".encode(), digest_size=16).digest()
+
+    def _lookup(self, client: Any, texts: list[str]) -> tuple[list[bytes], dict[bytes, str]]:
+        """Returns cache keys of texts and texts missing in cache"""
+        keys = [self._get_key(client, text) for text in texts]
+        missing: dict[bytes, str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                else:
+                    missing[key] = text
+        return keys, missing
+
+    def _store(self, counts: dict[bytes, int]) -> None:
+        with self._lock:
+            self._cache.update(counts)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _counts(self, keys: list[bytes], fetched: dict[bytes, int]) -> list[int]:
+        with self._lock:
+            return [
+                fetched.get(key, self._cache.get(key, 0)) + MESSAGE_OVERHEAD_TOKENS
+                for key in keys
+            ]
+
+    def count(self, messages: Sequence[BaseMessage], client: Any = None) -> list[int]:
+        client = self._get_client(client)
+        keys, missing = self._lookup(client, [_get_text(message) for message in messages])
+        fetched: dict[bytes, int] = {}
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self._max_concurrency, len(missing))) as executor:
+                counts = executor.map(lambda text: len(client.tokenize(text)["tokens"]), missing.values())
+                fetched = dict(zip(missing, counts))
+            self._store(fetched)
+        return self._counts(keys, fetched)
+
+    async def acount(self, messages: Sequence[BaseMessage], client: Any = None) -> list[int]:
+        client = self._get_client(client)
+        keys, missing = self._lookup(client, [_get_text(message) for message in messages])
+        fetched: dict[bytes, int] = {}
+        if missing:
+            semaphore = asyncio.Semaphore(self._max_concurrency)
+
+            async def tokenize(text: str) -> int:
+                async with semaphore:
+                    return len((await client.atokenize(text))["tokens"])
+
+            counts = await asyncio.gather(*(tokenize(text) for text in missing.values()))
+            fetched = dict(zip(missing, counts))
+            self._store(fetched)
+        return self._counts(keys, fetched)
+
+
+def _get_text(message: BaseMessage) -> str:
+    """Returns text of message, or its JSON for tool calls and results"""
+    message_dict, fragment = serialize_message(message)
+    if "toolCallList" in message_dict or "toolResultList" in message_dict:
+        return fragment.decode()
+    return message_dict.get("text") or ""
+
+
+class BaseContextStrategy:
+    """Shrinks conversation which doesn't fit context window"""
+    def apply(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            counter: Optional[BaseTokenCounter] = None,
+            client: Any = None
+    ) -> list[BaseMessage]:
+        """Returns shrunk conversation
+
+        :param messages: Conversation
+        :param counts: Tokens of every message
+        :param budget: Tokens conversation must fit in
+        :param counter: Counter of the context window, for messages the strategy creates
+        :param client: Client of the chat model the counter may tokenize with
+        :return: Conversation, possibly still exceeding budget
+        """
+        raise NotImplementedError
+
+    async def aapply(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            counter: Optional[BaseTokenCounter] = None,
+            client: Any = None
+    ) -> list[BaseMessage]:
+        return self.apply(messages, counts, budget, counter, client)
+
+
+# Replacements are kept for as long as original messages live,
+# so replaced history stays the same objects and its serialization is reused
+_replacements: dict[int, tuple["weakref.ref[BaseMessage]", BaseMessage]] = {}
+_replacements_lock = threading.RLock()
+
+
+def _replace_message(message: BaseMessage, create: Callable[[BaseMessage], BaseMessage]) -> BaseMessage:
+    key = id(message)
+    cached = _replacements.get(key)
+    if cached is not None and cached[0]() is message:
+        return cached[1]
+    replacement = create(message)
+    reference = weakref.ref(message, lambda ref: _forget_replacement(key, ref))
+    with _replacements_lock:
+        _replacements[key] = (reference, replacement)
+    return replacement
+
+
+def _forget_replacement(key: int, reference: "weakref.ref[BaseMessage]") -> None:
+    with _replacements_lock:
+        cached = _replacements.get(key)
+        if cached is not None and cached[0] is reference:
+            del _replacements[key]
+
+
+class DropToolResultsStrategy(BaseContextStrategy):
+    """Replaces content of old tool results with short placeholder, oldest first
+
+        :param keep_last: Number of the latest tool results kept intact
+        :param placeholder: Content replacing dropped results
+    """
+    def __init__(self, keep_last: int = 1, placeholder: str = TOOL_RESULT_PLACEHOLDER) -> None:
+        self._keep_last = keep_last
+        self._placeholder = placeholder
+
+    def _create_placeholder(self, message: BaseMessage) -> BaseMessage:
+        return message.model_copy(update={"content": self._placeholder})
+
+    def _droppable(self, messages: list[BaseMessage]) -> list[int]:
+        positions = [position for position, message in enumerate(messages) if isinstance(message, ToolMessage)]
+        return positions[:max(0, len(positions) - self._keep_last)]
+
+    def _drop(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            droppable: list[int],
+            replacements: list[BaseMessage],
+            replacement_counts: list[int]
+    ) -> list[BaseMessage]:
+        messages = list(messages)
+        total = sum(counts)
+        for position, replacement, count in zip(droppable, replacements, replacement_counts):
+            if total <= budget:
+                break
+            messages[position] = replacement
+            total -= counts[position] - count
+        return messages
+
+    def apply(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            counter: Optional[BaseTokenCounter] = None,
+            client: Any = None
+    ) -> list[BaseMessage]:
+        droppable = self._droppable(messages)
+        if not droppable or sum(counts) <= budget:
+            return messages
+        replacements = [_replace_message(messages[position], self._create_placeholder) for position in droppable]
+        replacement_counts = (counter or EstimatingTokenCounter()).count(replacements, client)
+        return self._drop(messages, counts, budget, droppable, replacements, replacement_counts)
+
+    async def aapply(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            counter: Optional[BaseTokenCounter] = None,
+            client: Any = None
+    ) -> list[BaseMessage]:
+        droppable = self._droppable(messages)
+        if not droppable or sum(counts) <= budget:
+            return messages
+        replacements = [_replace_message(messages[position], self._create_placeholder) for position in droppable]
+        replacement_counts = await (counter or EstimatingTokenCounter()).acount(replacements, client)
+        return self._drop(messages, counts, budget, droppable, replacements, replacement_counts)
+
+
+class TrimStrategy(BaseContextStrategy):
+    """Drops the oldest messages, keeping system messages and the latest ones
+
+        :param keep_last: Number of the latest messages never dropped
+    """
+    def __init__(self, keep_last: int = 1) -> None:
+        self._keep_last = keep_last
+
+    def apply(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            counter: Optional[BaseTokenCounter] = None,
+            client: Any = None
+    ) -> list[BaseMessage]:
+        total = sum(counts)
+        limit = max(0, len(messages) - self._keep_last)
+        dropped: set[int] = set()
+        for position in range(limit):
+            if total <= budget:
+                break
+            if isinstance(messages[position], SystemMessage):
+                continue
+            dropped.add(position)
+            total -= counts[position]
+        # Tool results of dropped tool calls are dropped too
+        for position in range(1, len(messages)):
+            if isinstance(messages[position], ToolMessage) and position - 1 in dropped:
+                dropped.add(position)
+        return [message for position, message in enumerate(messages) if position not in dropped]
+
+
+class SummarizeStrategy(BaseContextStrategy):
+    """Replaces the oldest messages with their summary.
+
+    Summary is reused while the summarized messages stay at the start of conversation,
+    newer messages are summarized together with the previous summary.
+
+        :param summarizer: Chat model or function returning summary of messages, may be async
+        :param keep_last: Number of the latest messages never summarized
+        :param prompt: Instruction given to chat model summarizer
+    """
+    def __init__(
+            self,
+            summarizer: Union[Summarizer, Any],
+            keep_last: int = 4,
+            prompt: str = SUMMARY_PROMPT
+    ) -> None:
+        self._summarizer = summarizer
+        self._keep_last = keep_last
+        self._prompt = prompt
+        self._summarized: list[BaseMessage] = []
+        self._summary: Optional[BaseMessage] = None
+        self._lock = threading.Lock()
+
+    def _split(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int
+    ) -> tuple[list[BaseMessage], list[BaseMessage], list[BaseMessage], list[BaseMessage]]:
+        """Returns system messages, messages to summarize and the rest,
+        with the part already covered by previous summary replaced by it"""
+        system = [message for message in messages if isinstance(message, SystemMessage)]
+        rest = [message for message in messages if not isinstance(message, SystemMessage)]
+        rest_counts = [count for message, count in zip(messages, counts) if not isinstance(message, SystemMessage)]
+        total = sum(counts)
+        end = 0
+        limit = max(0, len(rest) - self._keep_last)
+        while end < limit and total > budget:
+            total -= rest_counts[end]
+            end += 1
+        # Summary must not separate tool calls from their results
+        while end < len(rest) and isinstance(rest[end], ToolMessage):
+            end += 1
+        summarized, kept = rest[:end], rest[end:]
+        with self._lock:
+            previous, summary = self._summarized, self._summary
+        if summary is not None and len(previous) <= len(summarized) and all(
+                old is new for old, new in zip(previous, summarized)
+        ):
+            return system, summarized, [summary, *summarized[len(previous):]], kept
+        return system, summarized, summarized, kept
+
+    def _summary_input(self, messages: list[BaseMessage]) -> list[BaseMessage]:
+        return [SystemMessage(content=self._prompt), *messages]
+
+    def _remember(self, summarized: list[BaseMessage], text: str) -> BaseMessage:
+        summary = SystemMessage(content=f"{SUMMARY_PREFIX}{text}")
+        with self._lock:
+            self._summarized, self._summary = summarized, summary
+        return summary
+
+    def apply(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            counter: Optional[BaseTokenCounter] = None,
+            client: Any = None
+    ) -> list[BaseMessage]:
+        system, summarized, to_summarize, kept = self._split(messages, counts, budget)
+        if not summarized:
+            return messages
+        if len(to_summarize) == 1 and to_summarize[0] is self._summary:
+            return [*system, self._summary, *kept]
+        if hasattr(self._summarizer, "invoke"):
+            text = self._summarizer.invoke(self._summary_input(to_summarize)).content
+        else:
+            text = self._summarizer(to_summarize)
+            if inspect.isawaitable(text):
+                raise TypeError("Async summarizer requires async call of the chat model")
+        return [*system, self._remember(summarized, text), *kept]
+
+    async def aapply(
+            self,
+            messages: list[BaseMessage],
+            counts: list[int],
+            budget: int,
+            counter: Optional[BaseTokenCounter] = None,
+            client: Any = None
+    ) -> list[BaseMessage]:
+        system, summarized, to_summarize, kept = self._split(messages, counts, budget)
+        if not summarized:
+            return messages
+        if len(to_summarize) == 1 and to_summarize[0] is self._summary:
+            return [*system, self._summary, *kept]
+        if hasattr(self._summarizer, "ainvoke"):
+            text = (await self._summarizer.ainvoke(self._summary_input(to_summarize))).content
+        else:
+            text = self._summarizer(to_summarize)
+            if inspect.isawaitable(text):
+                text = await text
+        return [*system, self._remember(summarized, text), *kept]
+
+
+class ContextWindow:
+    """Keeps conversation sent to the model within its context window.
+
+    Conversation is left as is while it fits, otherwise strategies are applied
+    in order until it fits the context size less max_tokens, tools and reserve.
+
+        :param strategies: Strategies shrinking conversation, drop old tool results and trim by default
+        :param context_size: Tokens of model context window, known size of the model if not set
+        :param reserve: Tokens left free besides tokens to generate
+        :param counter: Counter of message tokens, rough estimate by default
+    """
+    def __init__(
+            self,
+            strategies: Optional[Sequence[BaseContextStrategy]] = None,
+            context_size: Optional[int] = None,
+            reserve: int = 0,
+            counter: Optional[BaseTokenCounter] = None
+    ) -> None:
+        self._strategies = list(strategies) if strategies is not None else [
+            DropToolResultsStrategy(),
+            TrimStrategy()
+        ]
+        self._context_size = context_size
+        self._reserve = reserve
+        self._counter = counter or EstimatingTokenCounter()
+
+    def budget(self, model: FoundationModel, max_tokens: Optional[int] = None, tools_tokens: int = 0) -> int:
+        """Returns tokens available to messages"""
+        context_size = self._context_size or MODEL2CONTEXT_SIZE[model]
+        return context_size - (max_tokens or COMPLETION_RESERVE_TOKENS) - tools_tokens - self._reserve
+
+    def fit(self, messages: list[BaseMessage], budget: int, client: Any = None) -> list[BaseMessage]:
+        """Returns conversation shrunk to fit budget, or as close to it as strategies get"""
+        counts = self._counter.count(messages, client)
+        for strategy in self._strategies:
+            if sum(counts) <= budget:
+                break
+            messages = strategy.apply(messages, counts, budget, self._counter, client)
+            counts = self._counter.count(messages, client)
+        return messages
+
+    async def afit(self, messages: list[BaseMessage], budget: int, client: Any = None) -> list[BaseMessage]:
+        """Returns conversation shrunk to fit budget, or as close to it as strategies get"""
+        counts = await self._counter.acount(messages, client)
+        for strategy in self._strategies:
+            if sum(counts) <= budget:
+                break
+            messages = await strategy.aapply(messages, counts, budget, self._counter, client)
+            counts = await self._counter.acount(messages, client)
+        return messages
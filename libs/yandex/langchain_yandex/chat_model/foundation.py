@@ -1,56 +1,208 @@
-from typing import Any, Optional, Sequence, Union, Callable
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    ContextManager,
+    Iterator,
+    Literal,
+    Optional,
+    Sequence,
+    Union,
+    Callable,
+    TYPE_CHECKING
+)
 
-from langchain_core.runnables import Runnable
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableMap, RunnablePassthrough
+from langchain_core.runnables.config import get_config_list
 from typing_extensions import TypedDict
 
-import json
 import logging
+import time
+from contextlib import nullcontext
+from operator import attrgetter, itemgetter
 
-from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.callbacks import (
+    CallbackManager,
+    AsyncCallbackManager,
+    CallbackManagerForLLMRun,
+    AsyncCallbackManagerForLLMRun
+)
 from langchain_core.language_models import BaseChatModel, LanguageModelInput
-from langchain_core.messages import BaseMessage
-from langchain_core.outputs import ChatResult
-from langchain_core.tools import BaseTool
+from langchain_core.language_models.chat_models import generate_from_stream, agenerate_from_stream
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatResult, ChatGenerationChunk, LLMResult
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
 
 from .base import _BaseFoundationModel
+from ..clients.foundation import BatchItem, RequestTimings, Priority, CLIENT_INFO_KEY
+from ..clients.foundation.batch import BatchPart, iter_batch_parts, aiter_batch_parts
+from ..clients.foundation.encoding import encode_payload
+from ..clients.foundation.exceptions import BudgetExceeded
+from .serialization import serialize_messages, serialize_tools, estimate_tools_tokens
 from .utils import (
-    convert_message_to_dict,
     convert_tool_to_dict,
-    create_chat_result
+    convert_tool_choice_to_dict,
+    convert_schema_to_json_schema,
+    create_chat_result,
+    create_chat_generation_chunk,
+    create_usage_metadata
 )
 
 logger = logging.getLogger(__name__)
 
+CACHE_EVENT = "foundation_model_cache"
+USAGE_TAG_KEY = "usage_tag"
+PRIORITY_KEY = "priority"
+TENANT_KEY = "tenant"
+DEADLINE_KEY = "deadline"
+
 
 class Payload(TypedDict):
     messages: list[dict[str, str]]
     tools: Optional[list[dict[str, str]]]
     stop: Optional[list[str]]
+    tool_choice: Optional[dict[str, Any]]
+    response_format: Optional[dict[str, Any]]
 
 
 class ChatFoundationModel(_BaseFoundationModel, BaseChatModel):
 
     def _build_payload(self, messages: list[BaseMessage], **kwargs: Any) -> Payload:
-        message_dicts = [convert_message_to_dict(message) for message in messages]
+        message_dicts = serialize_messages(messages)
         kwargs.pop("messages", None)
-        tool_dicts = [
-            convert_tool_to_dict(tool)
-            for tool in kwargs.pop("tools", [])
-            if isinstance(tool, BaseTool)
-        ]
+        tool_dicts = serialize_tools(kwargs.pop("tools", None) or [])
         stop = kwargs.pop("stop", None)
         payload = {
             "messages": message_dicts,
             "tools": tool_dicts if tool_dicts else None,
-            "stop": stop
+            "stop": stop,
+            "tool_choice": kwargs.pop("tool_choice", None),
+            "response_format": kwargs.pop("response_format", None)
         }
         if self.verbose:
             logger.warning(
                 "Foundation model request: %s",
-                json.dumps(payload, ensure_ascii=False)
+                encode_payload(payload).decode()
             )
         return payload
 
+    def _context_budget(self, tools: Optional[Sequence[Any]]) -> int:
+        return self.context_window.budget(self.model, self.max_tokens, estimate_tools_tokens(tools or ()))
+
+    def _fit_context(self, messages: list[BaseMessage], tools: Optional[Sequence[Any]]) -> list[BaseMessage]:
+        """Shrinks conversation to fit context window when it is managed"""
+        if self.context_window is None:
+            return messages
+        return self.context_window.fit(messages, self._context_budget(tools), self._client)
+
+    async def _afit_context(self, messages: list[BaseMessage], tools: Optional[Sequence[Any]]) -> list[BaseMessage]:
+        """Shrinks conversation to fit context window when it is managed"""
+        if self.context_window is None:
+            return messages
+        return await self.context_window.afit(messages, self._context_budget(tools), self._client)
+
+    def _admit(
+            self,
+            run_manager: Optional[Union[CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun]]
+    ) -> tuple[Any, Optional[str]]:
+        """Checks token budget of the caller tagged by run metadata
+
+        :return: Client to send request with, downgraded when budget is nearly spent, and caller tag
+        :raises BudgetExceeded: When budget of the caller is spent
+        """
+        if self.usage_ledger is None:
+            return self._client, None
+        metadata = run_manager.metadata if run_manager is not None else None
+        tag = (metadata or {}).get(USAGE_TAG_KEY, self.usage_tag)
+        model = self.usage_ledger.admit(self._top_model, tag)
+        return self._get_model_client(model), tag
+
+    def _record_usage(
+            self,
+            message: BaseMessage,
+            generation_info: Optional[dict[str, Any]],
+            client: Any,
+            tag: Optional[str]
+    ) -> None:
+        """Adds usage of the response to ledger, by model that actually answered"""
+        if self.usage_ledger is None or not isinstance(message, AIMessage) or message.usage_metadata is None:
+            return
+        usage = message.usage_metadata
+        self.usage_ledger.record(
+            (generation_info or {}).get("model_name") or client._model,
+            usage["input_tokens"],
+            usage["output_tokens"],
+            usage.get("output_token_details", {}).get("reasoning", 0),
+            folder_id=self.folder_id,
+            tag=tag
+        )
+
+    def _get_schedule_params(
+            self,
+            run_manager: Optional[Union[CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun]],
+            kwargs: dict[str, Any]
+    ) -> tuple[Priority, Optional[str], Optional[float]]:
+        """Returns priority, tenant and deadline of the request, taken from kwargs, run metadata or fields.
+
+        Deadline is given in seconds from the call.
+        """
+        metadata = (run_manager.metadata if run_manager is not None else None) or {}
+        priority = kwargs.get(PRIORITY_KEY, metadata.get(PRIORITY_KEY, self.priority))
+        tenant = kwargs.get(TENANT_KEY, metadata.get(TENANT_KEY, self.tenant))
+        deadline = kwargs.get(DEADLINE_KEY, metadata.get(DEADLINE_KEY))
+        return Priority(priority), tenant, None if deadline is None else time.monotonic() + deadline
+
+    def _schedule(
+            self,
+            run_manager: Optional[CallbackManagerForLLMRun],
+            kwargs: dict[str, Any]
+    ) -> ContextManager[None]:
+        """Waits for scheduler slot of the request when scheduling is enabled"""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(*self._get_schedule_params(run_manager, kwargs))
+
+    def _aschedule(
+            self,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun],
+            kwargs: dict[str, Any]
+    ) -> AsyncContextManager[None]:
+        """Waits for scheduler slot of the request when scheduling is enabled"""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.aslot(*self._get_schedule_params(run_manager, kwargs))
+
+    def _with_batch_priority(
+            self,
+            inputs: Sequence[LanguageModelInput],
+            config: Optional[Union[RunnableConfig, Sequence[RunnableConfig]]]
+    ) -> Optional[Union[RunnableConfig, list[RunnableConfig]]]:
+        """Gives batch priority to runs of a batch unless their metadata sets other one"""
+        if self.scheduler is None:
+            return config
+        return [
+            {**config, "metadata": {PRIORITY_KEY: Priority.BATCH, **(config.get("metadata") or {})}}
+            for config in get_config_list(config, len(inputs))
+        ]
+
+    @property
+    def _operation(self) -> str:
+        return "completion_async" if self._uses_iam_token else "completion"
+
+    @staticmethod
+    def _create_chat_result(response: dict[str, Any], timings: Optional[RequestTimings]) -> ChatResult:
+        """Converts response, attaching timings including conversion when instrumentation is enabled"""
+        if timings is None:
+            return create_chat_result(response)
+        with timings.phase("conversion"):
+            result = create_chat_result(response)
+        for generation in result.generations:
+            generation.generation_info["timings"] = timings.as_dict()
+        return result
+
     def _generate(
         self,
         messages: list[BaseMessage],
@@ -58,12 +210,28 @@ class ChatFoundationModel(_BaseFoundationModel, BaseChatModel):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(
+                self._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            )
+        client, tag = self._admit(run_manager)
+        messages = self._fit_context(messages, kwargs.get("tools"))
         payload = self._build_payload(messages, stop=stop, **kwargs)
-        if self.iam_token:
-            response = self._client.completion_async(**payload)
-        else:
-            response = self._client.completion(**payload)
-        return create_chat_result(response)
+        with self._schedule(run_manager, kwargs), client.instrument(self._operation) as timings:
+            if self._uses_iam_token:
+                response = client.completion_async(**payload)
+            else:
+                response = client.completion(**payload)
+            result = self._create_chat_result(response, timings)
+        generation = result.generations[0]
+        self._record_usage(generation.message, generation.generation_info, client, tag)
+        cache = result.generations[0].generation_info.get("cache")
+        if cache and run_manager:
+            CallbackManager(
+                handlers=run_manager.handlers,
+                parent_run_id=run_manager.run_id
+            ).on_custom_event(CACHE_EVENT, {"cache": cache}, run_id=run_manager.run_id)
+        return result
 
     async def _agenerate(
         self,
@@ -72,21 +240,425 @@ class ChatFoundationModel(_BaseFoundationModel, BaseChatModel):
         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> ChatResult:
+        if self.streaming:
+            return await agenerate_from_stream(
+                self._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            )
+        client, tag = self._admit(run_manager)
+        messages = await self._afit_context(messages, kwargs.get("tools"))
         payload = self._build_payload(messages, stop=stop, **kwargs)
-        if self.iam_token:
-            response = await self._client.acompletion_async(**payload)
+        async with self._aschedule(run_manager, kwargs):
+            with client.instrument(self._operation) as timings:
+                if self._uses_iam_token:
+                    response = await client.acompletion_async(**payload)
+                else:
+                    response = await client.acompletion(**payload)
+                result = self._create_chat_result(response, timings)
+        generation = result.generations[0]
+        self._record_usage(generation.message, generation.generation_info, client, tag)
+        cache = result.generations[0].generation_info.get("cache")
+        if cache and run_manager:
+            await AsyncCallbackManager(
+                handlers=run_manager.handlers,
+                parent_run_id=run_manager.run_id
+            ).on_custom_event(CACHE_EVENT, {"cache": cache}, run_id=run_manager.run_id)
+        return result
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        client, tag = self._admit(run_manager)
+        messages = self._fit_context(messages, kwargs.get("tools"))
+        payload = self._build_payload(messages, stop=stop, **kwargs)
+        text = ""
+        with self._schedule(run_manager, kwargs):
+            for response in client.stream_completion(**payload):
+                chunk, text = create_chat_generation_chunk(response, text)
+                if chunk is None:
+                    continue
+                self._record_usage(chunk.message, chunk.generation_info, client, tag)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        client, tag = self._admit(run_manager)
+        messages = await self._afit_context(messages, kwargs.get("tools"))
+        payload = self._build_payload(messages, stop=stop, **kwargs)
+        text = ""
+        async with self._aschedule(run_manager, kwargs):
+            async for response in client.astream_completion(**payload):
+                chunk, text = create_chat_generation_chunk(response, text)
+                if chunk is None:
+                    continue
+                self._record_usage(chunk.message, chunk.generation_info, client, tag)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    def _use_batch_api(self) -> bool:
+        return self._uses_iam_token and not self.streaming
+
+    def _prepare_batch(
+        self,
+        inputs: Sequence[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, list[RunnableConfig]]],
+        **kwargs: Any,
+    ) -> tuple[list[RunnableConfig], list[list[BaseMessage]], list[Payload], int]:
+        configs = get_config_list(config, len(inputs))
+        messages = [self._convert_input(input).to_messages() for input in inputs]
+        payloads = [
+            self._build_payload(self._fit_context(message_list, kwargs.get("tools")), **kwargs)
+            for message_list in messages
+        ]
+        max_in_flight = configs[0].get("max_concurrency") or self.batch_max_in_flight
+        return configs, messages, payloads, max_in_flight
+
+    async def _aprepare_batch(
+        self,
+        inputs: Sequence[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, list[RunnableConfig]]],
+        **kwargs: Any,
+    ) -> tuple[list[RunnableConfig], list[list[BaseMessage]], list[Payload], int]:
+        configs = get_config_list(config, len(inputs))
+        messages = [self._convert_input(input).to_messages() for input in inputs]
+        payloads = [
+            self._build_payload(await self._afit_context(message_list, kwargs.get("tools")), **kwargs)
+            for message_list in messages
+        ]
+        max_in_flight = configs[0].get("max_concurrency") or self.batch_max_in_flight
+        return configs, messages, payloads, max_in_flight
+
+    def _configure_batch_run(self, config: RunnableConfig, **kwargs: Any) -> dict[str, Any]:
+        return {
+            "inheritable_callbacks": config.get("callbacks"),
+            "local_callbacks": self.callbacks,
+            "verbose": self.verbose,
+            "inheritable_tags": config.get("tags"),
+            "local_tags": self.tags,
+            "inheritable_metadata": {
+                **(config.get("metadata") or {}),
+                **self._get_ls_params(**kwargs)
+            },
+            "local_metadata": self.metadata,
+        }
+
+    def _start_batch_runs(
+        self,
+        configs: list[RunnableConfig],
+        messages: list[list[BaseMessage]],
+        **kwargs: Any,
+    ) -> list[CallbackManagerForLLMRun]:
+        run_managers = []
+        for config, message_list in zip(configs, messages):
+            callback_manager = CallbackManager.configure(**self._configure_batch_run(config, **kwargs))
+            run_managers.extend(callback_manager.on_chat_model_start(
+                self._serialized,
+                [message_list],
+                invocation_params=self._get_invocation_params(**kwargs),
+                options={"stop": kwargs.get("stop")},
+                name=config.get("run_name"),
+                run_id=config.get("run_id"),
+                batch_size=1
+            ))
+        return run_managers
+
+    async def _astart_batch_runs(
+        self,
+        configs: list[RunnableConfig],
+        messages: list[list[BaseMessage]],
+        **kwargs: Any,
+    ) -> list[AsyncCallbackManagerForLLMRun]:
+        run_managers = []
+        for config, message_list in zip(configs, messages):
+            callback_manager = AsyncCallbackManager.configure(**self._configure_batch_run(config, **kwargs))
+            run_managers.extend(await callback_manager.on_chat_model_start(
+                self._serialized,
+                [message_list],
+                invocation_params=self._get_invocation_params(**kwargs),
+                options={"stop": kwargs.get("stop")},
+                name=config.get("run_name"),
+                run_id=config.get("run_id"),
+                batch_size=1
+            ))
+        return run_managers
+
+    def _admit_batch(
+        self,
+        payloads: list[Payload],
+        run_managers: Sequence[Union[CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun]]
+    ) -> tuple[list[BatchPart], dict[int, tuple[Any, Optional[str]]], list[BatchItem]]:
+        """Splits batch by clients admitted for every caller, rejected payloads become failed items"""
+        parts: dict[int, BatchPart] = {}
+        admitted = {}
+        rejected = []
+        for index, (payload, run_manager) in enumerate(zip(payloads, run_managers)):
+            try:
+                client, tag = self._admit(run_manager)
+            except BudgetExceeded as e:
+                rejected.append(BatchItem(index, error=e))
+                continue
+            _, indexes, part_payloads = parts.setdefault(id(client), (client, [], []))
+            indexes.append(index)
+            part_payloads.append(payload)
+            admitted[index] = (client, tag)
+        return list(parts.values()), admitted, rejected
+
+    def _record_batch_usage(self, item: BatchItem, client: Any, tag: Optional[str]) -> None:
+        if item.ok and "usage" in item.result["result"]:
+            self._record_usage(
+                AIMessage(content="", usage_metadata=create_usage_metadata(item.result["result"]["usage"])),
+                item.result.get(CLIENT_INFO_KEY),
+                client,
+                tag
+            )
+
+    def _iter_batch_items(
+        self,
+        payloads: list[Payload],
+        run_managers: list[CallbackManagerForLLMRun],
+        max_in_flight: int
+    ) -> Iterator[BatchItem]:
+        """Runs deferred completions of admitted payloads, accounting their usage"""
+        if self.usage_ledger is None:
+            yield from self._client.iter_batch_completion_async(payloads, max_in_flight=max_in_flight)
+            return
+        parts, admitted, rejected = self._admit_batch(payloads, run_managers)
+        yield from rejected
+        for item in iter_batch_parts(parts, max_in_flight):
+            self._record_batch_usage(item, *admitted[item.index])
+            yield item
+
+    async def _aiter_batch_items(
+        self,
+        payloads: list[Payload],
+        run_managers: list[AsyncCallbackManagerForLLMRun],
+        max_in_flight: int
+    ) -> AsyncIterator[BatchItem]:
+        """Runs deferred completions of admitted payloads, accounting their usage"""
+        if self.usage_ledger is None:
+            async for item in self._client.aiter_batch_completion_async(payloads, max_in_flight=max_in_flight):
+                yield item
+            return
+        parts, admitted, rejected = self._admit_batch(payloads, run_managers)
+        for item in rejected:
+            yield item
+        async for item in aiter_batch_parts(parts, max_in_flight):
+            self._record_batch_usage(item, *admitted[item.index])
+            yield item
+
+    @staticmethod
+    def _finish_batch_item(
+        item: BatchItem,
+        run_manager: CallbackManagerForLLMRun
+    ) -> Union[BaseMessage, Exception]:
+        if not item.ok:
+            run_manager.on_llm_error(item.error)
+            return item.error
+        result = create_chat_result(item.result)
+        run_manager.on_llm_end(LLMResult(generations=[result.generations], llm_output=result.llm_output))
+        return result.generations[0].message
+
+    @staticmethod
+    async def _afinish_batch_item(
+        item: BatchItem,
+        run_manager: AsyncCallbackManagerForLLMRun
+    ) -> Union[BaseMessage, Exception]:
+        if not item.ok:
+            await run_manager.on_llm_error(item.error)
+            return item.error
+        result = create_chat_result(item.result)
+        await run_manager.on_llm_end(LLMResult(generations=[result.generations], llm_output=result.llm_output))
+        return result.generations[0].message
+
+    def batch(
+        self,
+        inputs: list[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, list[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> list[BaseMessage]:
+        """Runs inputs as deferred completions when IAM token is set,
+        otherwise falls back to the default batch implementation.
+
+        Deferred completions bypass the scheduler: operations run on the server,
+        so their submits and polls are bounded by batch_max_in_flight instead of
+        holding scheduler slots interactive requests wait for.
+        """
+        if not inputs or not self._use_batch_api():
+            config = self._with_batch_priority(inputs, config)
+            return super().batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        configs, messages, payloads, max_in_flight = self._prepare_batch(inputs, config, **kwargs)
+        run_managers = self._start_batch_runs(configs, messages, **kwargs)
+        if self.usage_ledger is None:
+            items = self._client.batch_completion_async(payloads, max_in_flight=max_in_flight)
         else:
-            response = await self._client.acompletion(**payload)
-        return create_chat_result(response)
+            items = sorted(self._iter_batch_items(payloads, run_managers, max_in_flight), key=attrgetter("index"))
+        outputs = [self._finish_batch_item(item, run_managers[item.index]) for item in items]
+        if not return_exceptions:
+            for output in outputs:
+                if isinstance(output, Exception):
+                    raise output
+        return outputs
+
+    async def abatch(
+        self,
+        inputs: list[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, list[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> list[BaseMessage]:
+        """Runs inputs as deferred completions when IAM token is set,
+        otherwise falls back to the default batch implementation.
+
+        Deferred completions bypass the scheduler: operations run on the server,
+        so their submits and polls are bounded by batch_max_in_flight instead of
+        holding scheduler slots interactive requests wait for.
+        """
+        if not inputs or not self._use_batch_api():
+            config = self._with_batch_priority(inputs, config)
+            return await super().abatch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        configs, messages, payloads, max_in_flight = await self._aprepare_batch(inputs, config, **kwargs)
+        run_managers = await self._astart_batch_runs(configs, messages, **kwargs)
+        if self.usage_ledger is None:
+            items = await self._client.abatch_completion_async(payloads, max_in_flight=max_in_flight)
+        else:
+            items = sorted(
+                [item async for item in self._aiter_batch_items(payloads, run_managers, max_in_flight)],
+                key=attrgetter("index")
+            )
+        outputs = [await self._afinish_batch_item(item, run_managers[item.index]) for item in items]
+        if not return_exceptions:
+            for output in outputs:
+                if isinstance(output, Exception):
+                    raise output
+        return outputs
+
+    def batch_as_completed(
+        self,
+        inputs: Sequence[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, Sequence[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> Iterator[tuple[int, Union[BaseMessage, Exception]]]:
+        if not inputs or not self._use_batch_api():
+            config = self._with_batch_priority(inputs, config)
+            yield from super().batch_as_completed(
+                inputs, config, return_exceptions=return_exceptions, **kwargs
+            )
+            return
+        configs, messages, payloads, max_in_flight = self._prepare_batch(inputs, config, **kwargs)
+        run_managers = self._start_batch_runs(configs, messages, **kwargs)
+        for item in self._iter_batch_items(payloads, run_managers, max_in_flight):
+            output = self._finish_batch_item(item, run_managers[item.index])
+            if isinstance(output, Exception) and not return_exceptions:
+                raise output
+            yield item.index, output
+
+    async def abatch_as_completed(
+        self,
+        inputs: Sequence[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, Sequence[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> AsyncIterator[tuple[int, Union[BaseMessage, Exception]]]:
+        if not inputs or not self._use_batch_api():
+            config = self._with_batch_priority(inputs, config)
+            async for output in super().abatch_as_completed(
+                inputs, config, return_exceptions=return_exceptions, **kwargs
+            ):
+                yield output
+            return
+        configs, messages, payloads, max_in_flight = await self._aprepare_batch(inputs, config, **kwargs)
+        run_managers = await self._astart_batch_runs(configs, messages, **kwargs)
+        async for item in self._aiter_batch_items(payloads, run_managers, max_in_flight):
+            output = await self._afinish_batch_item(item, run_managers[item.index])
+            if isinstance(output, Exception) and not return_exceptions:
+                raise output
+            yield item.index, output
 
     def bind_tools(
         self,
         tools: Sequence[
-            Union[dict[str, Any], type, Callable, BaseTool]  # noqa: UP006
+            Union[dict[str, Any], type, Callable, "BaseTool"]  # noqa: UP006
         ],
         *,
-        tool_choice: Optional[Union[str]] = None,
+        tool_choice: Optional[Union[str, bool, dict[str, Any]]] = None,
         **kwargs: Any,
     ) -> Runnable[LanguageModelInput, BaseMessage]:
         formatted_tools = [convert_tool_to_dict(tool) for tool in tools]
+        if tool_choice is not None:
+            kwargs["tool_choice"] = convert_tool_choice_to_dict(tool_choice)
         return super().bind(tools=formatted_tools, **kwargs)
+
+    def with_structured_output(
+        self,
+        schema: Optional[Union[dict[str, Any], type]] = None,
+        *,
+        method: Literal["json_schema", "function_calling", "json_mode"] = "json_schema",
+        include_raw: bool = False,
+        **kwargs: Any,
+    ) -> Runnable[LanguageModelInput, Any]:
+        """Returns model whose output is parsed into schema.
+
+        With ``json_schema`` and ``json_mode`` methods output is constrained to JSON and
+        streamed output is parsed incrementally, yielding partial dicts as top level fields complete,
+        while a field failing validation stops generation at once.
+        Tool call arguments of ``function_calling`` method are not streamed, so they are parsed at the end.
+
+        :param schema: Pydantic model, TypedDict, function or JSON schema, optional for ``json_mode``
+        :param method: ``json_schema`` to constrain output with schema, ``function_calling``
+            to force the model to call schema as a tool or ``json_mode`` for any JSON object
+        :param include_raw: Whether to return dict with ``raw`` message, ``parsed`` output and ``parsing_error``
+        :return: Runnable returning pydantic object or dict
+        """
+        if kwargs:
+            raise ValueError(f"Received unsupported arguments {kwargs}")
+        # Output parsers are loaded only by models asked for structured output
+        from .structured import StructuredOutputParser
+
+        is_pydantic = isinstance(schema, type) and issubclass(schema, BaseModel)
+        if method == "function_calling":
+            if schema is None:
+                raise ValueError("Schema is required for function_calling method")
+            from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser, PydanticToolsParser
+
+            name = convert_tool_to_dict(schema)["function"]["name"]
+            model = self.bind_tools([schema], tool_choice=name)
+            if is_pydantic:
+                parser = PydanticToolsParser(tools=[schema], first_tool_only=True)
+            else:
+                parser = JsonOutputKeyToolsParser(key_name=name, first_tool_only=True)
+        elif method in ("json_schema", "json_mode"):
+            json_schema = convert_schema_to_json_schema(schema) if schema is not None else None
+            if method == "json_schema":
+                if json_schema is None:
+                    raise ValueError("Schema is required for json_schema method")
+                model = self.bind(response_format={"jsonSchema": {"schema": json_schema}})
+            else:
+                model = self.bind(response_format={"jsonObject": True})
+            parser = StructuredOutputParser(
+                pydantic_object=schema if is_pydantic else None,
+                json_schema=None if is_pydantic else json_schema
+            )
+        else:
+            raise ValueError(f"Unknown structured output method {method}")
+        if not include_raw:
+            return model | parser
+        parsed = RunnablePassthrough.assign(parsed=itemgetter("raw") | parser, parsing_error=lambda _: None)
+        unparsed = RunnablePassthrough.assign(parsed=lambda _: None)
+        return RunnableMap(raw=model) | parsed.with_fallbacks([unparsed], exception_key="parsing_error")
@@ -0,0 +1,168 @@
+from typing import Any, Sequence
+
+import threading
+import weakref
+from collections import OrderedDict
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from .utils import convert_message_to_dict, convert_tool_to_dict
+
+from ..clients.foundation.constants import CHARS_PER_TOKEN
+from ..clients.foundation.encoding import EncodedList, dumps
+
+TOOL_CACHE_SIZE = 256
+# Role and structure of message take a few tokens besides its text
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TOOL_RESULTS_MARKER = b'"toolResults":['
+TOOL_RESULTS_END = b"]}}"
+
+# Messages are unhashable pydantic models, so entries are keyed by id
+# and dropped by weak reference callback when the message is collected
+_message_cache: dict[int, tuple["weakref.ref[BaseMessage]", tuple, dict[str, Any], bytes, int]] = {}
+_tool_cache: OrderedDict[tuple, tuple[Any, dict[str, Any], bytes]] = OrderedDict()
+_lock = threading.RLock()
+
+
+def _fingerprint(message: BaseMessage) -> tuple:
+    """Returns parts of message its converted dict depends on.
+
+    Strings are immutable and compared by identity first, so unchanged messages
+    of the conversation history are recognized in constant time. Mutable content
+    and tool calls are encoded, so they are compared by value and edits in place are seen.
+    """
+    content = message.content
+    tool_calls = getattr(message, "tool_calls", None)
+    return (
+        content if isinstance(content, str) else dumps(content),
+        message.type,
+        getattr(message, "name", None),
+        dumps(tool_calls) if tool_calls else None
+    )
+
+
+def _serialize_message(message: BaseMessage) -> tuple[dict[str, Any], bytes, int]:
+    key = id(message)
+    fingerprint = _fingerprint(message)
+    with _lock:
+        cached = _message_cache.get(key)
+    if cached is not None and cached[0]() is message and cached[1] == fingerprint:
+        return cached[2], cached[3], cached[4]
+    message_dict = convert_message_to_dict(message)
+    fragment = dumps(message_dict)
+    tokens = len(fragment.decode()) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+    reference = weakref.ref(message, lambda ref: _forget_message(key, ref))
+    with _lock:
+        _message_cache[key] = (reference, fingerprint, message_dict, fragment, tokens)
+    return message_dict, fragment, tokens
+
+
+def serialize_message(message: BaseMessage) -> tuple[dict[str, Any], bytes]:
+    """Converts message to dict and JSON fragment, reusing them for already seen messages"""
+    message_dict, fragment, _ = _serialize_message(message)
+    return message_dict, fragment
+
+
+def estimate_message_tokens(message: BaseMessage) -> int:
+    """Roughly estimates tokens of message, computed once together with its JSON fragment"""
+    return _serialize_message(message)[2]
+
+
+def _forget_message(key: int, reference: "weakref.ref[BaseMessage]") -> None:
+    with _lock:
+        cached = _message_cache.get(key)
+        if cached is not None and cached[0] is reference:
+            del _message_cache[key]
+
+
+def _merge_tool_results(serialized: list[tuple[dict[str, Any], bytes]]) -> tuple[dict[str, Any], bytes]:
+    """Packs results of several tools into one message, splicing their cached fragments"""
+    message_dict = {
+        "role": serialized[0][0]["role"],
+        "toolResultList": {
+            "toolResults": [
+                result
+                for tool_dict, _ in serialized
+                for result in tool_dict["toolResultList"]["toolResults"]
+            ]
+        }
+    }
+    fragments = [fragment for _, fragment in serialized]
+    start = fragments[0].find(TOOL_RESULTS_MARKER) + len(TOOL_RESULTS_MARKER)
+    prefix = fragments[0][:start]
+    if start < len(TOOL_RESULTS_MARKER) or not all(
+            fragment.startswith(prefix) and fragment.endswith(TOOL_RESULTS_END) for fragment in fragments
+    ):
+        return message_dict, dumps(message_dict)
+    results = b",".join(fragment[start:-len(TOOL_RESULTS_END)] for fragment in fragments)
+    return message_dict, prefix + results + TOOL_RESULTS_END
+
+
+def _group_tool_results(
+        messages: Sequence[BaseMessage],
+        serialized: list[tuple[dict[str, Any], bytes]]
+) -> list[tuple[dict[str, Any], bytes]]:
+    """Merges consecutive tool messages, so results of one turn are sent in one message"""
+    grouped: list[tuple[dict[str, Any], bytes]] = []
+    run: list[tuple[dict[str, Any], bytes]] = []
+    for message, item in zip(messages, serialized):
+        if isinstance(message, ToolMessage):
+            run.append(item)
+            continue
+        if run:
+            grouped.append(run[0] if len(run) == 1 else _merge_tool_results(run))
+            run = []
+        grouped.append(item)
+    if run:
+        grouped.append(run[0] if len(run) == 1 else _merge_tool_results(run))
+    return grouped
+
+
+def serialize_messages(messages: Sequence[BaseMessage]) -> EncodedList:
+    """Converts conversation, so only messages new since previous turn are encoded"""
+    serialized = [serialize_message(message) for message in messages]
+    if len(serialized) > 1:
+        serialized = _group_tool_results(messages, serialized)
+    return EncodedList(
+        (message_dict for message_dict, _ in serialized),
+        (fragment for _, fragment in serialized)
+    )
+
+
+def _tool_key(tool: Any) -> tuple:
+    from langchain_core.tools import BaseTool
+
+    if isinstance(tool, BaseTool):
+        return id(tool), tool.name, tool.description, id(tool.args_schema)
+    return (id(tool),)
+
+
+def serialize_tool(tool: Any) -> tuple[dict[str, Any], bytes]:
+    """Converts tool to dict and JSON fragment memoized by tool identity and version"""
+    key = _tool_key(tool)
+    with _lock:
+        cached = _tool_cache.get(key)
+        if cached is not None and cached[0] is tool:
+            _tool_cache.move_to_end(key)
+            return cached[1], cached[2]
+    tool_dict = tool if isinstance(tool, dict) else convert_tool_to_dict(tool)
+    fragment = dumps(tool_dict)
+    with _lock:
+        _tool_cache[key] = (tool, tool_dict, fragment)
+        while len(_tool_cache) > TOOL_CACHE_SIZE:
+            _tool_cache.popitem(last=False)
+    return tool_dict, fragment
+
+
+def estimate_tools_tokens(tools: Sequence[Any]) -> int:
+    """Roughly estimates tokens of tools definitions"""
+    return sum(len(fragment) for _, fragment in map(serialize_tool, tools)) // CHARS_PER_TOKEN
+
+
+def serialize_tools(tools: Sequence[Any]) -> EncodedList:
+    serialized = [serialize_tool(tool) for tool in tools]
+    return EncodedList(
+        (tool_dict for tool_dict, _ in serialized),
+        (fragment for _, fragment in serialized)
+    )
@@ -0,0 +1,398 @@
+from typing import Annotated, Any, AsyncIterator, Iterator, Optional, Union
+
+import json
+import re
+from functools import lru_cache
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers.transform import BaseTransformOutputParser
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+# Location of value in parsed document, e.g. ("items", 0, "name")
+JsonPath = tuple[Union[str, int], ...]
+
+# First key and value states of just opened containers are the only ones allowed to close them
+START, VALUE, FIRST_VALUE, KEY, FIRST_KEY, COLON, AFTER_VALUE, STRING, LITERAL, DONE = range(10)
+
+DOCUMENT_START = re.compile(r"[{\[]")
+STRING_SPECIAL = re.compile(r'["\\]')
+LITERAL_END = re.compile(r"[\s,\]}]")
+WHITESPACE = " \t\r\n"
+LITERAL_START = "-0123456789tfn"
+# Characters of output between partials yielded for completed nested values
+PARTIAL_INTERVAL = 256
+
+# Models put raw line breaks into strings, so control characters are allowed
+DECODER = json.JSONDecoder(strict=False)
+
+JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+    "null": (type(None),)
+}
+
+
+class IncrementalJsonParser:
+    """Push parser of JSON document received in pieces.
+
+    Every character is scanned once and values are put into their containers
+    as soon as they are parsed, so partial document is available after every piece
+    without parsing the text again. Strings and numbers appear when they are complete.
+    Text before the first bracket and after the document, e.g. markdown fence, is skipped.
+    """
+    def __init__(self) -> None:
+        self._state = START
+        self._root: Any = None
+        # Open containers with their paths and pending object keys
+        self._stack: list[Union[dict[str, Any], list[Any]]] = []
+        self._paths: list[JsonPath] = []
+        self._keys: list[Optional[str]] = []
+        self._buffer: list[str] = []
+        self._escaped = False
+        self._is_key = False
+        self._offset = 0
+        self._completed: list[tuple[JsonPath, Any]] = []
+
+    @property
+    def value(self) -> Any:
+        """Document parsed so far, None before it starts"""
+        return self._root
+
+    @property
+    def done(self) -> bool:
+        return self._state == DONE
+
+    def snapshot(self) -> Any:
+        """Returns copy of document parsed so far, which further pieces don't change.
+
+        Only containers still open are copied, complete values are shared with the parser.
+        """
+        if not self._stack:
+            return self._root
+        root = parent = _copy_container(self._stack[0])
+        for container, path in zip(self._stack[1:], self._paths[1:]):
+            child = _copy_container(container)
+            parent[path[-1]] = child
+            parent = child
+        return root
+
+    def feed(self, text: str) -> list[tuple[JsonPath, Any]]:
+        """Parses next piece of the document
+
+        :param text: Piece of the document
+        :return: Paths and values completed by the piece, inner values first
+        :raises ValueError: When text is not valid JSON
+        """
+        self._completed = []
+        index, length = 0, len(text)
+        while index < length and self._state != DONE:
+            state = self._state
+            if state == STRING:
+                index = self._scan_string(text, index)
+            elif state == LITERAL:
+                index = self._scan_literal(text, index)
+            elif state == START:
+                match = DOCUMENT_START.search(text, index)
+                if match is None:
+                    break
+                self._open(text[match.start()])
+                index = match.end()
+            elif text[index] in WHITESPACE:
+                index += 1
+            else:
+                self._step(text[index], index)
+                index += 1
+        self._offset += length
+        return self._completed
+
+    def close(self) -> Any:
+        """Returns complete document
+
+        :raises ValueError: When the document is incomplete
+        """
+        if self._state != DONE:
+            raise ValueError("JSON document is incomplete")
+        return self._root
+
+    def _error(self, char: str, index: int) -> ValueError:
+        return ValueError(f"Unexpected {char!r} at character {self._offset + index}")
+
+    def _step(self, char: str, index: int) -> None:
+        """Handles structural character in states other than string, literal and start"""
+        state = self._state
+        if state == VALUE or state == FIRST_VALUE:
+            if char in "{[":
+                self._open(char)
+            elif char == '"':
+                self._is_key = False
+                self._state = STRING
+            elif char in LITERAL_START:
+                self._buffer.append(char)
+                self._state = LITERAL
+            elif char == "]" and state == FIRST_VALUE:
+                self._close()
+            else:
+                raise self._error(char, index)
+        elif state == KEY or state == FIRST_KEY:
+            if char == '"':
+                self._is_key = True
+                self._state = STRING
+            elif char == "}" and state == FIRST_KEY:
+                self._close()
+            else:
+                raise self._error(char, index)
+        elif state == COLON:
+            if char != ":":
+                raise self._error(char, index)
+            self._state = VALUE
+        elif state == AFTER_VALUE:
+            container = self._stack[-1]
+            if char == ",":
+                self._state = KEY if isinstance(container, dict) else VALUE
+            elif char == ("}" if isinstance(container, dict) else "]"):
+                self._close()
+            else:
+                raise self._error(char, index)
+
+    def _put(self, value: Any) -> JsonPath:
+        """Places value into the open container, returns its path"""
+        if not self._stack:
+            self._root = value
+            return ()
+        container = self._stack[-1]
+        if isinstance(container, dict):
+            key = self._keys[-1]
+            container[key] = value
+            return self._paths[-1] + (key,)
+        container.append(value)
+        return self._paths[-1] + (len(container) - 1,)
+
+    def _complete(self, path: JsonPath, value: Any) -> None:
+        self._completed.append((path, value))
+        self._state = AFTER_VALUE if self._stack else DONE
+
+    def _open(self, char: str) -> None:
+        container: Union[dict[str, Any], list[Any]] = {} if char == "{" else []
+        self._paths.append(self._put(container))
+        self._stack.append(container)
+        self._keys.append(None)
+        self._state = FIRST_KEY if char == "{" else FIRST_VALUE
+
+    def _close(self) -> None:
+        container = self._stack.pop()
+        self._keys.pop()
+        self._complete(self._paths.pop(), container)
+
+    def _scan_string(self, text: str, index: int) -> int:
+        start, length = index, len(text)
+        while index < length:
+            if self._escaped:
+                self._escaped = False
+                index += 1
+                continue
+            match = STRING_SPECIAL.search(text, index)
+            if match is None:
+                break
+            index = match.start()
+            if text[index] == "\\":
+                self._escaped = True
+                index += 1
+                continue
+            self._buffer.append(text[start:index])
+            raw = "".join(self._buffer)
+            self._buffer = []
+            try:
+                value = DECODER.decode(f'"{raw}"')
+            except ValueError as e:
+                raise ValueError(f"Invalid string ending at character {self._offset + index}: {e}") from e
+            if self._is_key:
+                self._keys[-1] = value
+                self._state = COLON
+            else:
+                self._complete(self._put(value), value)
+            return index + 1
+        self._buffer.append(text[start:])
+        return length
+
+    def _scan_literal(self, text: str, index: int) -> int:
+        match = LITERAL_END.search(text, index)
+        if match is None:
+            self._buffer.append(text[index:])
+            return len(text)
+        self._buffer.append(text[index:match.start()])
+        literal = "".join(self._buffer)
+        self._buffer = []
+        try:
+            value = DECODER.decode(literal)
+        except ValueError:
+            raise ValueError(f"Invalid literal {literal!r} ending at character {self._offset + match.start()}") from None
+        self._complete(self._put(value), value)
+        return match.start()
+
+
+def _copy_container(container: Union[dict[str, Any], list[Any]]) -> Union[dict[str, Any], list[Any]]:
+    return dict(container) if isinstance(container, dict) else list(container)
+
+
+@lru_cache(maxsize=None)
+def _get_field_adapter(model: type[BaseModel], name: str) -> Optional[TypeAdapter]:
+    """Returns validator of model field by its name or alias, None for unknown field"""
+    for field_name, field in model.model_fields.items():
+        if name in (field_name, field.alias, field.validation_alias):
+            if field.metadata:
+                return TypeAdapter(Annotated[field.annotation, *field.metadata])
+            return TypeAdapter(field.annotation)
+    return None
+
+
+def _check_json_type(value: Any, schema: dict[str, Any]) -> Optional[str]:
+    """Checks type and enum of JSON schema, returns error or None"""
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        allowed = tuple(python_type for name in types for python_type in JSON_TYPES.get(name, (object,)))
+        if not isinstance(value, allowed) or (isinstance(value, bool) and bool not in allowed):
+            return f"expected {' or '.join(types)}, got {type(value).__name__}"
+    if "enum" in schema and value not in schema["enum"]:
+        return f"expected one of {schema['enum']}"
+    return None
+
+
+class StructuredOutputParser(BaseTransformOutputParser[Any]):
+    """Parses JSON output of the model, validating it against schema.
+
+    Streamed output is parsed incrementally: partial dicts are yielded as their top level fields complete,
+    or nested values do after partial_interval characters, and the last value is validated against schema.
+    Complete top level field failing validation raises OutputParserException at once,
+    which stops the stream before the rest is generated.
+
+        :param pydantic_object: Pydantic model output is validated into
+        :param json_schema: JSON schema whose types and required fields are checked when there is no pydantic model
+        :param partial_interval: Characters of output after which completed nested values are yielded
+    """
+    pydantic_object: Optional[type[BaseModel]] = None
+    json_schema: Optional[dict[str, Any]] = None
+    partial_interval: int = PARTIAL_INTERVAL
+
+    @property
+    def _type(self) -> str:
+        return "foundation_model_structured_output"
+
+    def parse(self, text: str) -> Any:
+        parser = IncrementalJsonParser()
+        try:
+            parser.feed(text)
+            value = parser.close()
+        except ValueError as e:
+            raise OutputParserException(f"Invalid JSON output: {e}", llm_output=text) from e
+        return self._validate(value, text)
+
+    def _check_field(self, name: str, value: Any) -> Optional[str]:
+        """Validates complete top level field, returns error or None"""
+        if self.pydantic_object is not None:
+            adapter = _get_field_adapter(self.pydantic_object, name)
+            if adapter is None:
+                return "unknown field" if self.pydantic_object.model_config.get("extra") == "forbid" else None
+            try:
+                adapter.validate_python(value)
+            except ValidationError as e:
+                return str(e)
+            return None
+        if self.json_schema is None:
+            return None
+        schema = self.json_schema.get("properties", {}).get(name)
+        if schema is None:
+            return "unknown field" if self.json_schema.get("additionalProperties") is False else None
+        return _check_json_type(value, schema)
+
+    def _validate(self, value: Any, text: str) -> Any:
+        if self.pydantic_object is not None:
+            try:
+                return self.pydantic_object.model_validate(value)
+            except ValidationError as e:
+                raise OutputParserException(f"Output doesn't match schema: {e}", llm_output=text) from e
+        if self.json_schema is None:
+            return value
+        error = _check_json_type(value, self.json_schema)
+        if error is None and isinstance(value, dict):
+            missing = [name for name in self.json_schema.get("required", []) if name not in value]
+            if missing:
+                error = f"missing required fields {', '.join(missing)}"
+            for name, field in value.items():
+                error = error or self._check_field(name, field)
+        if error is not None:
+            raise OutputParserException(f"Output doesn't match schema: {error}", llm_output=text)
+        return value
+
+    def _feed(
+        self,
+        parser: IncrementalJsonParser,
+        chunk: Union[str, BaseMessage],
+        parts: list[str]
+    ) -> list[tuple[JsonPath, Any]]:
+        """Parses streamed chunk, returns values it completed"""
+        text = chunk if isinstance(chunk, str) else chunk.content
+        parts.append(text)
+        try:
+            completed = parser.feed(text)
+        except ValueError as e:
+            raise OutputParserException(f"Invalid JSON output: {e}", llm_output="".join(parts)) from e
+        if isinstance(parser.value, dict):
+            for path, value in completed:
+                if len(path) != 1:
+                    continue
+                error = self._check_field(path[0], value)
+                if error is not None:
+                    raise OutputParserException(
+                        f"Output field {path[0]} doesn't match schema: {error}",
+                        llm_output="".join(parts)
+                    )
+        return completed
+
+    def _is_partial_due(
+        self,
+        parser: IncrementalJsonParser,
+        completed: list[tuple[JsonPath, Any]],
+        pending: int
+    ) -> bool:
+        """Whether partial document is yielded after values were completed by pending characters"""
+        if not completed or parser.done:
+            return False
+        return pending >= self.partial_interval or any(len(path) == 1 for path, _ in completed)
+
+    def _finish(self, parser: IncrementalJsonParser, parts: list[str]) -> Any:
+        text = "".join(parts)
+        try:
+            value = parser.close()
+        except ValueError as e:
+            raise OutputParserException(f"Invalid JSON output: {e}", llm_output=text) from e
+        return self._validate(value, text)
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Any]:
+        parser = IncrementalJsonParser()
+        parts: list[str] = []
+        pending = 0
+        for chunk in input:
+            completed = self._feed(parser, chunk, parts)
+            pending += len(parts[-1])
+            if self._is_partial_due(parser, completed, pending):
+                pending = 0
+                yield parser.snapshot()
+        yield self._finish(parser, parts)
+
+    async def _atransform(self, input: AsyncIterator[Union[str, BaseMessage]]) -> AsyncIterator[Any]:
+        parser = IncrementalJsonParser()
+        parts: list[str] = []
+        pending = 0
+        async for chunk in input:
+            completed = self._feed(parser, chunk, parts)
+            pending += len(parts[-1])
+            if self._is_partial_due(parser, completed, pending):
+                pending = 0
+                yield parser.snapshot()
+        yield self._finish(parser, parts)
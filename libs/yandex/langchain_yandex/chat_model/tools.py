@@ -0,0 +1,205 @@
+from typing import Any, Callable, Optional, Sequence, Union
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import copy_context
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AIMessage, BaseMessage, ToolCall, ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool, tool as create_tool
+
+from .foundation import ChatFoundationModel
+
+TOOL_WORKERS = 16
+TOOL_MAX_ITERATIONS = 10
+
+
+class ToolRunner:
+    """Runs tool calls of assistant turn concurrently, so turn takes as long as its slowest tool.
+
+    Async tools are awaited concurrently and sync tools run in thread pool.
+    Results of one turn follow each other and are sent to the model in one message.
+
+        :param model: Chat model calling tools
+        :param tools: Tools or functions available to the model
+        :param timeout: Seconds every tool call may take, None to wait forever
+        :param timeouts: Seconds calls of particular tools may take, by tool name
+        :param max_workers: Maximum number of threads running sync tools
+        :param handle_errors: Whether to return errors and timeouts to the model instead of raising them
+        :param max_iterations: Maximum number of model turns made by run
+    """
+    def __init__(
+            self,
+            model: ChatFoundationModel,
+            tools: Sequence[Union[BaseTool, Callable[..., Any]]],
+            timeout: Optional[float] = None,
+            timeouts: Optional[dict[str, float]] = None,
+            max_workers: int = TOOL_WORKERS,
+            handle_errors: bool = True,
+            max_iterations: int = TOOL_MAX_ITERATIONS
+    ) -> None:
+        self._tools = {
+            tool.name: tool
+            for tool in (tool if isinstance(tool, BaseTool) else create_tool(tool) for tool in tools)
+        }
+        self._chat_model = model
+        self._model = model.bind_tools(list(self._tools.values()))
+        self._timeout = timeout
+        self._timeouts = timeouts or {}
+        self._max_workers = max_workers
+        self._handle_errors = handle_errors
+        self._max_iterations = max_iterations
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="foundation-model-tools"
+                )
+            return self._executor
+
+    def _get_timeout(self, name: str) -> Optional[float]:
+        return self._timeouts.get(name, self._timeout)
+
+    def _get_tool(self, tool_call: ToolCall) -> BaseTool:
+        tool = self._tools.get(tool_call["name"])
+        if tool is None:
+            raise ValueError(f"Model called unknown tool {tool_call['name']}")
+        return tool
+
+    @staticmethod
+    def _is_async(tool: BaseTool) -> bool:
+        if getattr(tool, "coroutine", None) is not None:
+            return True
+        return not isinstance(tool, StructuredTool) and type(tool)._arun is not BaseTool._arun
+
+    def _create_result(self, tool_call: ToolCall, result: Any) -> ToolMessage:
+        if isinstance(result, ToolMessage):
+            if result.name is None:
+                return result.model_copy(update={"name": tool_call["name"]})
+            return result
+        return ToolMessage(content=str(result), name=tool_call["name"], tool_call_id=tool_call["id"])
+
+    def _create_error(self, tool_call: ToolCall, error: BaseException) -> ToolMessage:
+        if not self._handle_errors:
+            raise error
+        return ToolMessage(
+            content=f"Error: {error}",
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error"
+        )
+
+    def _invoke(self, tool_call: ToolCall) -> Any:
+        tool = self._get_tool(tool_call)
+        if getattr(tool, "coroutine", None) is not None and getattr(tool, "func", None) is None:
+            # Async only tool runs in its own event loop of the worker thread
+            return asyncio.run(tool.ainvoke({**tool_call, "type": "tool_call"}))
+        return tool.invoke({**tool_call, "type": "tool_call"})
+
+    def execute(self, message: AIMessage) -> list[ToolMessage]:
+        """Runs all tool calls of the message in parallel threads
+
+        :param message: Assistant message with tool calls
+        :return: Tool results in order of calls
+        """
+        tool_calls = message.tool_calls
+        if not tool_calls:
+            return []
+        executor = self._get_executor()
+        started_at = time.monotonic()
+        futures: list[Future] = [
+            executor.submit(copy_context().run, self._invoke, tool_call)
+            for tool_call in tool_calls
+        ]
+        results = []
+        for tool_call, future in zip(tool_calls, futures):
+            timeout = self._get_timeout(tool_call["name"])
+            remaining = None if timeout is None else max(0.0, started_at + timeout - time.monotonic())
+            try:
+                results.append(self._create_result(tool_call, future.result(remaining)))
+            except FutureTimeoutError:
+                # Running thread can't be interrupted, its result is discarded
+                future.cancel()
+                error = TimeoutError(f"Tool {tool_call['name']} timed out after {timeout} seconds")
+                results.append(self._create_error(tool_call, error))
+            except Exception as e:
+                results.append(self._create_error(tool_call, e))
+        return results
+
+    async def _acall(self, tool_call: ToolCall) -> ToolMessage:
+        timeout = self._get_timeout(tool_call["name"])
+        try:
+            tool = self._get_tool(tool_call)
+            if self._is_async(tool):
+                call = tool.ainvoke({**tool_call, "type": "tool_call"})
+            else:
+                call = asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(),
+                    copy_context().run,
+                    self._invoke,
+                    tool_call
+                )
+            try:
+                result = await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Tool {tool_call['name']} timed out after {timeout} seconds") from None
+        except Exception as e:
+            return self._create_error(tool_call, e)
+        return self._create_result(tool_call, result)
+
+    async def aexecute(self, message: AIMessage) -> list[ToolMessage]:
+        """Runs all tool calls of the message concurrently
+
+        :param message: Assistant message with tool calls
+        :return: Tool results in order of calls
+        """
+        return list(await asyncio.gather(*(self._acall(tool_call) for tool_call in message.tool_calls)))
+
+    def run(self, input: LanguageModelInput) -> list[BaseMessage]:
+        """Calls model and its tools in turns until model answers without tool calls
+
+        :param input: Conversation to continue
+        :return: Conversation with messages of the model and tool results
+        """
+        messages = self._chat_model._convert_input(input).to_messages()
+        for _ in range(self._max_iterations):
+            response = self._model.invoke(messages)
+            messages.append(response)
+            if not response.tool_calls:
+                break
+            messages.extend(self.execute(response))
+        return messages
+
+    async def arun(self, input: LanguageModelInput) -> list[BaseMessage]:
+        """Calls model and its tools in turns until model answers without tool calls
+
+        :param input: Conversation to continue
+        :return: Conversation with messages of the model and tool results
+        """
+        messages = self._chat_model._convert_input(input).to_messages()
+        for _ in range(self._max_iterations):
+            response = await self._model.ainvoke(messages)
+            messages.append(response)
+            if not response.tool_calls:
+                break
+            messages.extend(await self.aexecute(response))
+        return messages
+
+    def close(self) -> None:
+        """Stops threads running sync tools"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def __enter__(self) -> "ToolRunner":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
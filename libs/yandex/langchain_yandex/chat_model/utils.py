@@ -1,30 +1,43 @@
-from typing import Any
+from typing import Any, Optional, Union
 
+import json
 from uuid import uuid4
 from enum import StrEnum
 
-from langchain_core.tools import BaseTool
-from langchain_core.outputs import ChatResult, ChatGeneration
+from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
 from langchain_core.messages.ai import UsageMetadata
+from langchain_core.messages.tool import tool_call_chunk
 from langchain_core.messages import (
     BaseMessage,
     SystemMessage,
     HumanMessage,
     AIMessage,
+    AIMessageChunk,
     ToolMessage,
     ToolCall,
 )
 
-from ..clients.foundation import FoundationModel
+from ..clients.foundation import FoundationModel, CLIENT_INFO_KEY
+from ..clients.foundation.codec import CompletionResponse, Usage
 
 YANDEXGPT_TYPE = "YandexGPT"
+YANDEXGPT_LITE_TYPE = "YandexGPT Lite"
+YANDEXGPT_PRO_TYPE = "YandexGPT Pro"
 
 MODEL2TYPE: dict[FoundationModel, str] = {
-    FoundationModel.YANDEXGPT_LITE: YANDEXGPT_TYPE,
-    FoundationModel.YANDEXGPT_PRO: YANDEXGPT_TYPE
+    FoundationModel.YANDEXGPT_LITE: YANDEXGPT_LITE_TYPE,
+    FoundationModel.YANDEXGPT_PRO: YANDEXGPT_PRO_TYPE
 }
 
+MODEL2CONTEXT_SIZE: dict[FoundationModel, int] = {
+    FoundationModel.YANDEXGPT_LITE: 32768,
+    FoundationModel.YANDEXGPT_PRO: 32768
+}
+
+TOOL_CHOICE_MODES = {"auto": "AUTO", "none": "NONE", "any": "REQUIRED", "required": "REQUIRED"}
+
 TOOL_CALLS_STATUS = "ALTERNATIVE_STATUS_TOOL_CALLS"
+PARTIAL_STATUS = "ALTERNATIVE_STATUS_PARTIAL"
 
 
 class FoundationMessageRole(StrEnum):
@@ -33,14 +46,45 @@ class FoundationMessageRole(StrEnum):
     ASSISTANT = "assistant"
 
 
-def convert_tool_to_dict(tool: BaseTool) -> dict[str, dict[str, Any]]:
-    return {
-        "function": {
-            "name": tool.name,
-            "description": tool.description,
-            "parameters": tool.args_schema.model_json_schema()
+def convert_tool_to_dict(tool: Any) -> dict[str, dict[str, Any]]:
+    # Tools machinery is loaded only by models which are given tools
+    from langchain_core.tools import BaseTool
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    if isinstance(tool, BaseTool) and tool.args_schema is not None and not isinstance(tool.args_schema, dict):
+        return {
+            "function": {
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": tool.args_schema.model_json_schema()
+            }
         }
-    }
+    return {"function": convert_to_openai_tool(tool)["function"]}
+
+
+def convert_tool_choice_to_dict(tool_choice: Union[str, bool, dict[str, Any]]) -> Optional[dict[str, Any]]:
+    """Converts langchain tool choice, i.e. mode, tool name or OpenAI style dict, to ``toolChoice`` field"""
+    if isinstance(tool_choice, bool):
+        return {"mode": "REQUIRED"} if tool_choice else None
+    if isinstance(tool_choice, str):
+        if tool_choice in TOOL_CHOICE_MODES:
+            return {"mode": TOOL_CHOICE_MODES[tool_choice]}
+        return {"functionName": tool_choice}
+    if "function" in tool_choice:
+        return {"functionName": tool_choice["function"]["name"]}
+    return tool_choice
+
+
+def convert_schema_to_json_schema(schema: Any) -> dict[str, Any]:
+    """Converts pydantic model, TypedDict, function or JSON schema to JSON schema of structured output"""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+    from pydantic import BaseModel
+
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_json_schema()
+    if isinstance(schema, dict) and "properties" in schema:
+        return schema
+    return convert_to_openai_tool(schema)["function"]["parameters"]
 
 
 def convert_message_to_dict(message: BaseMessage) -> dict[str, str]:
@@ -56,7 +100,7 @@ def convert_message_to_dict(message: BaseMessage) -> dict[str, str]:
                     {
                         "functionCall": {
                             "name": tool_call["name"],
-                            "argument": tool_call["args"]
+                            "arguments": tool_call["args"]
                         }
                     }
                     for tool_call in message.tool_calls
@@ -84,29 +128,29 @@ def convert_message_to_dict(message: BaseMessage) -> dict[str, str]:
 def convert_dict_to_message(message: dict[str, Any]) -> BaseMessage:
     additional_kwargs = {}
     tool_calls: list[ToolCall] = []
-    if hasattr(message, "toolCallList"):
+    if "toolCallList" in message:
         called_tools = message["toolCallList"]["toolCalls"]
-        additional_kwargs["toolCals"] = []
-        for called_tool in called_tools:
-            additional_kwargs["toolCals"].append(called_tool["functionCall"])
-    if additional_kwargs.get("toolCalls"):
+        additional_kwargs["toolCalls"] = [
+            called_tool["functionCall"] for called_tool in called_tools
+        ]
         tool_calls = [
             ToolCall(
                 name=tool_call["name"],
-                args=tool_call["arguments"],
+                args=tool_call.get("arguments", {}),
                 id=str(uuid4())
             )
-            for tool_call in additional_kwargs["tollCalls"]
+            for tool_call in additional_kwargs["toolCalls"]
         ]
-    if hasattr(message, "toolResultList"):
+    if "toolResultList" in message:
         tool_results = message["toolResultList"]["toolResults"]
+        function_result = tool_results[0]["functionResult"]
         return ToolMessage(
-            content=tool_results[0]["content"],
-            name=tool_results[0]["name"],
+            content=function_result["content"],
+            name=function_result["name"],
             tool_call_id=str(uuid4())
         )
     role = message["role"]
-    content = message["text"]
+    content = message.get("text", "")
     if role == FoundationMessageRole.SYSTEM:
         return SystemMessage(content=content)
     elif role == FoundationMessageRole.USER:
@@ -121,23 +165,81 @@ def convert_dict_to_message(message: dict[str, Any]) -> BaseMessage:
         raise TypeError(f"Got unknown role {role} {message}")
 
 
-def create_chat_result(response: dict[str, Any]) -> ChatResult:
+def create_usage_metadata(usage: Usage) -> UsageMetadata:
+    completion_tokens_details = usage.get("completionTokensDetails") or {}
+    return UsageMetadata(
+        output_tokens=int(usage.get("completionTokens", 0)),
+        input_tokens=int(usage.get("inputTextTokens", 0)),
+        total_tokens=int(usage.get("totalTokens", 0)),
+        output_token_details={
+            "reasoning": int(completion_tokens_details.get("reasoningTokens", 0))
+        }
+    )
+
+
+def create_chat_result(response: CompletionResponse) -> ChatResult:
     generations: list[ChatGeneration] = []
-    alternatives: list[dict[str, Any]] = response["result"]["alternatives"]
-    for alternative in alternatives:
+    result = response["result"]
+    usage_metadata = create_usage_metadata(result["usage"]) if "usage" in result else None
+    generation_info = {
+        "model_version": result.get("modelVersion"),
+        **response.get(CLIENT_INFO_KEY, {})
+    }
+    for alternative in result["alternatives"]:
         message = convert_dict_to_message(alternative["message"])
         if isinstance(message, AIMessage):
-            message.usage_metadata = UsageMetadata(
-                output_tokens=response["usage"]["completionTokens"],
-                input_tokens=response["usage"]["inputTextTokens"],
-                total_tokens=response["usage"]["totalTokens"],
-                input_token_details={
-                    "reasoning_tokens": response["usage"]["completionTokensDetails"]["reasoningTokens"]
-                }
-            )
-        generation = ChatGeneration(
-            message=message,
-            generation_info={"model_version": response["modelVersion"]}
-        )
-        generations.append(generation)
+            message.usage_metadata = usage_metadata
+        generations.append(ChatGeneration(message=message, generation_info=dict(generation_info)))
     return ChatResult(generations=generations)
+
+
+def create_chat_generation_chunk(
+        response: CompletionResponse,
+        previous_text: str = ""
+) -> tuple[Optional[ChatGenerationChunk], str]:
+    """Converts streamed response chunk to generation chunk with delta text.
+
+    YandexGPT streams the whole text generated so far in every chunk,
+    so delta is computed against the text of the previous chunk.
+
+    :param response: Streamed response chunk
+    :param previous_text: Text received with previous chunk
+    :return: Generation chunk or None when chunk has nothing new, and current text
+    """
+    result = response["result"]
+    alternative = result["alternatives"][0]
+    message: dict[str, Any] = alternative["message"]
+    text: str = message.get("text", "")
+    delta = text[len(previous_text):] if text.startswith(previous_text) else text
+    status = alternative.get("status")
+    if status == PARTIAL_STATUS:
+        if not delta:
+            return None, text
+        return ChatGenerationChunk(message=AIMessageChunk(content=delta)), text
+    tool_call_chunks = [
+        tool_call_chunk(
+            name=called_tool["functionCall"]["name"],
+            args=json.dumps(called_tool["functionCall"].get("arguments", {}), ensure_ascii=False),
+            id=str(uuid4()),
+            index=index
+        )
+        for index, called_tool in enumerate(message.get("toolCallList", {}).get("toolCalls", []))
+    ]
+    response_metadata = {"model_version": result.get("modelVersion"), "status": status}
+    client_info = response.get(CLIENT_INFO_KEY, {})
+    if "model_name" in client_info:
+        response_metadata["model_name"] = client_info["model_name"]
+    chunk = ChatGenerationChunk(
+        message=AIMessageChunk(
+            content=delta,
+            tool_call_chunks=tool_call_chunks,
+            usage_metadata=create_usage_metadata(result["usage"]) if "usage" in result else None,
+            response_metadata=response_metadata
+        ),
+        generation_info={
+            "model_version": result.get("modelVersion"),
+            "status": status,
+            **client_info
+        }
+    )
+    return chunk, text
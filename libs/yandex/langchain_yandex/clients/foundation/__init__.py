@@ -1,9 +1,169 @@
+from typing import TYPE_CHECKING
+
+from ..._imports import lazy_exports
+
 __all__ = (
     "FoundationModelClient",
+    "SyncFoundationModelClient",
+    "AsyncFoundationModelClient",
+    "BatchItem",
     "FoundationModel",
+    "EmbeddingModel",
+    "PollingPolicy",
+    "RateLimiter",
+    "get_rate_limiter",
+    "RetryPolicy",
+    "HedgePolicy",
+    "BaseCompletionCache",
+    "InMemoryCompletionCache",
+    "SQLiteCompletionCache",
+    "BaseOperationJournal",
+    "SQLiteOperationJournal",
+    "JSONCodec",
+    "OrjsonCodec",
+    "MsgspecCodec",
+    "get_codec",
+    "set_codec",
+    "RequestTimings",
+    "BaseInstrumentation",
+    "CallbackInstrumentation",
+    "CompositeInstrumentation",
+    "OpenTelemetryInstrumentation",
+    "PrometheusInstrumentation",
+    "Token",
+    "BaseCredentials",
+    "StaticCredentials",
+    "RefreshingCredentials",
+    "CallbackCredentials",
+    "FileCredentials",
+    "ServiceAccountCredentials",
+    "RoutingFoundationModelClient",
+    "Endpoint",
+    "CircuitBreaker",
+    "TieredFoundationModelClient",
+    "TieringPolicy",
+    "RoutingDecision",
+    "UsageLedger",
+    "TokenBudget",
+    "RequestScheduler",
+    "Priority",
+    "CLIENT_INFO_KEY",
     "TEMPERATURE",
     "URL",
+    "OPERATIONS_ENDPOINT",
+    "POOL_SIZE",
+    "POOL_LIMIT_PER_HOST",
+    "DNS_CACHE_TTL",
+    "KEEPALIVE_TIMEOUT",
+    "BATCH_MAX_IN_FLIGHT",
+    "EMBEDDING_MAX_CONCURRENCY",
+    "EMBEDDING_WAVE_SIZE",
 )
 
-from .client import FoundationModelClient
-from .constants import FoundationModel, TEMPERATURE, URL
+# Names are imported on first access, so e.g. sync client users never load aiohttp
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "FoundationModelClient": ".client",
+    "SyncFoundationModelClient": ".sync_client",
+    "AsyncFoundationModelClient": ".async_client",
+    "BatchItem": ".batch",
+    "PollingPolicy": ".polling",
+    "RateLimiter": ".rate_limit",
+    "get_rate_limiter": ".rate_limit",
+    "RetryPolicy": ".retry",
+    "HedgePolicy": ".retry",
+    "BaseCompletionCache": ".cache",
+    "InMemoryCompletionCache": ".cache",
+    "SQLiteCompletionCache": ".cache",
+    "BaseOperationJournal": ".journal",
+    "SQLiteOperationJournal": ".journal",
+    "JSONCodec": ".codec",
+    "OrjsonCodec": ".codec",
+    "MsgspecCodec": ".codec",
+    "get_codec": ".codec",
+    "set_codec": ".codec",
+    "Token": ".credentials",
+    "BaseCredentials": ".credentials",
+    "StaticCredentials": ".credentials",
+    "RefreshingCredentials": ".credentials",
+    "CallbackCredentials": ".credentials",
+    "FileCredentials": ".credentials",
+    "ServiceAccountCredentials": ".credentials",
+    "RoutingFoundationModelClient": ".routing",
+    "Endpoint": ".routing",
+    "CircuitBreaker": ".routing",
+    "TieredFoundationModelClient": ".tiering",
+    "TieringPolicy": ".tiering",
+    "RoutingDecision": ".tiering",
+    "UsageLedger": ".usage",
+    "TokenBudget": ".usage",
+    "RequestScheduler": ".scheduling",
+    "RequestTimings": ".instrumentation",
+    "BaseInstrumentation": ".instrumentation",
+    "CallbackInstrumentation": ".instrumentation",
+    "CompositeInstrumentation": ".instrumentation",
+    "OpenTelemetryInstrumentation": ".instrumentation",
+    "PrometheusInstrumentation": ".instrumentation",
+    "FoundationModel": ".constants",
+    "EmbeddingModel": ".constants",
+    "Priority": ".constants",
+    "TEMPERATURE": ".constants",
+    "URL": ".constants",
+    "OPERATIONS_ENDPOINT": ".constants",
+    "POOL_SIZE": ".constants",
+    "POOL_LIMIT_PER_HOST": ".constants",
+    "DNS_CACHE_TTL": ".constants",
+    "KEEPALIVE_TIMEOUT": ".constants",
+    "BATCH_MAX_IN_FLIGHT": ".constants",
+    "EMBEDDING_MAX_CONCURRENCY": ".constants",
+    "EMBEDDING_WAVE_SIZE": ".constants",
+    "CLIENT_INFO_KEY": ".constants",
+})
+
+if TYPE_CHECKING:
+    from .client import FoundationModelClient
+    from .sync_client import SyncFoundationModelClient
+    from .async_client import AsyncFoundationModelClient
+    from .batch import BatchItem
+    from .polling import PollingPolicy
+    from .rate_limit import RateLimiter, get_rate_limiter
+    from .retry import RetryPolicy, HedgePolicy
+    from .cache import BaseCompletionCache, InMemoryCompletionCache, SQLiteCompletionCache
+    from .journal import BaseOperationJournal, SQLiteOperationJournal
+    from .codec import JSONCodec, OrjsonCodec, MsgspecCodec, get_codec, set_codec
+    from .credentials import (
+        Token,
+        BaseCredentials,
+        StaticCredentials,
+        RefreshingCredentials,
+        CallbackCredentials,
+        FileCredentials,
+        ServiceAccountCredentials
+    )
+    from .routing import RoutingFoundationModelClient, Endpoint, CircuitBreaker
+    from .tiering import TieredFoundationModelClient, TieringPolicy, RoutingDecision
+    from .usage import UsageLedger, TokenBudget
+    from .scheduling import RequestScheduler
+    from .instrumentation import (
+        RequestTimings,
+        BaseInstrumentation,
+        CallbackInstrumentation,
+        CompositeInstrumentation,
+        OpenTelemetryInstrumentation,
+        PrometheusInstrumentation
+    )
+    from .constants import (
+        FoundationModel,
+        EmbeddingModel,
+        Priority,
+        TEMPERATURE,
+        URL,
+        OPERATIONS_ENDPOINT,
+        POOL_SIZE,
+        POOL_LIMIT_PER_HOST,
+        DNS_CACHE_TTL,
+        KEEPALIVE_TIMEOUT,
+        BATCH_MAX_IN_FLIGHT,
+        EMBEDDING_MAX_CONCURRENCY,
+        EMBEDDING_WAVE_SIZE,
+        CLIENT_INFO_KEY
+    )
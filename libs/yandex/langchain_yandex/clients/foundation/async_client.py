@@ -1,82 +1,581 @@
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, TYPE_CHECKING
 
-import asyncio
+if TYPE_CHECKING:
+    import aiohttp
 
-import aiohttp
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import aclosing
 
 from .base_client import BaseFoundationModelClient
-from .exceptions import CompletionError, BadRequest
-from .constants import (
-    OPERATIONS_ENDPOINT,
-    ASYNC_TIMEOUT,
-    STATUS_200_OK,
-    STATUS_400_BAD_REQUEST,
-    STATUS_500_INTERNAL_SERVER_ERROR
+from .batch import BatchItem, create_batch_item
+from .cache import create_cache_key
+from .codec import decode_completion, decode_operation, loads
+from .encoding import encode_payload
+from .instrumentation import create_trace_config
+from .exceptions import (
+    ClientError,
+    CompletionError,
+    ConnectionFailed,
+    RequestTimeout,
+    RetryableError,
+    OperationCancelled,
+    OperationTimeout
 )
+from .polling import PollingPolicy, PollingSchedule, get_operation_result
+from .retry import REJECTED_ERRORS, acall_with_retry
+from .constants import EmbeddingModel, STATUS_200_OK, BATCH_MAX_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Sessions of other loops being closed, referenced until their close is done
+_closing_tasks: set[asyncio.Task] = set()
+
+
+def _convert_request_error(error: Exception) -> ClientError:
+    import aiohttp
+
+    if isinstance(error, asyncio.TimeoutError):
+        return RequestTimeout(f"Request timed out: {error}")
+    elif isinstance(error, aiohttp.ClientConnectionError):
+        return ConnectionFailed(f"Connection failed: {error}")
+    return CompletionError(f"Request failed: {error}")
 
 
 class AsyncFoundationModelClient(BaseFoundationModelClient):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._asession: Optional["aiohttp.ClientSession"] = None
+        self._asession_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _reset_state(self) -> None:
+        super()._reset_state()
+        self._asession = None
+        self._asession_loop = None
+
+    def _get_asession(self) -> "aiohttp.ClientSession":
+        """Returns keep-alive session shared by all calls of the client.
+
+        aiohttp sessions are bound to the event loop they were created in,
+        so a new session is opened when the client is used from another loop.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._asession
+        if session is None or session.closed or self._asession_loop is not loop:
+            import aiohttp
+
+            self._discard_asession(session, self._asession_loop)
+
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_size,
+                limit_per_host=self._pool_limit_per_host,
+                ttl_dns_cache=self._dns_cache_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self._keepalive_timeout
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+                trace_configs=[create_trace_config()] if self._instrumentation is not None else None
+            )
+            self._asession = session
+            self._asession_loop = loop
+        return session
+
+    @staticmethod
+    def _discard_asession(
+            session: Optional["aiohttp.ClientSession"],
+            loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        """Closes session outside of the event loop it is bound to.
+
+        Connections of a closed loop are gone with it, so closing such session
+        only marks it closed and may run in any loop.
+        """
+        if session is None or session.closed:
+            return
+        logger.debug("Closing session of the client outside of its event loop")
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is not None:
+            task = running_loop.create_task(session.close())
+            _closing_tasks.add(task)
+            task.add_done_callback(_closing_tasks.discard)
+        elif loop is not None and not loop.is_closed():
+            loop.run_until_complete(session.close())
+        else:
+            asyncio.run(session.close())
+
+    def close_asession(self) -> None:
+        """Close pooled connections of async calls from sync code"""
+        session, self._asession = self._asession, None
+        loop, self._asession_loop = self._asession_loop, None
+        self._discard_asession(session, loop)
+
+    async def aclose(self) -> None:
+        """Close pooled connections of the client"""
+        session, self._asession = self._asession, None
+        self._asession_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def __aenter__(self) -> "AsyncFoundationModelClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
     async def acompletion(
             self,
             messages: list[dict[str, str]],
             tools: Optional[list[dict[str, Any]]] = None,
-            stop: Optional[list[str]] = None
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        with self.instrument("completion") as timings:
+            response = await self._acompletion(messages, tools, stop, tool_choice, response_format)
+            return self._with_timings(response, timings)
+
+    async def _acompletion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
     ) -> dict[str, Any]:
         url = f"{self._base_url}/completion"
+        payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+        body = encode_payload(payload)
+        key = self._get_cache_key(body)
+        cached = await self._aget_cached(key)
+        if cached is not None:
+            return cached
+        if self._async_single_flight is None:
+            return await self._aset_cached(key, await self._apost(url, payload, body, hedge=True))
+
+        async def call() -> dict[str, Any]:
+            return await self._aset_cached(key, await self._apost(url, payload, body, hedge=True))
+
+        response, shared = await self._async_single_flight.do(key or create_cache_key(body), call)
+        return self._with_coalesced_info(response, shared)
+
+    async def astream_completion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Streams completion, yields response chunks as soon as they are received"""
+        import aiohttp
+
+        url = f"{self._base_url}/completion"
+        payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=True)
+        timings = self._start_timings("stream_completion")
+        error: Optional[BaseException] = None
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url=url,
-                    headers=self._headers,
-                    json=self._build_payload(messages, tools, stop),
-                    timeout=self._timeout
-                ) as response:
-                    status_code = response.status
-                    if status_code == STATUS_200_OK:
-                        return await response.json()
-                    elif STATUS_400_BAD_REQUEST <= status_code < STATUS_500_INTERNAL_SERVER_ERROR:
-                        raise BadRequest(
-                            f"Bad request (status {status_code}):"
-                            f"{response.text}"
-                        )
-                    else:
-                        raise CompletionError(
-                            f"Server error (status {status_code}):"
-                            f"{response.text}"
-                        )
-        except aiohttp.ClientError as e:
-            raise CompletionError(f"Request failed: {e}") from e
+            headers = await self._aget_headers()
+            async with self._arate_limit(payload, timings), self._get_asession().post(
+                url=url,
+                headers=headers,
+                data=encode_payload(payload),
+                trace_request_ctx=timings
+            ) as response:
+                if response.status != STATUS_200_OK:
+                    self._raise_for_status(response.status, await response.text(), response.headers)
+                buffer = b""
+                async for data in response.content.iter_any():
+                    buffer += data
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            yield self._with_chunk_timings(decode_completion(line), timings)
+                if buffer.strip():
+                    yield self._with_chunk_timings(decode_completion(buffer), timings)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = _convert_request_error(e)
+            raise error from e
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish_timings(timings, error)
+
+    async def atokenize(self, text: str) -> dict[str, Any]:
+        """Splits text into tokens of the model, returns response with ``tokens`` list"""
+        with self.instrument("tokenize"):
+            url = f"{self._base_url}/tokenize"
+            return await self._apost(url, {"modelUri": self._model_uri, "text": text}, decode=loads)
+
+    async def atext_embedding(
+            self,
+            text: str,
+            model: EmbeddingModel = EmbeddingModel.TEXT_SEARCH_DOC
+    ) -> dict[str, Any]:
+        """Returns response with ``embedding`` vector of the text"""
+        with self.instrument("text_embedding"):
+            url = f"{self._base_url}/textEmbedding"
+            payload = {"modelUri": self._get_embedding_model_uri(model), "text": text}
+            return await self._apost(url, payload, decode=loads)
 
     async def acompletion_async(
             self,
             messages: list[dict[str, str]],
             tools: Optional[list[str]] = None,
             stop: Optional[list[str]] = None,
-            async_timeout: float = ASYNC_TIMEOUT
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
     ) -> dict[str, Any]:
-        if not self._iam_token:
-            raise ValueError("IAM-TOKEN required for this method")
+        """Completes messages by deferred operation, sharing cache with completion.
+
+        Identical calls waiting at once are coalesced into one operation,
+        so they share polling policy and cancel event of the first caller.
+        """
+        with self.instrument("completion_async") as timings:
+            payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+            body = encode_payload(payload)
+            key = self._get_cache_key(body)
+            cached = await self._aget_cached(key)
+            if cached is not None:
+                return self._with_timings(cached, timings)
+
+            async def call() -> dict[str, Any]:
+                operation_id = await self.asubmit_completion_async(messages, tools, stop, tool_choice, response_format)
+                operation = await self.await_operation(operation_id, polling_policy, cancel_event)
+                return await self._aset_cached(key, get_operation_result(operation))
+
+            if self._async_single_flight is None:
+                return self._with_timings(await call(), timings)
+            response, shared = await self._async_single_flight.do(
+                f"completionAsync:{key or create_cache_key(body)}",
+                call
+            )
+            return self._with_timings(self._with_coalesced_info(response, shared), timings)
+
+    async def asubmit_completion_async(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> str:
+        """Submits deferred completion, returns operation identifier"""
+        self._check_iam()
         url = f"{self._base_url}/completionAsync"
+        payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+        body = encode_payload(payload)
+        key, operation_id = await self._afind_journaled(body)
+        if operation_id is not None:
+            return operation_id
+
+        async def submit() -> str:
+            # Operation may have been journaled by identical submit finished meanwhile
+            operation_id = await self._journal.afind(key) if key is not None else None
+            if operation_id is not None:
+                return operation_id
+            data = await self._apost(url, payload, body, decode=decode_operation, idempotent=False)
+            return await self._ajournal_submitted(key, data["id"])
+
+        if key is None:
+            return await submit()
+        return (await self._async_submit_flight.do(key, submit))[0]
+
+    async def await_operation(
+            self,
+            operation_id: str,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> dict[str, Any]:
+        """Waits until deferred operation is done, returns the operation"""
+        async with aclosing(
+            self.await_operations([operation_id], polling_policy, cancel_event)
+        ) as operations:
+            async for operation in operations:
+                return operation
+
+    async def await_operations(
+            self,
+            operation_ids: Iterable[str],
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Polls many deferred operations in one loop over the pooled session,
+        yields every operation as soon as it is done.
+
+        Operations journaled as done, maybe by another process, are yielded without polling.
+
+        :param operation_ids: Identifiers of operations to wait for
+        :param polling_policy: Overrides polling schedule of the client
+        :param cancel_event: Event that stops waiting when set
+        :return: Iterator over done operations in completion order
+        """
+        pending = []
+        for operation_id in dict.fromkeys(operation_ids):
+            operation = await self._aget_journaled(operation_id)
+            if operation is None:
+                pending.append(operation_id)
+            else:
+                yield operation
+        clock = (polling_policy or self._polling_policy).start()
+        session = self._get_asession()
+        timings = self._get_timings()
+        started_at = time.perf_counter()
+        while pending:
+            delay = clock.next_delay(pending)
+            if cancel_event is None:
+                await asyncio.sleep(delay)
+            else:
+                try:
+                    await asyncio.wait_for(cancel_event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    raise OperationCancelled(f"Waiting for operations cancelled: {pending}")
+            operations = await asyncio.gather(
+                *(self._aget_status_operation(session, operation_id) for operation_id in pending)
+            )
+            if timings is not None:
+                timings.polls += len(pending)
+            still_pending = []
+            for operation_id, operation in zip(pending, operations):
+                if operation.get("done"):
+                    if timings is not None:
+                        timings.add("polling_wait", started_at)
+                    yield operation
+                else:
+                    still_pending.append(operation_id)
+            pending = still_pending
+
+    async def aresume_operations(
+            self,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Resumes polling of journaled operations not done yet, e.g. submitted before restart,
+        yields every operation as soon as it is done"""
+        pending = await self._check_journal().apending()
+        async with aclosing(self.await_operations(pending, polling_policy, cancel_event)) as operations:
+            async for operation in operations:
+                yield operation
+
+    async def abatch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> list[BatchItem]:
+        """Runs deferred completions of many payloads, returns outcomes in payloads order"""
+        items = [
+            item async for item in self.aiter_batch_completion_async(
+                payloads, max_in_flight, polling_policy, cancel_event
+            )
+        ]
+        return sorted(items, key=lambda item: item.index)
+
+    async def aiter_batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> AsyncIterator[BatchItem]:
+        """Submits deferred completions keeping at most max_in_flight operations pending,
+        polls pending operations in one loop, each on its own schedule and deadline,
+        and yields outcomes as they are known.
+
+        Errors of single payloads are captured in their items instead of failing the batch.
+
+        :param payloads: Keyword arguments of acompletion_async for every request
+        :param max_in_flight: Maximum number of submitted and not yet done operations
+        :param polling_policy: Overrides polling schedule of the client
+        :param cancel_event: Event that stops waiting when set
+        :return: Iterator over batch items in completion order
+        """
+        queue = deque(enumerate(payloads))
+        # Indexes of payloads by operation, identical payloads share one journaled operation
+        pending: dict[str, list[int]] = {}
+        schedule = PollingSchedule(polling_policy or self._polling_policy)
+        session = self._get_asession()
+        while queue or pending:
+            submitting = [
+                queue.popleft() for _ in range(min(len(queue), max_in_flight - len(pending)))
+            ]
+            submitted = await asyncio.gather(
+                *(self.asubmit_completion_async(**payload) for _, payload in submitting),
+                return_exceptions=True
+            )
+            for (index, _), operation_id in zip(submitting, submitted):
+                if isinstance(operation_id, Exception):
+                    yield BatchItem(index, error=operation_id)
+                    continue
+                operation = await self._aget_journaled(operation_id)
+                if operation is not None:
+                    yield create_batch_item(index, operation_id, operation)
+                elif operation_id in pending:
+                    pending[operation_id].append(index)
+                else:
+                    pending[operation_id] = [index]
+                    schedule.add(operation_id)
+            if not pending:
+                continue
+            delay = schedule.next_delay()
+            if cancel_event is None:
+                await asyncio.sleep(delay)
+            else:
+                try:
+                    await asyncio.wait_for(cancel_event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    raise OperationCancelled(f"Batch cancelled: {list(pending)}")
+            operation_ids = schedule.due()
+            operations = await asyncio.gather(
+                *(self._aget_status_operation(session, operation_id) for operation_id in operation_ids),
+                return_exceptions=True
+            )
+            for operation_id, operation in zip(operation_ids, operations):
+                if isinstance(operation, Exception):
+                    schedule.remove(operation_id)
+                    for index in pending.pop(operation_id):
+                        yield BatchItem(index, operation_id, error=operation)
+                elif operation.get("done"):
+                    schedule.remove(operation_id)
+                    for index in pending.pop(operation_id):
+                        yield create_batch_item(index, operation_id, operation)
+                elif not schedule.reschedule(operation_id):
+                    error = OperationTimeout(f"Operation is not done before deadline: {operation_id}")
+                    for index in pending.pop(operation_id):
+                        yield BatchItem(index, operation_id, error=error)
+
+    async def _apost(
+            self,
+            url: str,
+            payload: dict[str, Any],
+            body: Optional[bytes] = None,
+            decode: Callable[[bytes], dict[str, Any]] = decode_completion,
+            hedge: bool = False,
+            idempotent: bool = True
+    ) -> dict[str, Any]:
+        """Sends payload with retries and hedging, returns response JSON
+
+        :param hedge: Whether slow request is duplicated, its latencies make the hedging delay
+        :param idempotent: Whether the request may be repeated after timeouts and server errors,
+            otherwise it is repeated only when rejected by the server and never hedged
+        """
+        if body is None:
+            body = encode_payload(payload)
+        stats = {"retries": 0, "hedges": 0}
+        if hedge and idempotent:
+            call = lambda: self._asend_hedged(url, payload, body, stats, decode)
+        else:
+            call = lambda: self._asend(url, payload, body, decode)
+        response = await acall_with_retry(
+            self._retry_policy,
+            call,
+            stats,
+            retry_on=(RetryableError,) if idempotent else REJECTED_ERRORS
+        )
+        return self._with_client_info(response, stats)
+
+    async def _asend_hedged(
+            self,
+            url: str,
+            payload: dict[str, Any],
+            body: bytes,
+            stats: dict[str, int],
+            decode: Callable[[bytes], dict[str, Any]] = decode_completion
+    ) -> dict[str, Any]:
+        """Sends payload, duplicates it when no response arrived within hedging delay"""
+        delay = self._hedge_policy.delay() if self._hedge_policy is not None else None
+        if delay is None:
+            return await self._asend(url, payload, body, decode, hedge=True)
+        tasks = {asyncio.ensure_future(self._asend(url, payload, body, decode, hedge=True))}
+        sent = 1
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                timeout = delay if sent <= self._hedge_policy.max_hedges else None
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not done:
+                    tasks.add(asyncio.ensure_future(self._asend(url, payload, body, decode, hedge=True)))
+                    sent += 1
+                    stats["hedges"] += 1
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _asend(
+            self,
+            url: str,
+            payload: dict[str, Any],
+            body: bytes,
+            decode: Callable[[bytes], dict[str, Any]] = decode_completion,
+            hedge: bool = False
+    ) -> dict[str, Any]:
+        """Sends payload within rate limits, returns response JSON, records latency of hedged requests"""
+        import aiohttp
+
+        timings = self._get_timings()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
+            headers = await self._aget_headers()
+            async with self._arate_limit(payload, timings):
+                started_at = time.perf_counter()
+                async with self._get_asession().post(
                     url=url,
-                    headers=self._headers,
-                    json=self._build_payload(messages, tools, stop)
+                    headers=headers,
+                    data=body,
+                    trace_request_ctx=timings
                 ) as response:
-                    data = await response.json()
-                    operation_id = data["id"]
-                    while True:
-                        status_operation = await self._aget_status_operation(session, operation_id)
-                        await asyncio.sleep(async_timeout)
-                        done = status_operation["done"]
-                        if done:
-                            return status_operation
-        except aiohttp.ClientError as e:
-            raise CompletionError(f"Request failed: {e}") from e
-
-    async def _aget_status_operation(self, session: aiohttp.ClientSession, id: str) -> dict[str, Any]:
-        url = f"{OPERATIONS_ENDPOINT}/{id}"
-        headers = {"Authorization": f"Bearer {self._iam_token}"}
-        async with session.get(url=url, headers=headers) as response:
-            return response.json()
+                    if response.status != STATUS_200_OK:
+                        self._raise_for_status(response.status, await response.text(), response.headers)
+                    read_at = time.perf_counter()
+                    content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _convert_request_error(e) from e
+        decoded_at = time.perf_counter()
+        if hedge and self._hedge_policy is not None:
+            self._hedge_policy.record(decoded_at - started_at)
+        data = decode(content)
+        if timings is not None:
+            timings.add("body_read", read_at, decoded_at - read_at)
+            timings.add("decode", decoded_at)
+        return data
+
+    async def _aget_status_operation(self, session: "aiohttp.ClientSession", id: str) -> dict[str, Any]:
+        operation = await acall_with_retry(
+            self._retry_policy,
+            lambda: self._asend_status_operation(session, id)
+        )
+        return await self._ajournal_done(id, operation)
+
+    async def _asend_status_operation(self, session: "aiohttp.ClientSession", id: str) -> dict[str, Any]:
+        import aiohttp
+
+        url = f"{self._operations_url}/{id}"
+        try:
+            headers = await self._aget_operation_headers()
+            async with session.get(url=url, headers=headers) as response:
+                if response.status != STATUS_200_OK:
+                    self._raise_for_status(response.status, await response.text(), response.headers)
+                return decode_operation(await response.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _convert_request_error(e) from e
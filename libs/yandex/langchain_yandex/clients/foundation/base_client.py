@@ -1,6 +1,40 @@
-from typing import Any, Optional
+from typing import Any, AsyncContextManager, ContextManager, Mapping, Optional
 
-from .constants import FoundationModel, URL, ON_REASONING_MODE
+import copy
+from contextlib import nullcontext
+
+from .exceptions import CompletionError, BadRequest, TooManyRequests, ServerError, ServiceUnavailable
+from .polling import PollingPolicy
+from .rate_limit import RateLimiter, estimate_tokens
+from .retry import RetryPolicy, HedgePolicy, parse_retry_after
+from .cache import BaseCompletionCache, create_cache_key
+from .journal import BaseOperationJournal
+from .coalesce import SingleFlight, AsyncSingleFlight
+from .credentials import BaseCredentials, StaticCredentials
+from .instrumentation import (
+    BaseInstrumentation,
+    RequestTimings,
+    get_current_timings,
+    instrument,
+    timed_context,
+    atimed_context
+)
+from .constants import (
+    FoundationModel,
+    EmbeddingModel,
+    URL,
+    OPERATIONS_ENDPOINT,
+    ON_REASONING_MODE,
+    POOL_SIZE,
+    POOL_LIMIT_PER_HOST,
+    DNS_CACHE_TTL,
+    KEEPALIVE_TIMEOUT,
+    STATUS_400_BAD_REQUEST,
+    STATUS_429_TOO_MANY_REQUESTS,
+    STATUS_500_INTERNAL_SERVER_ERROR,
+    STATUS_503_SERVICE_UNAVAILABLE,
+    CLIENT_INFO_KEY
+)
 
 
 class BaseFoundationModelClient:
@@ -16,6 +50,21 @@ class BaseFoundationModelClient:
         :param streaming: Whether to streaming chunk generation ot not
         :param reasoning: Whether to reasoning or not
         :param timeout: Timeout for requests
+        :param pool_size: Maximum number of keep-alive connections held by the client
+        :param pool_limit_per_host: Maximum number of connections to one host, 0 for no limit
+        :param dns_cache_ttl: Seconds to cache resolved DNS records, None to cache forever
+        :param keepalive_timeout: Seconds to keep an idle connection open
+        :param polling_policy: Schedule of deferred operation status checks
+        :param operations_url: Operations API URL to check deferred operations
+        :param rate_limiter: Limiter of requests and tokens per second, may be shared between clients
+        :param retry_policy: Policy of repeating requests failed with retryable errors
+        :param hedge_policy: Policy of duplicating slow completion requests
+        :param cache: Storage of completion responses, used when temperature is 0
+        :param force_cache: Whether to use cache whatever the temperature is
+        :param coalesce: Whether concurrent identical completion requests share one HTTP request
+        :param instrumentation: Receiver of timings of every call, None to disable instrumentation
+        :param credentials: Source of refreshed IAM tokens, overrides api_key and iam_token
+        :param journal: Storage of deferred operations surviving restarts and shared by processes
     """
     def __init__(
             self,
@@ -28,7 +77,22 @@ class BaseFoundationModelClient:
             max_tokens: Optional[int] = None,
             streaming: bool = False,
             reasoning: bool = False,
-            timeout: Optional[float] = None
+            timeout: Optional[float] = None,
+            pool_size: int = POOL_SIZE,
+            pool_limit_per_host: int = POOL_LIMIT_PER_HOST,
+            dns_cache_ttl: Optional[int] = DNS_CACHE_TTL,
+            keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+            polling_policy: Optional[PollingPolicy] = None,
+            operations_url: str = OPERATIONS_ENDPOINT,
+            rate_limiter: Optional[RateLimiter] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            hedge_policy: Optional[HedgePolicy] = None,
+            cache: Optional[BaseCompletionCache] = None,
+            force_cache: bool = False,
+            coalesce: bool = False,
+            instrumentation: Optional[BaseInstrumentation] = None,
+            credentials: Optional[BaseCredentials] = None,
+            journal: Optional[BaseOperationJournal] = None
     ) -> None:
         self._folder_id = folder_id
         self._api_key = api_key
@@ -40,51 +104,354 @@ class BaseFoundationModelClient:
         self._streaming = streaming
         self._reasoning = reasoning
         self._timeout = timeout
+        self._pool_size = pool_size
+        self._pool_limit_per_host = pool_limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+        self._keepalive_timeout = keepalive_timeout
+        self._polling_policy = polling_policy or PollingPolicy()
+        self._operations_url = operations_url
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy
+        self._hedge_policy = hedge_policy
+        self._cache = cache
+        self._force_cache = force_cache
+        self._single_flight = SingleFlight() if coalesce else None
+        self._async_single_flight = AsyncSingleFlight() if coalesce else None
+        # Identical deferred submits share one operation, so the journal records it once
+        self._submit_flight = SingleFlight()
+        self._async_submit_flight = AsyncSingleFlight()
+        self._instrumentation = instrumentation
+        self._credentials = credentials or StaticCredentials(api_key, iam_token)
+        self._journal = journal
+        self._headers: dict[str, str] = {}
+        self._operation_headers: dict[str, str] = {}
+        self._credentials.subscribe(self._update_headers)
 
     @property
     def _model_uri(self) -> str:
         return f"gpt://{self._folder_id}/{self._model}"
 
+    def _get_embedding_model_uri(self, model: EmbeddingModel) -> str:
+        return f"emb://{self._folder_id}/{model}/latest"
+
+    def with_model(self, model: FoundationModel, **overrides: Any) -> "BaseFoundationModelClient":
+        """Returns client of another model sharing credentials, cache and policies of this one.
+
+        The copy has its own connections, so closing one client leaves the other usable.
+
+        :param model: Model of the new client
+        :param overrides: Other constructor arguments to replace, e.g. rate_limiter or timeout
+        :return: New client
+        """
+        client = copy.copy(self)
+        client._model = model
+        for name, value in overrides.items():
+            if not hasattr(client, f"_{name}"):
+                raise TypeError(f"Unknown client argument {name}")
+            setattr(client, f"_{name}", value)
+        client._reset_state()
+        return client
+
+    def _reset_state(self) -> None:
+        """Replaces state that must not be shared with the client it was copied from"""
+        self._single_flight = SingleFlight() if self._single_flight is not None else None
+        self._async_single_flight = AsyncSingleFlight() if self._async_single_flight is not None else None
+        self._submit_flight = SingleFlight()
+        self._async_submit_flight = AsyncSingleFlight()
+        self._headers = {}
+        self._operation_headers = {}
+        self._credentials.subscribe(self._update_headers)
+
     @property
-    def _headers(self) -> dict[str, str]:
+    def uses_iam_token(self) -> bool:
+        """Whether IAM token is available, so deferred completions may be used"""
+        return self._credentials.is_iam
+
+    def _update_headers(self, authorization: Optional[str], operation_authorization: Optional[str]) -> None:
+        """Replaces precomputed headers when credentials change"""
         headers = {
             "Content-Type": "application/json",
             "x-folder-id": self._folder_id
         }
-        if self._api_key:
-            headers["Authorization"] = f"Api-Key {self._api_key}"
-        elif self._iam_token:
-            headers["Authorization"] = f"Bearer {self._iam_token}"
-        else:
-            raise ValueError("IAM-TOKEN or API-KEY is not set")
-        return headers
+        if authorization:
+            headers["Authorization"] = authorization
+        self._headers = headers
+        self._operation_headers = {"Authorization": operation_authorization or ""}
+
+    def _get_headers(self) -> dict[str, str]:
+        self._credentials.ensure()
+        return self._headers
+
+    async def _aget_headers(self) -> dict[str, str]:
+        await self._credentials.aensure()
+        return self._headers
+
+    def _get_operation_headers(self) -> dict[str, str]:
+        self._credentials.ensure()
+        return self._operation_headers
+
+    async def _aget_operation_headers(self) -> dict[str, str]:
+        await self._credentials.aensure()
+        return self._operation_headers
+
+    def _check_iam(self) -> None:
+        if not self._credentials.is_iam:
+            raise ValueError("IAM-TOKEN required for this method")
 
     def _build_payload(
             self,
             messages: list[dict[str, str]],
             tools: Optional[list[dict[str, Any]]] = None,
-            stop: Optional[list[str]] = None
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None,
+            stream: Optional[bool] = None
     ) -> dict[str, Any]:
         """Method for build JSON data.
 
         :param messages: Messages in friendly YandexGPT format
         :param tools: Tools for function calling
         :param stop: Sequence of words to stop generation
+        :param tool_choice: How the model picks tools, e.g. ``{"mode": "REQUIRED"}`` or ``{"functionName": name}``
+        :param response_format: ``jsonObject`` or ``jsonSchema`` field constraining output to JSON
+        :param stream: Overrides streaming option of the client
         :return: Built JSON for sending requests
         """
         payload = {
             "modelUri": self._model_uri,
             "completionOptions": {
-                "stream": self._streaming,
+                "stream": self._streaming if stream is None else stream,
                 "temperature": self._temperature,
                 "maxTokens": self._max_tokens,
             },
             "messages": messages
         }
         if self._reasoning:
-            payload["reasoningOptions"]["mode"] = ON_REASONING_MODE
+            payload["reasoningOptions"] = {"mode": ON_REASONING_MODE}
         if tools:
             payload["tools"] = tools
+            if tool_choice:
+                payload["toolChoice"] = tool_choice
+        if response_format:
+            payload.update(response_format)
         if stop:
             payload["completionOptions"]["stopSequences"] = stop
         return payload
+
+    def _rate_limit(
+            self,
+            payload: dict[str, Any],
+            timings: Optional[RequestTimings] = None
+    ) -> ContextManager[None]:
+        if self._rate_limiter is None:
+            return nullcontext()
+        limit = self._rate_limiter.limit(estimate_tokens(payload))
+        timings = timings or self._get_timings()
+        if timings is None:
+            return limit
+        return timed_context(limit, timings, "rate_limit_wait")
+
+    def _arate_limit(
+            self,
+            payload: dict[str, Any],
+            timings: Optional[RequestTimings] = None
+    ) -> AsyncContextManager[None]:
+        if self._rate_limiter is None:
+            return nullcontext()
+        limit = self._rate_limiter.alimit(estimate_tokens(payload))
+        timings = timings or self._get_timings()
+        if timings is None:
+            return limit
+        return atimed_context(limit, timings, "rate_limit_wait")
+
+    def instrument(self, operation: str) -> ContextManager[Optional[RequestTimings]]:
+        """Collects timings of the call and passes them to instrumentation when it ends.
+
+        Calls made inside add their phases to the outer call,
+        so callers may include their own phases like message conversion.
+
+        :param operation: Name of the call
+        :return: Context manager yielding timings, or None when instrumentation is disabled
+        """
+        if self._instrumentation is None:
+            return nullcontext()
+        return instrument(self._instrumentation, operation, self._model_uri)
+
+    def _get_timings(self) -> Optional[RequestTimings]:
+        if self._instrumentation is None:
+            return None
+        return get_current_timings()
+
+    def _start_timings(self, operation: str) -> Optional[RequestTimings]:
+        """Starts timings of streamed call, which can't be collected in context
+        since generators are resumed in the context of their consumer"""
+        if self._instrumentation is None:
+            return None
+        return RequestTimings(operation, self._model_uri)
+
+    def _finish_timings(self, timings: Optional[RequestTimings], error: Optional[BaseException] = None) -> None:
+        if timings is not None:
+            timings.finish(error)
+            self._instrumentation.on_request_end(timings)
+
+    @staticmethod
+    def _with_chunk_timings(response: dict[str, Any], timings: Optional[RequestTimings]) -> dict[str, Any]:
+        """Attaches compact timings of the stream so far to decoded chunk"""
+        if timings is None:
+            return response
+        if "first_chunk" not in timings.phases:
+            timings.add("first_chunk", timings.started_at)
+        timings.record_usage(response.get("result", {}).get("usage"))
+        response[CLIENT_INFO_KEY] = {"timings": timings.as_dict()}
+        return response
+
+    @staticmethod
+    def _with_timings(response: dict[str, Any], timings: Optional[RequestTimings]) -> dict[str, Any]:
+        """Returns copy of response with compact timings of the call in client info"""
+        if timings is None:
+            return response
+        timings.record_usage(response.get("result", {}).get("usage"))
+        return {**response, CLIENT_INFO_KEY: {**response.get(CLIENT_INFO_KEY, {}), "timings": timings.as_dict()}}
+
+    def _get_cache_key(self, body: bytes) -> Optional[str]:
+        """Returns cache key of request body, None when response must not be cached"""
+        if self._cache is None:
+            return None
+        if not self._force_cache and (self._temperature or 0) > 0:
+            return None
+        return create_cache_key(body)
+
+    def _get_cached(self, key: Optional[str]) -> Optional[dict[str, Any]]:
+        if key is None:
+            return None
+        return self._with_cache_hit(self._cache.get(key))
+
+    async def _aget_cached(self, key: Optional[str]) -> Optional[dict[str, Any]]:
+        if key is None:
+            return None
+        return self._with_cache_hit(await self._cache.aget(key))
+
+    @staticmethod
+    def _with_cache_hit(response: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+        if response is None:
+            return None
+        return {**response, CLIENT_INFO_KEY: {"cache": "hit"}}
+
+    def _set_cached(self, key: Optional[str], response: dict[str, Any]) -> dict[str, Any]:
+        if key is None:
+            return response
+        self._cache.set(key, {k: v for k, v in response.items() if k != CLIENT_INFO_KEY})
+        return self._with_cache_miss(response)
+
+    async def _aset_cached(self, key: Optional[str], response: dict[str, Any]) -> dict[str, Any]:
+        if key is None:
+            return response
+        await self._cache.aset(key, {k: v for k, v in response.items() if k != CLIENT_INFO_KEY})
+        return self._with_cache_miss(response)
+
+    @staticmethod
+    def _with_cache_miss(response: dict[str, Any]) -> dict[str, Any]:
+        response[CLIENT_INFO_KEY] = {**response.get(CLIENT_INFO_KEY, {}), "cache": "miss"}
+        return response
+
+    def _find_journaled(self, body: bytes) -> tuple[Optional[str], Optional[str]]:
+        """Returns journal key of deferred request body and operation already submitted with it"""
+        if self._journal is None:
+            return None, None
+        key = create_cache_key(body)
+        return key, self._journal.find(key)
+
+    async def _afind_journaled(self, body: bytes) -> tuple[Optional[str], Optional[str]]:
+        if self._journal is None:
+            return None, None
+        key = create_cache_key(body)
+        return key, await self._journal.afind(key)
+
+    def _journal_submitted(self, key: Optional[str], operation_id: str) -> str:
+        if key is not None:
+            self._journal.add(key, operation_id)
+        return operation_id
+
+    async def _ajournal_submitted(self, key: Optional[str], operation_id: str) -> str:
+        if key is not None:
+            await self._journal.aadd(key, operation_id)
+        return operation_id
+
+    def _get_journaled(self, operation_id: str) -> Optional[dict[str, Any]]:
+        """Returns done operation recorded by any process"""
+        if self._journal is None:
+            return None
+        return self._journal.get(operation_id)
+
+    async def _aget_journaled(self, operation_id: str) -> Optional[dict[str, Any]]:
+        if self._journal is None:
+            return None
+        return await self._journal.aget(operation_id)
+
+    def _journal_done(self, operation_id: str, operation: dict[str, Any]) -> dict[str, Any]:
+        if self._journal is not None and operation.get("done"):
+            self._journal.complete(operation_id, operation)
+        return operation
+
+    async def _ajournal_done(self, operation_id: str, operation: dict[str, Any]) -> dict[str, Any]:
+        if self._journal is not None and operation.get("done"):
+            await self._journal.acomplete(operation_id, operation)
+        return operation
+
+    def _check_journal(self) -> BaseOperationJournal:
+        if self._journal is None:
+            raise ValueError("Operation journal is not set")
+        return self._journal
+
+    @staticmethod
+    def _with_coalesced_info(response: dict[str, Any], shared: bool) -> dict[str, Any]:
+        """Returns own copy of response shared with another caller"""
+        if not shared:
+            return response
+        return {**response, CLIENT_INFO_KEY: {**response.get(CLIENT_INFO_KEY, {}), "coalesced": True}}
+
+    def _with_client_info(self, response: dict[str, Any], stats: dict[str, int]) -> dict[str, Any]:
+        """Attaches retry and hedge counters to response when the policies are enabled"""
+        timings = self._get_timings()
+        if timings is not None:
+            timings.retries += stats["retries"]
+            timings.hedges += stats["hedges"]
+        if self._retry_policy is not None or self._hedge_policy is not None:
+            response[CLIENT_INFO_KEY] = {**response.get(CLIENT_INFO_KEY, {}), **stats}
+        return response
+
+    @staticmethod
+    def _raise_for_status(
+            status_code: int,
+            text: str,
+            headers: Optional[Mapping[str, str]] = None
+    ) -> None:
+        """Raises client error for unsuccessful response status"""
+        retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+        if status_code == STATUS_429_TOO_MANY_REQUESTS:
+            raise TooManyRequests(
+                f"Too many requests (status {status_code}):"
+                f"{text}",
+                retry_after=retry_after
+            )
+        elif status_code == STATUS_503_SERVICE_UNAVAILABLE:
+            raise ServiceUnavailable(
+                f"Service unavailable (status {status_code}):"
+                f"{text}",
+                retry_after=retry_after
+            )
+        elif STATUS_400_BAD_REQUEST <= status_code < STATUS_500_INTERNAL_SERVER_ERROR:
+            raise BadRequest(
+                f"Bad request (status {status_code}):"
+                f"{text}"
+            )
+        elif status_code < STATUS_500_INTERNAL_SERVER_ERROR:
+            raise CompletionError(
+                f"Unexpected response (status {status_code}):"
+                f"{text}"
+            )
+        raise ServerError(
+            f"Server error (status {status_code}):"
+            f"{text}",
+            retry_after=retry_after
+        )
@@ -0,0 +1,117 @@
+from typing import Any, AsyncIterator, Iterator, Optional
+
+import asyncio
+import queue
+import threading
+
+from .polling import get_operation_result
+
+
+class BatchItem:
+    """Outcome of one deferred completion of a batch
+
+        :param index: Position of the payload in the batch
+        :param operation_id: Identifier of the deferred operation if it was submitted
+        :param result: Completion response when the operation succeeded
+        :param error: Exception raised for this payload
+    """
+    def __init__(
+            self,
+            index: int,
+            operation_id: Optional[str] = None,
+            result: Optional[dict[str, Any]] = None,
+            error: Optional[BaseException] = None
+    ) -> None:
+        self.index = index
+        self.operation_id = operation_id
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return (
+            f"BatchItem(index={self.index}, operation_id={self.operation_id!r}, "
+            f"ok={self.ok})"
+        )
+
+
+def create_batch_item(index: int, operation_id: str, operation: dict[str, Any]) -> BatchItem:
+    """Converts done operation to batch item capturing operation error"""
+    try:
+        return BatchItem(index, operation_id, result=get_operation_result(operation))
+    except Exception as e:
+        return BatchItem(index, operation_id, error=e)
+
+
+BatchPart = tuple[Any, list[int], list[dict[str, Any]]]
+
+
+def iter_batch_parts(parts: list[BatchPart], *args: Any) -> Iterator[BatchItem]:
+    """Runs parts of a batch on their clients in parallel threads,
+    yields items as they are known with indexes within the whole batch.
+
+    :param parts: Client, batch indexes and payloads of every part
+    :param args: Arguments of iter_batch_completion_async after payloads
+    """
+    items: queue.Queue = queue.Queue()
+
+    def run(client: Any, indexes: list[int], payloads: list[dict[str, Any]]) -> None:
+        try:
+            for item in client.iter_batch_completion_async(payloads, *args):
+                item.index = indexes[item.index]
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        finally:
+            items.put(None)
+
+    threads = [threading.Thread(target=run, args=part, daemon=True) for part in parts if part[1]]
+    for thread in threads:
+        thread.start()
+    running = len(threads)
+    while running:
+        item = items.get()
+        if item is None:
+            running -= 1
+        elif isinstance(item, BaseException):
+            raise item
+        else:
+            yield item
+
+
+async def aiter_batch_parts(parts: list[BatchPart], *args: Any) -> AsyncIterator[BatchItem]:
+    """Runs parts of a batch on their clients concurrently,
+    yields items as they are known with indexes within the whole batch.
+
+    :param parts: Client, batch indexes and payloads of every part
+    :param args: Arguments of aiter_batch_completion_async after payloads
+    """
+    items: asyncio.Queue = asyncio.Queue()
+
+    async def run(client: Any, indexes: list[int], payloads: list[dict[str, Any]]) -> None:
+        try:
+            async for item in client.aiter_batch_completion_async(payloads, *args):
+                item.index = indexes[item.index]
+                items.put_nowait(item)
+        except Exception as e:
+            items.put_nowait(e)
+        finally:
+            items.put_nowait(None)
+
+    tasks = [asyncio.ensure_future(run(*part)) for part in parts if part[1]]
+    try:
+        running = len(tasks)
+        while running:
+            item = await items.get()
+            if item is None:
+                running -= 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
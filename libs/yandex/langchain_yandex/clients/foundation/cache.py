@@ -0,0 +1,156 @@
+from typing import Any, Optional
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .codec import dumps, loads
+from .constants import CACHE_MAXSIZE, CACHE_TTL, CACHE_EVICT_EVERY
+
+
+class BaseCompletionCache:
+    """Base class of completion responses storage keyed by request body hash.
+
+    Async methods run blocking storage in a worker thread, caches which
+    never block override them to skip the thread.
+    """
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, response: dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def aget(self, key: str) -> Optional[dict[str, Any]]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, response: dict[str, Any]) -> None:
+        await asyncio.to_thread(self.set, key, response)
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCompletionCache(BaseCompletionCache):
+    """Least recently used completion cache of the process
+
+        :param maxsize: Maximum number of cached responses
+        :param ttl: Seconds a response stays valid, None to keep until evicted
+    """
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: Optional[float] = CACHE_TTL) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, response = entry
+            if self._ttl is not None and time.time() - created_at > self._ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    async def aget(self, key: str) -> Optional[dict[str, Any]]:
+        return self.get(key)
+
+    async def aset(self, key: str, response: dict[str, Any]) -> None:
+        self.set(key, response)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCompletionCache(BaseCompletionCache):
+    """Completion cache in SQLite database shared by worker processes
+
+        :param path: Path to database file
+        :param maxsize: Maximum number of cached responses
+        :param ttl: Seconds a response stays valid, None to keep until evicted
+    """
+    def __init__(
+            self,
+            path: str,
+            maxsize: int = CACHE_MAXSIZE,
+            ttl: Optional[float] = CACHE_TTL
+    ) -> None:
+        self._path = path
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS completions_used_at ON completions (used_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT response, created_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        response, created_at = row
+        now = time.time()
+        if self._ttl is not None and now - created_at > self._ttl:
+            connection.execute("DELETE FROM completions WHERE key = ?", (key,))
+            return None
+        connection.execute("UPDATE completions SET used_at = ? WHERE key = ?", (now, key))
+        return loads(response)
+
+    def set(self, key: str, response: dict[str, Any]) -> None:
+        connection = self._connect()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO completions (key, response, created_at, used_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, dumps(response).decode(), now, now)
+        )
+        self._writes += 1
+        if self._writes % CACHE_EVICT_EVERY == 0:
+            connection.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self._maxsize,)
+            )
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM completions")
+
+
+def create_cache_key(body: bytes) -> str:
+    """Returns hash of encoded request body.
+
+    Body is built from payload in fixed order by the client codec, so identical requests
+    share keys, while processes using other codecs don't share cache entries.
+    """
+    return hashlib.sha256(body).hexdigest()
@@ -3,4 +3,17 @@ from .async_client import AsyncFoundationModelClient
 
 
 class FoundationModelClient(SyncFoundationModelClient, AsyncFoundationModelClient):
-    pass
+    def close(self) -> None:
+        """Close pooled connections of sync and async calls"""
+        super().close()
+        self.close_asession()
+
+    async def aclose(self) -> None:
+        super().close()
+        await super().aclose()
+
+    async def __aenter__(self) -> "FoundationModelClient":
+        return self
+
+    def __enter__(self) -> "FoundationModelClient":
+        return self
@@ -0,0 +1,75 @@
+from typing import Any, Awaitable, Callable, Optional
+
+import asyncio
+import threading
+import weakref
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Shares one call between threads calling concurrently with the same key"""
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, call: Callable[[], Any]) -> tuple[Any, bool]:
+        """Calls function unless the call with the key is in flight already.
+
+        :param key: Key of identical calls
+        :param call: Function to call
+        :return: Result of the call and whether it was shared with another caller
+        """
+        with self._lock:
+            in_flight = self._calls.get(key)
+            if in_flight is None:
+                in_flight = self._calls[key] = _Call()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result, True
+        try:
+            in_flight.result = call()
+            return in_flight.result, False
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            in_flight.done.set()
+
+
+class AsyncSingleFlight:
+    """Shares one call between coroutines awaiting concurrently with the same key"""
+    def __init__(self) -> None:
+        self._calls: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[str, asyncio.Future]
+        ] = weakref.WeakKeyDictionary()
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Awaits function unless the call with the key is in flight already.
+
+        Shared call is shielded, so it keeps running for other callers
+        when one of them is cancelled.
+
+        :param key: Key of identical calls
+        :param call: Coroutine function to await
+        :return: Result of the call and whether it was shared with another caller
+        """
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        in_flight = calls.get(key)
+        if in_flight is not None:
+            return await asyncio.shield(in_flight), True
+        in_flight = calls[key] = asyncio.ensure_future(call())
+        in_flight.add_done_callback(lambda _: calls.pop(key, None))
+        return await asyncio.shield(in_flight), False
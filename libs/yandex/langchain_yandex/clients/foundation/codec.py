@@ -0,0 +1,137 @@
+from typing import Any, Optional, Union
+
+import json
+
+from typing_extensions import TypedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class Usage(TypedDict, total=False):
+    inputTextTokens: int
+    completionTokens: int
+    totalTokens: int
+    completionTokensDetails: dict[str, int]
+
+
+class Alternative(TypedDict, total=False):
+    message: dict[str, Any]
+    status: str
+
+
+class CompletionResult(TypedDict, total=False):
+    alternatives: list[Alternative]
+    usage: Usage
+    modelVersion: str
+
+
+class CompletionResponse(TypedDict, total=False):
+    result: CompletionResult
+
+
+class Operation(TypedDict, total=False):
+    id: str
+    description: str
+    createdAt: str
+    createdBy: str
+    modifiedAt: str
+    done: bool
+    metadata: Optional[dict[str, Any]]
+    error: dict[str, Any]
+    response: CompletionResult
+
+
+class JSONCodec:
+    """Codec of request and response bodies based on standard library"""
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def decode_completion(self, data: Union[bytes, str]) -> CompletionResponse:
+        return self.loads(data)
+
+    def decode_operation(self, data: Union[bytes, str]) -> Operation:
+        return self.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """Codec based on orjson, encodes and decodes several times faster than json"""
+    name = "orjson"
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JSONCodec):
+    """Codec based on msgspec, encodes and decodes faster than orjson.
+
+    Responses are decoded untyped, so every codec returns the same unknown fields and
+    token counts as sent by the API.
+    """
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, value: Any) -> bytes:
+        return self._encoder.encode(value)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self._decoder.decode(data)
+
+
+def create_default_codec() -> JSONCodec:
+    """Returns the fastest installed codec: msgspec, orjson or json"""
+    if msgspec is not None:
+        return MsgspecCodec()
+    if orjson is not None:
+        return OrjsonCodec()
+    return JSONCodec()
+
+
+_codec: JSONCodec = create_default_codec()
+
+
+def get_codec() -> JSONCodec:
+    return _codec
+
+
+def set_codec(codec: JSONCodec) -> None:
+    """Replaces codec used by all clients"""
+    global _codec
+    _codec = codec
+
+
+def dumps(value: Any) -> bytes:
+    """Encodes value to compact UTF-8 JSON"""
+    return _codec.dumps(value)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return _codec.loads(data)
+
+
+def decode_completion(data: Union[bytes, str]) -> CompletionResponse:
+    """Decodes completion response or streamed chunk"""
+    return _codec.decode_completion(data)
+
+
+def decode_operation(data: Union[bytes, str]) -> Operation:
+    """Decodes status of deferred operation"""
+    return _codec.decode_operation(data)
@@ -6,14 +6,94 @@ class FoundationModel(StrEnum):
     YANDEXGPT_PRO = "yandexgpt"
 
 
+class EmbeddingModel(StrEnum):
+    TEXT_SEARCH_DOC = "text-search-doc"
+    TEXT_SEARCH_QUERY = "text-search-query"
+
+
+class Priority(StrEnum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
 URL = "https://llm.api.cloud.yandex.net/foundationModels/v1"
 OPERATIONS_ENDPOINT = "https://operation.api.cloud.yandex.net/operations"
 
-ASYNC_TIMEOUT = 1
+POLL_FIRST_DELAY = 0.5
+POLL_INTERVAL = 0.5
+POLL_MAX_INTERVAL = 10.0
+POLL_MULTIPLIER = 1.5
+POLL_JITTER = 0.1
+POLL_DEADLINE = 3600.0
+POLL_BATCH_WINDOW = 0.1
+
+BATCH_MAX_IN_FLIGHT = 100
+BATCH_WORKERS = 16
+
+EMBEDDING_MAX_CONCURRENCY = 10
+EMBEDDING_WAVE_SIZE = 100
+
+RATE_LIMIT_MAX_CONCURRENCY = 64
+RATE_LIMIT_MIN_CONCURRENCY = 1
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+CHARS_PER_TOKEN = 4
+
+RETRY_MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_MAX_BACKOFF = 10.0
+RETRY_MULTIPLIER = 2.0
+RETRY_MAX_RETRY_AFTER = 60.0
+
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+HEDGE_MAX_HEDGES = 1
+
+CACHE_MAXSIZE = 10000
+CACHE_TTL = 24 * 60 * 60
+CACHE_EVICT_EVERY = 100
+
+JOURNAL_TTL = 3 * 24 * 60 * 60
+
+ROUTING_EWMA_ALPHA = 0.2
+ROUTING_MAX_FAILOVERS = 1
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_ERROR_RATE = 0.5
+BREAKER_MIN_REQUESTS = 20
+BREAKER_OPEN_DURATION = 5.0
+BREAKER_MAX_OPEN_DURATION = 120.0
+
+SCHEDULER_MAX_CONCURRENCY = 64
+SCHEDULER_RESERVED_INTERACTIVE = 8
+SCHEDULER_EWMA_ALPHA = 0.2
+# Seconds after which latency estimate not renewed by completed requests halves
+SCHEDULER_LATENCY_HALF_LIFE = 10.0
+
+USAGE_PERIOD = 24 * 60 * 60
+USAGE_FLUSH_INTERVAL = 5.0
+
+IAM_TOKEN_URL = "https://iam.api.cloud.yandex.net/iam/v1/tokens"
+IAM_TOKEN_LIFETIME = 12 * 60 * 60
+SERVICE_ACCOUNT_JWT_LIFETIME = 60 * 60
+CREDENTIALS_REFRESH_MARGIN = 10 * 60
+CREDENTIALS_EXPIRY_SKEW = 30.0
+CREDENTIALS_RETRY_INTERVAL = 10.0
+FILE_CREDENTIALS_TTL = 60.0
+
+CLIENT_INFO_KEY = "clientInfo"
+
+POOL_SIZE = 100
+POOL_LIMIT_PER_HOST = 0
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
 
 TEMPERATURE = 0.7
 ON_REASONING_MODE = "ENABLED_HIDDEN"
 
 STATUS_200_OK = 200
 STATUS_400_BAD_REQUEST = 400
+STATUS_429_TOO_MANY_REQUESTS = 429
 STATUS_500_INTERNAL_SERVER_ERROR = 500
+STATUS_503_SERVICE_UNAVAILABLE = 503
+
+PARTIAL_ALTERNATIVE_STATUS = "ALTERNATIVE_STATUS_PARTIAL"
@@ -0,0 +1,385 @@
+from typing import Any, Awaitable, Callable, Optional, Union
+
+import asyncio
+import inspect
+import json
+import logging
+import threading
+import time
+import weakref
+from datetime import datetime
+from pathlib import Path
+
+from .exceptions import CredentialsError
+from .constants import (
+    IAM_TOKEN_URL,
+    IAM_TOKEN_LIFETIME,
+    SERVICE_ACCOUNT_JWT_LIFETIME,
+    CREDENTIALS_REFRESH_MARGIN,
+    CREDENTIALS_EXPIRY_SKEW,
+    CREDENTIALS_RETRY_INTERVAL,
+    FILE_CREDENTIALS_TTL,
+    STATUS_200_OK
+)
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[Optional[str], Optional[str]], None]
+
+
+class Token:
+    """IAM token with its expiry time
+
+        :param value: Token
+        :param expires_at: Unix time the token expires at
+        :param refresh_at: Unix time to fetch a new token, shortly before expiry by default
+    """
+    def __init__(self, value: str, expires_at: float, refresh_at: Optional[float] = None) -> None:
+        lifetime = expires_at - time.time()
+        self.value = value
+        self.expires_at = expires_at
+        # Requests stop using the token shortly before expiry to allow for clock skew
+        self.valid_until = expires_at - min(CREDENTIALS_EXPIRY_SKEW, lifetime / 4)
+        if refresh_at is None:
+            refresh_at = expires_at - min(CREDENTIALS_REFRESH_MARGIN, lifetime / 2)
+        self.refresh_at = refresh_at
+
+
+class BaseCredentials:
+    """Source of authorization of API requests.
+
+    Clients subscribe to credentials and keep precomputed headers,
+    which are replaced whenever authorization changes.
+    """
+    def __init__(self) -> None:
+        self._authorization: Optional[str] = None
+        self._operation_authorization: Optional[str] = None
+        self._listeners: list[Union[weakref.WeakMethod, Listener]] = []
+        self._listeners_lock = threading.Lock()
+
+    @property
+    def is_iam(self) -> bool:
+        """Whether IAM token required by deferred completions and operations is available"""
+        return False
+
+    @property
+    def authorization(self) -> Optional[str]:
+        return self._authorization
+
+    @property
+    def operation_authorization(self) -> Optional[str]:
+        return self._operation_authorization
+
+    def ensure(self) -> None:
+        """Makes sure authorization is valid, waits only when there is no valid token"""
+
+    async def aensure(self) -> None:
+        """Makes sure authorization is valid, waits only when there is no valid token"""
+
+    def subscribe(self, listener: Listener) -> None:
+        """Calls listener with current and every new authorization.
+
+        Bound methods are held weakly, so subscribed clients may be garbage collected.
+        """
+        with self._listeners_lock:
+            self._listeners.append(weakref.WeakMethod(listener) if inspect.ismethod(listener) else listener)
+        listener(self._authorization, self._operation_authorization)
+
+    def close(self) -> None:
+        """Stops background refresh"""
+
+    def _publish(self, authorization: Optional[str], operation_authorization: Optional[str]) -> None:
+        self._authorization = authorization
+        self._operation_authorization = operation_authorization
+        with self._listeners_lock:
+            listeners = []
+            for reference in self._listeners:
+                listener = reference() if isinstance(reference, weakref.WeakMethod) else reference
+                if listener is not None:
+                    listeners.append(listener)
+            self._listeners = [
+                reference for reference in self._listeners
+                if not isinstance(reference, weakref.WeakMethod) or reference() is not None
+            ]
+        for listener in listeners:
+            listener(authorization, operation_authorization)
+
+
+class StaticCredentials(BaseCredentials):
+    """API key or IAM token that never changes
+
+        :param api_key: API key, used for completions when set
+        :param iam_token: IAM token, required by deferred completions and operations
+    """
+    def __init__(self, api_key: Optional[str] = None, iam_token: Optional[str] = None) -> None:
+        super().__init__()
+        self._iam_token = iam_token
+        if api_key:
+            self._authorization = f"Api-Key {api_key}"
+        elif iam_token:
+            self._authorization = f"Bearer {iam_token}"
+        if iam_token:
+            self._operation_authorization = f"Bearer {iam_token}"
+
+    @property
+    def is_iam(self) -> bool:
+        return bool(self._iam_token)
+
+    def ensure(self) -> None:
+        if self._authorization is None:
+            raise ValueError("IAM-TOKEN or API-KEY is not set")
+
+    async def aensure(self) -> None:
+        self.ensure()
+
+
+class RefreshingCredentials(BaseCredentials):
+    """IAM token refreshed in background thread before it expires.
+
+    Requests read the current token without waiting while it is valid.
+    Only the first request, or requests made after refreshing failed
+    until expiry, wait for the token, and concurrent waiters share one fetch.
+
+        :param retry_interval: Seconds between attempts when refreshing fails
+    """
+    def __init__(self, retry_interval: float = CREDENTIALS_RETRY_INTERVAL) -> None:
+        super().__init__()
+        self._retry_interval = retry_interval
+        self._token: Optional[Token] = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_iam(self) -> bool:
+        return True
+
+    @property
+    def token(self) -> Optional[Token]:
+        return self._token
+
+    def fetch_token(self) -> Token:
+        """Obtains new token, called from refreshing thread or first waiting request.
+        Token which is already expired fails the refresh with CredentialsError.
+        """
+        raise NotImplementedError
+
+    def ensure(self) -> None:
+        if not self._is_valid():
+            self._refresh(self._is_valid)
+
+    async def aensure(self) -> None:
+        if not self._is_valid():
+            await asyncio.to_thread(self._refresh, self._is_valid)
+
+    def refresh(self) -> None:
+        """Fetches new token now"""
+        self._refresh(lambda: False)
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def _is_valid(self) -> bool:
+        token = self._token
+        return token is not None and time.time() < token.valid_until
+
+    def _is_fresh(self) -> bool:
+        token = self._token
+        return token is not None and time.time() < token.refresh_at
+
+    def _refresh(self, is_done: Callable[[], bool]) -> None:
+        with self._refresh_lock:
+            if is_done():
+                return
+            token = self.fetch_token()
+            if time.time() >= token.valid_until:
+                raise CredentialsError(
+                    f"Obtained IAM token is expired since {datetime.fromtimestamp(token.expires_at)}"
+                )
+            self._token = token
+            authorization = f"Bearer {token.value}"
+            self._publish(authorization, authorization)
+        self._start_refresher()
+
+    def _start_refresher(self) -> None:
+        with self._refresh_lock:
+            if self._thread is not None or self._stop.is_set():
+                return
+            self._thread = threading.Thread(
+                target=_run_refresher,
+                args=(weakref.ref(self), self._stop),
+                name="foundation-model-credentials",
+                daemon=True
+            )
+            self._thread.start()
+
+
+def _run_refresher(reference: "weakref.ref[RefreshingCredentials]", stop: threading.Event) -> None:
+    """Refreshes token before it is due, holding credentials weakly
+    so forgotten credentials stop refreshing"""
+    delay = 0.0
+    while not stop.wait(delay):
+        credentials = reference()
+        if credentials is None:
+            return
+        try:
+            credentials._refresh(credentials._is_fresh)
+        except Exception as e:
+            logger.warning("Failed to refresh IAM token: %s", e)
+            delay = credentials._retry_interval
+        else:
+            # Token due for refresh right away is not fetched again sooner than after retry interval
+            delay = credentials._token.refresh_at - time.time()
+            if delay <= 0:
+                delay = credentials._retry_interval
+        del credentials
+
+
+class CallbackCredentials(RefreshingCredentials):
+    """IAM token obtained by user function.
+
+    Function may be sync or async and return token string, which is considered
+    valid for lifetime seconds, or Token with its own expiry time.
+
+        :param callback: Function returning token
+        :param lifetime: Seconds token returned as string stays valid
+        :param retry_interval: Seconds between attempts when refreshing fails
+    """
+    def __init__(
+            self,
+            callback: Callable[[], Union[str, Token, Awaitable[Union[str, Token]]]],
+            lifetime: float = IAM_TOKEN_LIFETIME,
+            retry_interval: float = CREDENTIALS_RETRY_INTERVAL
+    ) -> None:
+        super().__init__(retry_interval)
+        self._callback = callback
+        self._lifetime = lifetime
+
+    def fetch_token(self) -> Token:
+        token = self._callback()
+        if inspect.isawaitable(token):
+            token = asyncio.run(_await(token))
+        if isinstance(token, Token):
+            return token
+        return Token(token, time.time() + self._lifetime)
+
+
+async def _await(awaitable: Awaitable[Any]) -> Any:
+    return await awaitable
+
+
+class FileCredentials(RefreshingCredentials):
+    """IAM token read from file, re-read periodically to pick up rotated tokens.
+
+    File contains bare token or JSON with ``iamToken`` and optional ``expiresAt`` fields.
+
+        :param path: Path to file with token
+        :param ttl: Seconds between reads of the file
+        :param retry_interval: Seconds between attempts when reading fails
+    """
+    def __init__(
+            self,
+            path: Union[str, Path],
+            ttl: float = FILE_CREDENTIALS_TTL,
+            retry_interval: float = CREDENTIALS_RETRY_INTERVAL
+    ) -> None:
+        super().__init__(retry_interval)
+        self._path = Path(path)
+        self._ttl = ttl
+
+    def fetch_token(self) -> Token:
+        try:
+            content = self._path.read_text().strip()
+        except OSError as e:
+            raise CredentialsError(f"Failed to read IAM token from {self._path}: {e}") from e
+        now = time.time()
+        if content.startswith("{"):
+            data = json.loads(content)
+            value = data["iamToken"]
+            expires_at = parse_expires_at(data["expiresAt"]) if "expiresAt" in data else now + IAM_TOKEN_LIFETIME
+        else:
+            value, expires_at = content, now + IAM_TOKEN_LIFETIME
+        if not value:
+            raise CredentialsError(f"File {self._path} contains no IAM token")
+        return Token(value, expires_at, refresh_at=min(now + self._ttl, expires_at))
+
+
+class ServiceAccountCredentials(RefreshingCredentials):
+    """IAM token exchanged for JWT signed with service account authorized key.
+
+    Requires ``PyJWT`` package with ``cryptography``.
+
+        :param service_account_id: Identifier of service account
+        :param key_id: Identifier of authorized key
+        :param private_key: PEM encoded private key
+        :param iam_url: IAM API URL to exchange JWT
+        :param timeout: Timeout of exchange request
+        :param retry_interval: Seconds between attempts when refreshing fails
+    """
+    def __init__(
+            self,
+            service_account_id: str,
+            key_id: str,
+            private_key: str,
+            iam_url: str = IAM_TOKEN_URL,
+            timeout: Optional[float] = None,
+            retry_interval: float = CREDENTIALS_RETRY_INTERVAL
+    ) -> None:
+        super().__init__(retry_interval)
+        self._service_account_id = service_account_id
+        self._key_id = key_id
+        self._private_key = private_key
+        self._iam_url = iam_url
+        self._timeout = timeout
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path], **kwargs: Any) -> "ServiceAccountCredentials":
+        """Creates credentials from authorized key JSON file created by ``yc iam key create``"""
+        key = json.loads(Path(path).read_text())
+        return cls(key["service_account_id"], key["id"], key["private_key"], **kwargs)
+
+    def _create_jwt(self) -> str:
+        try:
+            import jwt
+        except ImportError as e:
+            raise ImportError(
+                "Service account credentials require PyJWT, "
+                "install it with `pip install pyjwt[crypto]`"
+            ) from e
+        now = int(time.time())
+        return jwt.encode(
+            {
+                "aud": self._iam_url,
+                "iss": self._service_account_id,
+                "iat": now,
+                "exp": now + SERVICE_ACCOUNT_JWT_LIFETIME
+            },
+            self._private_key,
+            algorithm="PS256",
+            headers={"kid": self._key_id}
+        )
+
+    def fetch_token(self) -> Token:
+        import requests
+
+        try:
+            response = requests.post(self._iam_url, json={"jwt": self._create_jwt()}, timeout=self._timeout)
+        except requests.RequestException as e:
+            raise CredentialsError(f"Failed to exchange service account key: {e}") from e
+        if response.status_code != STATUS_200_OK:
+            raise CredentialsError(
+                f"Failed to exchange service account key (status {response.status_code}):"
+                f"{response.text}"
+            )
+        data = response.json()
+        return Token(data["iamToken"], parse_expires_at(data["expiresAt"]))
+
+
+def parse_expires_at(value: str) -> float:
+    """Parses RFC 3339 time with up to nanoseconds precision to Unix time"""
+    value = value.replace("Z", "+00:00")
+    if "." in value:
+        seconds, _, rest = value.partition(".")
+        digits = len(rest) - len(rest.lstrip("0123456789"))
+        value = f"{seconds}.{rest[:min(digits, 6)]}{rest[digits:]}"
+    return datetime.fromisoformat(value).timestamp()
@@ -0,0 +1,29 @@
+from typing import Any, Iterable
+
+from .codec import dumps
+
+
+class EncodedList(list):
+    """List of JSON values carrying their pre-encoded fragments.
+
+    Fragments are spliced into request body as is, so values
+    encoded once may be sent many times without encoding them again.
+    """
+    def __init__(self, values: Iterable[Any] = (), fragments: Iterable[bytes] = ()) -> None:
+        super().__init__(values)
+        self.fragments = list(fragments)
+
+
+def encode_payload(payload: dict[str, Any]) -> bytes:
+    """Encodes request body splicing pre-encoded fragments of top level lists"""
+    spliced = {key: value for key, value in payload.items() if isinstance(value, EncodedList)}
+    if not spliced:
+        return dumps(payload)
+    rest = {key: value for key, value in payload.items() if key not in spliced}
+    parts = [dumps(rest)[:-1]]
+    separator = b"," if rest else b""
+    for key, value in spliced.items():
+        parts.append(separator + dumps(key) + b":[" + b",".join(value.fragments) + b"]")
+        separator = b","
+    parts.append(b"}")
+    return b"".join(parts)
@@ -1,3 +1,4 @@
+from typing import Optional
 
 
 class ClientError(Exception):
@@ -10,3 +11,57 @@ class CompletionError(ClientError):
 
 class BadRequest(ClientError):
     pass
+
+
+class RetryableError(CompletionError):
+    """Error of request that may succeed when repeated
+
+        :param retry_after: Seconds the server asked to wait before retrying
+    """
+    def __init__(self, *args: object, retry_after: Optional[float] = None) -> None:
+        super().__init__(*args)
+        self.retry_after = retry_after
+
+
+class TooManyRequests(BadRequest, RetryableError):
+    pass
+
+
+class ServerError(RetryableError):
+    pass
+
+
+class ServiceUnavailable(ServerError):
+    pass
+
+
+class ConnectionFailed(RetryableError):
+    pass
+
+
+class RequestTimeout(RetryableError):
+    pass
+
+
+class OperationError(CompletionError):
+    pass
+
+
+class OperationTimeout(ClientError):
+    pass
+
+
+class OperationCancelled(ClientError):
+    pass
+
+
+class CredentialsError(ClientError):
+    pass
+
+
+class BudgetExceeded(ClientError):
+    pass
+
+
+class DeadlineExceeded(ClientError):
+    pass
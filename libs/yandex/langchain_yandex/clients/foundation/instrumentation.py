@@ -0,0 +1,329 @@
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, ContextManager, Iterator, Optional
+
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+_current_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("foundation_model_timings", default=None)
+
+
+class RequestTimings:
+    """Durations of phases of one client call collected while instrumentation is enabled.
+
+    Phases are ``rate_limit_wait``, ``pool_wait``, ``dns``, ``connect`` (including TLS),
+    ``ttfb`` (from sending request to response headers), ``body_read``, ``decode``,
+    ``polling_wait`` and ``conversion``. Connection phases are reported by async client only.
+
+        :param operation: Name of client method
+        :param model: Model URI of the client
+    """
+    __slots__ = (
+        "operation",
+        "model",
+        "started_at",
+        "started_at_ns",
+        "duration",
+        "phases",
+        "spans",
+        "retries",
+        "hedges",
+        "polls",
+        "input_tokens",
+        "output_tokens",
+        "error"
+    )
+
+    def __init__(self, operation: str, model: str) -> None:
+        self.operation = operation
+        self.model = model
+        self.started_at = time.perf_counter()
+        self.started_at_ns = time.time_ns()
+        self.duration: Optional[float] = None
+        self.phases: dict[str, float] = {}
+        self.spans: list[tuple[str, float, float]] = []
+        self.retries = 0
+        self.hedges = 0
+        self.polls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.error: Optional[BaseException] = None
+
+    def add(self, phase: str, started_at: float, duration: Optional[float] = None) -> None:
+        """Records phase started at perf_counter value, lasting until now unless duration is given"""
+        if duration is None:
+            duration = time.perf_counter() - started_at
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+        self.spans.append((phase, started_at, duration))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, started_at)
+
+    def record_usage(self, usage: Optional[dict[str, Any]]) -> None:
+        if usage:
+            self.input_tokens = int(usage.get("inputTextTokens", 0))
+            self.output_tokens = int(usage.get("completionTokens", 0))
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.duration = time.perf_counter() - self.started_at
+        self.error = error
+
+    def to_unix_ns(self, perf_counter: float) -> int:
+        """Converts perf_counter value to wall clock nanoseconds"""
+        return self.started_at_ns + int((perf_counter - self.started_at) * 1e9)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        elapsed = self.duration if self.duration is not None else time.perf_counter() - self.started_at
+        if not self.output_tokens or not elapsed:
+            return None
+        return self.output_tokens / elapsed
+
+    def as_dict(self) -> dict[str, Any]:
+        """Returns compact timings in milliseconds"""
+        elapsed = self.duration if self.duration is not None else time.perf_counter() - self.started_at
+        timings: dict[str, Any] = {"total_ms": round(elapsed * 1000, 3)}
+        for phase, duration in self.phases.items():
+            timings[f"{phase}_ms"] = round(duration * 1000, 3)
+        if self.retries:
+            timings["retries"] = self.retries
+        if self.hedges:
+            timings["hedges"] = self.hedges
+        if self.polls:
+            timings["polls"] = self.polls
+        tokens_per_second = self.tokens_per_second
+        if tokens_per_second is not None:
+            timings["tokens_per_second"] = round(tokens_per_second, 3)
+        return timings
+
+
+class BaseInstrumentation:
+    """Receives timings of every finished client call"""
+    def on_request_end(self, timings: RequestTimings) -> None:
+        raise NotImplementedError
+
+
+class CallbackInstrumentation(BaseInstrumentation):
+    """Passes timings of finished calls to function
+
+        :param callback: Function called with timings
+    """
+    def __init__(self, callback: Callable[[RequestTimings], None]) -> None:
+        self._callback = callback
+
+    def on_request_end(self, timings: RequestTimings) -> None:
+        self._callback(timings)
+
+
+class CompositeInstrumentation(BaseInstrumentation):
+    """Passes timings to several instrumentations"""
+    def __init__(self, *instrumentations: BaseInstrumentation) -> None:
+        self._instrumentations = instrumentations
+
+    def on_request_end(self, timings: RequestTimings) -> None:
+        for instrumentation in self._instrumentations:
+            instrumentation.on_request_end(timings)
+
+
+class OpenTelemetryInstrumentation(BaseInstrumentation):
+    """Exports every call as OpenTelemetry span with child span per phase.
+
+    Requires ``opentelemetry-api`` package.
+
+        :param tracer: Tracer to create spans, tracer of this package by default
+    """
+    def __init__(self, tracer: Any = None) -> None:
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "OpenTelemetry instrumentation requires opentelemetry-api, "
+                "install it with `pip install opentelemetry-api`"
+            ) from e
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer("langchain_yandex")
+
+    def on_request_end(self, timings: RequestTimings) -> None:
+        attributes = {
+            "gen_ai.system": "yandex",
+            "gen_ai.request.model": timings.model,
+            "gen_ai.usage.input_tokens": timings.input_tokens,
+            "gen_ai.usage.output_tokens": timings.output_tokens,
+            "yandex.retries": timings.retries,
+            "yandex.hedges": timings.hedges,
+            "yandex.polls": timings.polls
+        }
+        span = self._tracer.start_span(
+            f"foundation_model.{timings.operation}",
+            start_time=timings.started_at_ns,
+            attributes=attributes
+        )
+        context = self._trace.set_span_in_context(span)
+        for phase, started_at, duration in timings.spans:
+            child = self._tracer.start_span(phase, context=context, start_time=timings.to_unix_ns(started_at))
+            child.end(end_time=timings.to_unix_ns(started_at + duration))
+        if timings.error is not None:
+            span.record_exception(timings.error)
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, str(timings.error)))
+        span.end(end_time=timings.to_unix_ns(timings.started_at + (timings.duration or 0.0)))
+
+
+class PrometheusInstrumentation(BaseInstrumentation):
+    """Records calls in Prometheus histograms and counters.
+
+    Requires ``prometheus-client`` package.
+
+        :param registry: Registry of metrics, default registry of prometheus-client if not set
+        :param prefix: Prefix of metric names
+    """
+    def __init__(self, registry: Any = None, prefix: str = "yandex_foundation_model") -> None:
+        try:
+            from prometheus_client import REGISTRY, Counter, Histogram
+        except ImportError as e:
+            raise ImportError(
+                "Prometheus instrumentation requires prometheus-client, "
+                "install it with `pip install prometheus-client`"
+            ) from e
+        registry = registry or REGISTRY
+        self._request_seconds = Histogram(
+            f"{prefix}_request_seconds",
+            "Duration of client calls",
+            ["operation", "model", "status"],
+            registry=registry
+        )
+        self._phase_seconds = Histogram(
+            f"{prefix}_phase_seconds",
+            "Duration of phases of client calls",
+            ["operation", "phase"],
+            registry=registry
+        )
+        self._tokens_per_second = Histogram(
+            f"{prefix}_output_tokens_per_second",
+            "Generated tokens per second of call duration",
+            ["operation", "model"],
+            buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+            registry=registry
+        )
+        self._tokens = Counter(
+            f"{prefix}_tokens",
+            "Tokens of finished calls",
+            ["operation", "model", "kind"],
+            registry=registry
+        )
+        self._retries = Counter(
+            f"{prefix}_retries",
+            "Repeated requests",
+            ["operation"],
+            registry=registry
+        )
+        self._hedges = Counter(
+            f"{prefix}_hedges",
+            "Duplicated slow requests",
+            ["operation"],
+            registry=registry
+        )
+
+    def on_request_end(self, timings: RequestTimings) -> None:
+        status = "ok" if timings.error is None else type(timings.error).__name__
+        self._request_seconds.labels(timings.operation, timings.model, status).observe(timings.duration or 0.0)
+        for phase, duration in timings.phases.items():
+            self._phase_seconds.labels(timings.operation, phase).observe(duration)
+        if timings.input_tokens:
+            self._tokens.labels(timings.operation, timings.model, "input").inc(timings.input_tokens)
+        if timings.output_tokens:
+            self._tokens.labels(timings.operation, timings.model, "output").inc(timings.output_tokens)
+        tokens_per_second = timings.tokens_per_second
+        if tokens_per_second is not None:
+            self._tokens_per_second.labels(timings.operation, timings.model).observe(tokens_per_second)
+        if timings.retries:
+            self._retries.labels(timings.operation).inc(timings.retries)
+        if timings.hedges:
+            self._hedges.labels(timings.operation).inc(timings.hedges)
+
+
+def get_current_timings() -> Optional[RequestTimings]:
+    """Returns timings of the call being instrumented in current context"""
+    return _current_timings.get()
+
+
+@contextmanager
+def instrument(instrumentation: BaseInstrumentation, operation: str, model: str) -> Iterator[RequestTimings]:
+    """Collects timings of the call, nested calls add their phases to the outer one"""
+    timings = _current_timings.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = RequestTimings(operation, model)
+    token = _current_timings.set(timings)
+    error: Optional[BaseException] = None
+    try:
+        yield timings
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_timings.reset(token)
+        timings.finish(error)
+        instrumentation.on_request_end(timings)
+
+
+@contextmanager
+def timed_context(context: ContextManager[Any], timings: RequestTimings, phase: str) -> Iterator[None]:
+    """Enters context recording time spent entering it as phase"""
+    started_at = time.perf_counter()
+    with context:
+        timings.add(phase, started_at)
+        yield
+
+
+@asynccontextmanager
+async def atimed_context(context: AsyncContextManager[Any], timings: RequestTimings, phase: str) -> AsyncIterator[None]:
+    """Enters context recording time spent entering it as phase"""
+    started_at = time.perf_counter()
+    async with context:
+        timings.add(phase, started_at)
+        yield
+
+
+def create_trace_config() -> Any:
+    """Returns aiohttp trace config recording connection phases into timings
+    passed as trace_request_ctx of the request"""
+    import aiohttp
+
+    trace_config = aiohttp.TraceConfig(trace_config_ctx_factory=_TraceContext)
+
+    def starter(attribute: str) -> Callable[..., Any]:
+        async def on_start(session: Any, context: "_TraceContext", params: Any) -> None:
+            setattr(context, attribute, time.perf_counter())
+        return on_start
+
+    def ender(attribute: str, phase: str) -> Callable[..., Any]:
+        async def on_end(session: Any, context: "_TraceContext", params: Any) -> None:
+            started_at = getattr(context, attribute)
+            timings = context.trace_request_ctx
+            if started_at is not None and isinstance(timings, RequestTimings):
+                timings.add(phase, started_at)
+        return on_end
+
+    trace_config.on_connection_queued_start.append(starter("queued_at"))
+    trace_config.on_connection_queued_end.append(ender("queued_at", "pool_wait"))
+    trace_config.on_dns_resolvehost_start.append(starter("resolving_at"))
+    trace_config.on_dns_resolvehost_end.append(ender("resolving_at", "dns"))
+    trace_config.on_connection_create_start.append(starter("connecting_at"))
+    trace_config.on_connection_create_end.append(ender("connecting_at", "connect"))
+    trace_config.on_request_start.append(starter("requested_at"))
+    trace_config.on_request_end.append(ender("requested_at", "ttfb"))
+    return trace_config
+
+
+class _TraceContext:
+    def __init__(self, trace_request_ctx: Any = None) -> None:
+        self.trace_request_ctx = trace_request_ctx
+        self.queued_at: Optional[float] = None
+        self.resolving_at: Optional[float] = None
+        self.connecting_at: Optional[float] = None
+        self.requested_at: Optional[float] = None
@@ -0,0 +1,131 @@
+from typing import Any, Optional
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+from .codec import dumps, loads
+from .constants import JOURNAL_TTL, CACHE_EVICT_EVERY
+
+
+class BaseOperationJournal:
+    """Base class of deferred operations storage keyed by request body hash.
+
+    Journal outlives the process, so submitted operations are not lost on restart,
+    identical requests are not submitted twice and any process may collect results.
+    Async methods run blocking storage in a worker thread.
+    """
+    def find(self, key: str) -> Optional[str]:
+        """Returns identifier of operation submitted with request body hash, unless it failed"""
+        raise NotImplementedError
+
+    def add(self, key: str, operation_id: str) -> None:
+        raise NotImplementedError
+
+    def complete(self, operation_id: str, operation: dict[str, Any]) -> None:
+        """Stores done operation"""
+        raise NotImplementedError
+
+    def get(self, operation_id: str) -> Optional[dict[str, Any]]:
+        """Returns operation if it is done"""
+        raise NotImplementedError
+
+    def pending(self) -> list[str]:
+        """Returns identifiers of operations not known to be done"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    async def afind(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.find, key)
+
+    async def aadd(self, key: str, operation_id: str) -> None:
+        await asyncio.to_thread(self.add, key, operation_id)
+
+    async def acomplete(self, operation_id: str, operation: dict[str, Any]) -> None:
+        await asyncio.to_thread(self.complete, operation_id, operation)
+
+    async def aget(self, operation_id: str) -> Optional[dict[str, Any]]:
+        return await asyncio.to_thread(self.get, operation_id)
+
+    async def apending(self) -> list[str]:
+        return await asyncio.to_thread(self.pending)
+
+
+class SQLiteOperationJournal(BaseOperationJournal):
+    """Operation journal in SQLite database shared by worker processes
+
+        :param path: Path to database file
+        :param ttl: Seconds operations are kept after submission, None to keep them forever
+    """
+    def __init__(self, path: str, ttl: Optional[float] = JOURNAL_TTL) -> None:
+        self._path = path
+        self._ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS operations ("
+                "operation_id TEXT PRIMARY KEY, key TEXT NOT NULL, submitted_at REAL NOT NULL, "
+                "done INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, operation TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS operations_key ON operations (key, submitted_at)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS operations_done ON operations (done, submitted_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _oldest(self) -> float:
+        return 0.0 if self._ttl is None else time.time() - self._ttl
+
+    def find(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT operation_id FROM operations WHERE key = ? AND failed = 0 AND submitted_at > ? "
+            "ORDER BY submitted_at DESC LIMIT 1",
+            (key, self._oldest())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def add(self, key: str, operation_id: str) -> None:
+        connection = self._connect()
+        connection.execute(
+            "INSERT OR IGNORE INTO operations (operation_id, key, submitted_at) VALUES (?, ?, ?)",
+            (operation_id, key, time.time())
+        )
+        self._writes += 1
+        if self._ttl is not None and self._writes % CACHE_EVICT_EVERY == 0:
+            connection.execute("DELETE FROM operations WHERE submitted_at <= ?", (self._oldest(),))
+
+    def complete(self, operation_id: str, operation: dict[str, Any]) -> None:
+        self._connect().execute(
+            "UPDATE operations SET done = 1, failed = ?, operation = ? WHERE operation_id = ?",
+            (int("error" in operation), dumps(operation).decode(), operation_id)
+        )
+
+    def get(self, operation_id: str) -> Optional[dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT operation FROM operations WHERE operation_id = ? AND done = 1", (operation_id,)
+        ).fetchone()
+        return None if row is None else loads(row[0])
+
+    def pending(self) -> list[str]:
+        rows = self._connect().execute(
+            "SELECT operation_id FROM operations WHERE done = 0 AND submitted_at > ? ORDER BY submitted_at",
+            (self._oldest(),)
+        ).fetchall()
+        return [operation_id for operation_id, in rows]
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM operations")
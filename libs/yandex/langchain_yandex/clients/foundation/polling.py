@@ -0,0 +1,139 @@
+from typing import Any, Iterator, Optional
+
+import random
+import time
+
+from .exceptions import OperationError, OperationTimeout
+from .constants import (
+    POLL_FIRST_DELAY,
+    POLL_INTERVAL,
+    POLL_MAX_INTERVAL,
+    POLL_MULTIPLIER,
+    POLL_JITTER,
+    POLL_DEADLINE,
+    POLL_BATCH_WINDOW
+)
+
+
+class PollingPolicy:
+    """Schedule of deferred operation status checks
+
+        :param first_delay: Seconds to wait before the first check
+        :param interval: Seconds between the first checks
+        :param max_interval: Upper bound of seconds between checks
+        :param multiplier: Factor the interval grows by after every check
+        :param jitter: Fraction of the interval randomized to spread checks
+        :param deadline: Seconds to wait for operations, None to wait forever
+    """
+    def __init__(
+            self,
+            first_delay: float = POLL_FIRST_DELAY,
+            interval: float = POLL_INTERVAL,
+            max_interval: float = POLL_MAX_INTERVAL,
+            multiplier: float = POLL_MULTIPLIER,
+            jitter: float = POLL_JITTER,
+            deadline: Optional[float] = POLL_DEADLINE
+    ) -> None:
+        self.first_delay = first_delay
+        self.interval = interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def delays(self) -> Iterator[float]:
+        """Yields seconds to wait before every next check"""
+        yield self.first_delay
+        interval = self.interval
+        while True:
+            yield interval * (1 + random.uniform(-self.jitter, self.jitter))
+            interval = min(interval * self.multiplier, self.max_interval)
+
+    def start(self) -> "PollingClock":
+        return PollingClock(self)
+
+
+class PollingClock:
+    """Tracks delays and deadline of one polling loop"""
+    def __init__(self, policy: PollingPolicy) -> None:
+        self._delays = policy.delays()
+        self._deadline_at = (
+            None if policy.deadline is None else time.monotonic() + policy.deadline
+        )
+
+    def next_delay(self, pending: Any = None) -> float:
+        """Returns seconds to wait before next check, bounded by the deadline.
+
+        :param pending: Identifiers of pending operations for the timeout error
+        """
+        delay = next(self._delays)
+        if self._deadline_at is None:
+            return delay
+        remaining = self._deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise OperationTimeout(f"Operations are not done before deadline: {pending}")
+        return min(delay, remaining)
+
+
+class PollingSchedule:
+    """Tracks delays and deadlines of operations polled in one loop, each operation
+    on its own schedule from its submission, so operations submitted late in a long batch
+    are polled often at first and get the whole deadline.
+
+        :param policy: Schedule of every operation
+        :param window: Seconds operations due soon are checked early by, so checks are grouped
+    """
+    def __init__(self, policy: PollingPolicy, window: float = POLL_BATCH_WINDOW) -> None:
+        self._policy = policy
+        self._window = window
+        # Delays, deadline and next check time by operation
+        self._operations: dict[str, tuple[Iterator[float], Optional[float], list[float]]] = {}
+
+    def add(self, operation_id: str) -> None:
+        delays = self._policy.delays()
+        now = time.monotonic()
+        deadline_at = None if self._policy.deadline is None else now + self._policy.deadline
+        self._operations[operation_id] = (delays, deadline_at, [self._bound(now + next(delays), deadline_at)])
+
+    def remove(self, operation_id: str) -> None:
+        self._operations.pop(operation_id, None)
+
+    @staticmethod
+    def _bound(check_at: float, deadline_at: Optional[float]) -> float:
+        return check_at if deadline_at is None else min(check_at, deadline_at)
+
+    def next_delay(self) -> float:
+        """Returns seconds to wait before the earliest check"""
+        if not self._operations:
+            return 0.0
+        check_at = min(next_check[0] for _, _, next_check in self._operations.values())
+        return max(0.0, check_at - time.monotonic())
+
+    def due(self) -> list[str]:
+        """Returns operations to check now"""
+        check_until = time.monotonic() + self._window
+        return [
+            operation_id
+            for operation_id, (_, _, next_check) in self._operations.items()
+            if next_check[0] <= check_until
+        ]
+
+    def reschedule(self, operation_id: str) -> bool:
+        """Schedules next check of operation which is still pending
+
+        :return: False when the operation missed its deadline and was removed
+        """
+        delays, deadline_at, next_check = self._operations[operation_id]
+        now = time.monotonic()
+        if deadline_at is not None and now >= deadline_at:
+            del self._operations[operation_id]
+            return False
+        next_check[0] = self._bound(now + next(delays), deadline_at)
+        return True
+
+
+def get_operation_result(operation: dict[str, Any]) -> dict[str, Any]:
+    """Converts done operation to completion response"""
+    if "error" in operation:
+        raise OperationError(f"Operation {operation.get('id')} failed: {operation['error']}")
+    return {"result": operation["response"]}
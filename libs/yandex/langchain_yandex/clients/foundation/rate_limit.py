@@ -0,0 +1,247 @@
+from typing import Any, AsyncIterator, Iterator, Optional, Union
+
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+from .exceptions import TooManyRequests, ServiceUnavailable
+from .constants import (
+    FoundationModel,
+    RATE_LIMIT_MAX_CONCURRENCY,
+    RATE_LIMIT_MIN_CONCURRENCY,
+    RATE_LIMIT_DECREASE_FACTOR,
+    CHARS_PER_TOKEN
+)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously with rate tokens per second.
+
+    Reservations may take the bucket into debt, so callers are served
+    in the order they reserved and wait exactly until their tokens are refilled.
+
+        :param rate: Tokens added per second
+        :param capacity: Maximum number of tokens, defaults to one second of rate
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self._rate = rate
+        self._capacity = capacity or rate
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Takes amount of tokens, returns seconds to wait until they are available"""
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+        self._tokens -= min(amount, self._capacity)
+        return max(0.0, -self._tokens / self._rate)
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit adapted with additive increase and multiplicative decrease.
+
+    Every successful request grows the limit by one per limit of requests,
+    every throttled request multiplies it by decrease_factor.
+
+        :param maximum: Upper bound and initial value of the limit
+        :param minimum: Lower bound of the limit
+        :param decrease_factor: Factor the limit is multiplied by on throttling
+    """
+    def __init__(
+            self,
+            maximum: int = RATE_LIMIT_MAX_CONCURRENCY,
+            minimum: int = RATE_LIMIT_MIN_CONCURRENCY,
+            decrease_factor: float = RATE_LIMIT_DECREASE_FACTOR
+    ) -> None:
+        self._maximum = maximum
+        self._minimum = minimum
+        self._decrease_factor = decrease_factor
+        self._limit = float(maximum)
+        self._in_flight = 0
+        self._waiters: deque[Union[threading.Event, tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return max(self._minimum, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # Slot was handed over, a cancelled future is released by _wake
+            if not future.cancelled():
+                self._release_slot()
+            raise
+
+    def release(self, throttled: bool = False) -> None:
+        with self._lock:
+            if throttled:
+                self._limit = max(float(self._minimum), self._limit * self._decrease_factor)
+            else:
+                self._limit = min(float(self._maximum), self._limit + 1 / self._limit)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            while self._waiters and self._in_flight < self.limit:
+                waiter = self._waiters.popleft()
+                self._in_flight += 1
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                else:
+                    loop, future = waiter
+                    loop.call_soon_threadsafe(self._wake, future)
+
+    def _wake(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self._release_slot()
+        else:
+            future.set_result(None)
+
+
+class RateLimiter:
+    """Client-side limiter of requests and tokens per second with adaptive concurrency.
+
+    One limiter may be shared by sync and async clients of one folder and model,
+    requests exceeding the quota wait locally instead of being rejected by the API.
+
+        :param requests_per_second: Quota of requests per second, None for no limit
+        :param tokens_per_second: Quota of tokens per second, None for no limit
+        :param max_concurrency: Upper bound of requests sent at once
+        :param min_concurrency: Lower bound the concurrency shrinks to on throttling
+        :param decrease_factor: Factor the concurrency is multiplied by on throttling
+    """
+    def __init__(
+            self,
+            requests_per_second: Optional[float] = None,
+            tokens_per_second: Optional[float] = None,
+            max_concurrency: int = RATE_LIMIT_MAX_CONCURRENCY,
+            min_concurrency: int = RATE_LIMIT_MIN_CONCURRENCY,
+            decrease_factor: float = RATE_LIMIT_DECREASE_FACTOR
+    ) -> None:
+        self._requests = TokenBucket(requests_per_second) if requests_per_second else None
+        self._tokens = TokenBucket(tokens_per_second) if tokens_per_second else None
+        self._concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency, decrease_factor)
+        self._lock = threading.Lock()
+
+    @property
+    def concurrency(self) -> AdaptiveConcurrency:
+        return self._concurrency
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            delay = 0.0
+            if self._requests is not None:
+                delay = max(delay, self._requests.reserve(1))
+            if self._tokens is not None and tokens:
+                delay = max(delay, self._tokens.reserve(tokens))
+            return delay
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Waits until request with estimated tokens may be sent"""
+        delay = self._reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        self._concurrency.acquire()
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        """Waits until request with estimated tokens may be sent"""
+        delay = self._reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        await self._concurrency.aacquire()
+
+    def release(self, throttled: bool = False) -> None:
+        """Releases request slot, throttled requests shrink the concurrency"""
+        self._concurrency.release(throttled)
+
+    @contextmanager
+    def limit(self, tokens: int = 0) -> Iterator[None]:
+        self.acquire(tokens)
+        throttled = False
+        try:
+            yield
+        except (TooManyRequests, ServiceUnavailable):
+            throttled = True
+            raise
+        finally:
+            self.release(throttled)
+
+    @asynccontextmanager
+    async def alimit(self, tokens: int = 0) -> AsyncIterator[None]:
+        await self.aacquire(tokens)
+        throttled = False
+        try:
+            yield
+        except (TooManyRequests, ServiceUnavailable):
+            throttled = True
+            raise
+        finally:
+            self.release(throttled)
+
+
+_rate_limiters: dict[tuple[str, str], tuple[RateLimiter, dict[str, Any]]] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(folder_id: str, model: FoundationModel, **kwargs: Any) -> RateLimiter:
+    """Returns rate limiter shared by all clients of the folder and model.
+
+    :param folder_id: Identifier of cloud catalog
+    :param model: Model name
+    :param kwargs: Parameters of the limiter
+    :return: Shared rate limiter
+    :raises ValueError: When the limiter was created with other parameters
+    """
+    key = (folder_id, str(model))
+    bound = inspect.signature(RateLimiter).bind(**kwargs)
+    bound.apply_defaults()
+    settings = dict(bound.arguments)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = (RateLimiter(**settings), settings)
+        limiter, created_settings = _rate_limiters[key]
+    if settings != created_settings:
+        raise ValueError(
+            f"Rate limiter of folder {folder_id} and model {model} is shared and already created "
+            f"with {created_settings}, got {settings}; pass the same quota or an explicit rate limiter"
+        )
+    return limiter
+
+
+def estimate_tokens(payload: dict[str, Any]) -> int:
+    """Roughly estimates tokens of request including maximum tokens to generate"""
+    chars = sum(len(message.get("text") or "") for message in payload.get("messages", []))
+    max_tokens = payload.get("completionOptions", {}).get("maxTokens") or 0
+    return chars // CHARS_PER_TOKEN + int(max_tokens)
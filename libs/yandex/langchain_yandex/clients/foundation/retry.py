@@ -0,0 +1,155 @@
+from typing import Any, Awaitable, Callable, Optional
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from .exceptions import RetryableError, TooManyRequests, ServiceUnavailable
+from .constants import (
+    RETRY_MAX_RETRIES,
+    RETRY_BACKOFF,
+    RETRY_MAX_BACKOFF,
+    RETRY_MULTIPLIER,
+    RETRY_MAX_RETRY_AFTER,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW,
+    HEDGE_MAX_HEDGES
+)
+
+# Errors of requests the server rejected without processing, safe to repeat for non-idempotent requests
+REJECTED_ERRORS = (TooManyRequests, ServiceUnavailable)
+
+
+class RetryPolicy:
+    """Policy of repeating requests failed with retryable errors
+
+        :param max_retries: Maximum number of repeated attempts
+        :param backoff: Seconds to wait before the first retry
+        :param max_backoff: Upper bound of seconds between retries
+        :param multiplier: Factor the backoff grows by after every retry
+        :param respect_retry_after: Whether to wait as long as Retry-After header asks
+        :param max_retry_after: Upper bound of seconds taken from Retry-After header
+    """
+    def __init__(
+            self,
+            max_retries: int = RETRY_MAX_RETRIES,
+            backoff: float = RETRY_BACKOFF,
+            max_backoff: float = RETRY_MAX_BACKOFF,
+            multiplier: float = RETRY_MULTIPLIER,
+            respect_retry_after: bool = True,
+            max_retry_after: float = RETRY_MAX_RETRY_AFTER
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, attempt: int, error: BaseException) -> bool:
+        return attempt < self.max_retries and isinstance(error, RetryableError)
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        """Returns seconds to wait before retry, jittered between half and full backoff"""
+        retry_after = getattr(error, "retry_after", None)
+        if self.respect_retry_after and retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        backoff = min(self.backoff * self.multiplier ** attempt, self.max_backoff)
+        return random.uniform(backoff / 2, backoff)
+
+
+class HedgePolicy:
+    """Policy of sending duplicate requests when the first one is slow.
+
+    Duplicate request is sent when no response arrived within the percentile
+    of recently observed latencies, the fastest response wins.
+
+        :param percentile: Percentile of latencies used as hedging delay
+        :param min_samples: Number of observed latencies required to start hedging
+        :param window: Number of recent latencies kept
+        :param max_hedges: Maximum number of duplicate requests
+    """
+    def __init__(
+            self,
+            percentile: float = HEDGE_PERCENTILE,
+            min_samples: int = HEDGE_MIN_SAMPLES,
+            window: int = HEDGE_WINDOW,
+            max_hedges: int = HEDGE_MAX_HEDGES
+    ) -> None:
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """Returns seconds to wait before hedging, None while latencies are not known"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.percentile))]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses Retry-After header given in seconds or as HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def call_with_retry(
+        policy: Optional[RetryPolicy],
+        call: Callable[[], Any],
+        stats: Optional[dict[str, int]] = None,
+        retry_on: tuple[type[RetryableError], ...] = (RetryableError,)
+) -> Any:
+    """Calls function repeating it on retryable errors of retry_on types, counts retries in stats"""
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except RetryableError as e:
+            if policy is None or not isinstance(e, retry_on) or not policy.should_retry(attempt, e):
+                raise
+            time.sleep(policy.delay(attempt, e))
+        attempt += 1
+        if stats is not None:
+            stats["retries"] = stats.get("retries", 0) + 1
+
+
+async def acall_with_retry(
+        policy: Optional[RetryPolicy],
+        call: Callable[[], Awaitable[Any]],
+        stats: Optional[dict[str, int]] = None,
+        retry_on: tuple[type[RetryableError], ...] = (RetryableError,)
+) -> Any:
+    """Awaits function repeating it on retryable errors of retry_on types, counts retries in stats"""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except RetryableError as e:
+            if policy is None or not isinstance(e, retry_on) or not policy.should_retry(attempt, e):
+                raise
+            await asyncio.sleep(policy.delay(attempt, e))
+        attempt += 1
+        if stats is not None:
+            stats["retries"] = stats.get("retries", 0) + 1
@@ -0,0 +1,588 @@
+from typing import Any, AsyncIterator, ContextManager, Iterable, Iterator, Optional, Sequence, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .client import FoundationModelClient
+
+import asyncio
+import copy
+import threading
+import time
+
+from .batch import BatchItem, BatchPart, iter_batch_parts, aiter_batch_parts
+from .encoding import encode_payload
+from .polling import PollingPolicy, get_operation_result
+from .exceptions import RetryableError, TooManyRequests
+from .retry import REJECTED_ERRORS
+from .constants import (
+    FoundationModel,
+    BATCH_MAX_IN_FLIGHT,
+    ROUTING_EWMA_ALPHA,
+    ROUTING_MAX_FAILOVERS,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_ERROR_RATE,
+    BREAKER_MIN_REQUESTS,
+    BREAKER_OPEN_DURATION,
+    BREAKER_MAX_OPEN_DURATION
+)
+
+LEAST_OUTSTANDING = "least_outstanding"
+WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+
+
+class CircuitBreaker:
+    """Circuit breaker ejecting failing endpoint and probing it back in.
+
+    Breaker opens after failure_threshold consecutive failures, or when smoothed
+    error rate exceeds error_rate after min_requests. Open breaker lets one probe
+    request through after open_duration, a failed probe doubles the duration.
+
+        :param failure_threshold: Consecutive failures opening the breaker
+        :param error_rate: Smoothed share of failed requests opening the breaker
+        :param min_requests: Requests observed before error rate is considered
+        :param open_duration: Seconds the breaker stays open before the first probe
+        :param max_open_duration: Upper bound of seconds between probes
+        :param alpha: Weight of the latest request in smoothed error rate
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+            self,
+            failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+            error_rate: float = BREAKER_ERROR_RATE,
+            min_requests: int = BREAKER_MIN_REQUESTS,
+            open_duration: float = BREAKER_OPEN_DURATION,
+            max_open_duration: float = BREAKER_MAX_OPEN_DURATION,
+            alpha: float = ROUTING_EWMA_ALPHA
+    ) -> None:
+        self._failure_threshold = failure_threshold
+        self._error_rate_threshold = error_rate
+        self._min_requests = min_requests
+        self._open_duration = open_duration
+        self._max_open_duration = max_open_duration
+        self._alpha = alpha
+        self.state = self.CLOSED
+        self.error_rate = 0.0
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._current_open_duration = open_duration
+
+    @property
+    def retry_at(self) -> float:
+        """Monotonic time the open breaker lets a probe through"""
+        return self.opened_at + self._current_open_duration
+
+    def available(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() >= self.retry_at
+        return False
+
+    def acquire(self) -> None:
+        """Marks request sent to endpoint, the first one after open period becomes the probe"""
+        if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+            self.state = self.HALF_OPEN
+
+    def release(self) -> None:
+        """Marks request abandoned without outcome, abandoned probe lets the next request probe again"""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def reset(self) -> None:
+        """Closes breaker and forgets observed requests"""
+        self.state = self.CLOSED
+        self.error_rate = 0.0
+        self.requests = 0
+        self.consecutive_failures = 0
+        self._current_open_duration = self._open_duration
+
+    def record_success(self) -> None:
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.error_rate *= 1 - self._alpha
+        if self.state != self.CLOSED:
+            self.reset()
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.consecutive_failures += 1
+        self.error_rate = self.error_rate * (1 - self._alpha) + self._alpha
+        if self.state == self.HALF_OPEN:
+            self._current_open_duration = min(self._current_open_duration * 2, self._max_open_duration)
+            self._open()
+        elif self.state == self.CLOSED and (
+                self.consecutive_failures >= self._failure_threshold
+                or (self.requests >= self._min_requests and self.error_rate >= self._error_rate_threshold)
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+
+class Endpoint:
+    """Client of one folder or API key with its health statistics
+
+        :param client: Foundation model API client
+        :param weight: Share of requests relative to other endpoints
+        :param breaker: Circuit breaker of the endpoint
+    """
+    def __init__(
+            self,
+            client: "FoundationModelClient",
+            weight: float = 1.0,
+            breaker: Optional[CircuitBreaker] = None
+    ) -> None:
+        self.client = client
+        self.weight = weight
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.current_weight = 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "model_uri": self.client._model_uri,
+            "base_url": self.client._base_url,
+            "weight": self.weight,
+            "state": self.breaker.state,
+            "outstanding": self.outstanding,
+            "latency": self.latency,
+            "error_rate": self.breaker.error_rate,
+            "requests": self.requests,
+            "failures": self.failures,
+            "throttled": self.throttled
+        }
+
+
+class RoutingFoundationModelClient:
+    """Client spreading requests over several folders, API keys or endpoints.
+
+    Presents the interface of FoundationModelClient, so the chat model may use it
+    instead of a single client. Every request goes to one healthy endpoint picked
+    by the strategy, failed retryable requests move on to another endpoint.
+
+        :param endpoints: Clients or endpoints with weights to route between
+        :param strategy: ``least_outstanding`` or ``weighted_round_robin``
+        :param max_failovers: Other endpoints tried after retryable error
+        :param alpha: Weight of the latest request in latency average
+    """
+    def __init__(
+            self,
+            endpoints: Sequence[Union["FoundationModelClient", Endpoint]],
+            strategy: str = LEAST_OUTSTANDING,
+            max_failovers: int = ROUTING_MAX_FAILOVERS,
+            alpha: float = ROUTING_EWMA_ALPHA
+    ) -> None:
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        if strategy not in (LEAST_OUTSTANDING, WEIGHTED_ROUND_ROBIN):
+            raise ValueError(f"Unknown routing strategy {strategy}")
+        self._endpoints = [
+            endpoint if isinstance(endpoint, Endpoint) else Endpoint(endpoint)
+            for endpoint in endpoints
+        ]
+        self._strategy = strategy
+        self._max_failovers = max_failovers
+        self._alpha = alpha
+        self._lock = threading.Lock()
+
+    @property
+    def endpoints(self) -> list[Endpoint]:
+        return self._endpoints
+
+    @property
+    def _model(self) -> FoundationModel:
+        return self._endpoints[0].client._model
+
+    @property
+    def _model_uri(self) -> str:
+        return self._endpoints[0].client._model_uri
+
+    def with_model(self, model: FoundationModel, **overrides: Any) -> "RoutingFoundationModelClient":
+        """Returns routing client of another model over copies of the endpoints clients"""
+        endpoints = []
+        for endpoint in self._endpoints:
+            breaker = copy.copy(endpoint.breaker)
+            breaker.reset()
+            endpoints.append(Endpoint(endpoint.client.with_model(model, **overrides), endpoint.weight, breaker))
+        return RoutingFoundationModelClient(endpoints, self._strategy, self._max_failovers, self._alpha)
+
+    @property
+    def uses_iam_token(self) -> bool:
+        """Whether every endpoint has IAM token, so deferred completions may be routed anywhere"""
+        return all(endpoint.client.uses_iam_token for endpoint in self._endpoints)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Returns health statistics of every endpoint"""
+        with self._lock:
+            return [endpoint.stats() for endpoint in self._endpoints]
+
+    def instrument(self, operation: str) -> ContextManager[Any]:
+        return self._endpoints[0].client.instrument(operation)
+
+    def _select(self, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        """Picks endpoint for the next request and counts it as outstanding"""
+        with self._lock:
+            candidates = [
+                endpoint for endpoint in self._endpoints
+                if endpoint not in exclude and endpoint.breaker.available()
+            ]
+            if not candidates:
+                # Every endpoint is ejected, the one to be probed soonest is the best guess
+                ejected = [endpoint for endpoint in self._endpoints if endpoint not in exclude]
+                if not ejected:
+                    return None
+                endpoint = min(ejected, key=lambda endpoint: endpoint.breaker.retry_at)
+            elif self._strategy == WEIGHTED_ROUND_ROBIN:
+                endpoint = self._next_weighted(candidates)
+            else:
+                endpoint = min(
+                    candidates,
+                    key=lambda endpoint: (
+                        (endpoint.outstanding + 1) / endpoint.weight,
+                        endpoint.latency or 0.0
+                    )
+                )
+            endpoint.breaker.acquire()
+            endpoint.outstanding += 1
+            return endpoint
+
+    @staticmethod
+    def _next_weighted(candidates: list[Endpoint]) -> Endpoint:
+        """Smooth weighted round robin, spreads heavier endpoints evenly in the sequence"""
+        total = 0.0
+        for endpoint in candidates:
+            endpoint.current_weight += endpoint.weight
+            total += endpoint.weight
+        endpoint = max(candidates, key=lambda endpoint: endpoint.current_weight)
+        endpoint.current_weight -= total
+        return endpoint
+
+    def _finish(self, endpoint: Endpoint, started_at: float, error: Optional[BaseException] = None) -> None:
+        """Records outcome of request, only retryable errors count against endpoint health"""
+        latency = time.monotonic() - started_at
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            if isinstance(error, RetryableError):
+                endpoint.failures += 1
+                if isinstance(error, TooManyRequests):
+                    endpoint.throttled += 1
+                endpoint.breaker.record_failure()
+                return
+            endpoint.breaker.record_success()
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self._alpha * (latency - endpoint.latency)
+
+    def _abandon(self, endpoint: Endpoint) -> None:
+        """Releases endpoint of request cancelled or interrupted before its outcome was known"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.breaker.release()
+
+    def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        return self._route(method, (RetryableError,), args, kwargs)[1]
+
+    async def _acall(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        return (await self._aroute(method, (RetryableError,), args, kwargs))[1]
+
+    def _route(
+            self,
+            method: str,
+            failover_on: tuple[type[RetryableError], ...],
+            args: tuple[Any, ...],
+            kwargs: dict[str, Any]
+    ) -> tuple[Endpoint, Any]:
+        """Calls method on healthy endpoint, moves on to another one after failover_on errors"""
+        tried: list[Endpoint] = []
+        error: Optional[BaseException] = None
+        for _ in range(self._max_failovers + 1):
+            endpoint = self._select(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            started_at = time.monotonic()
+            try:
+                result = getattr(endpoint.client, method)(*args, **kwargs)
+            except Exception as e:
+                self._finish(endpoint, started_at, e)
+                if not isinstance(e, failover_on):
+                    raise
+                error = e
+                continue
+            except BaseException:
+                self._abandon(endpoint)
+                raise
+            self._finish(endpoint, started_at)
+            return endpoint, result
+        raise error
+
+    async def _aroute(
+            self,
+            method: str,
+            failover_on: tuple[type[RetryableError], ...],
+            args: tuple[Any, ...],
+            kwargs: dict[str, Any]
+    ) -> tuple[Endpoint, Any]:
+        """Calls method on healthy endpoint, moves on to another one after failover_on errors"""
+        tried: list[Endpoint] = []
+        error: Optional[BaseException] = None
+        for _ in range(self._max_failovers + 1):
+            endpoint = self._select(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            started_at = time.monotonic()
+            try:
+                result = await getattr(endpoint.client, method)(*args, **kwargs)
+            except Exception as e:
+                self._finish(endpoint, started_at, e)
+                if not isinstance(e, failover_on):
+                    raise
+                error = e
+                continue
+            except BaseException:
+                self._abandon(endpoint)
+                raise
+            self._finish(endpoint, started_at)
+            return endpoint, result
+        raise error
+
+    def completion(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        return self._call("completion", *args, **kwargs)
+
+    async def acompletion(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        return await self._acall("acompletion", *args, **kwargs)
+
+    def tokenize(self, text: str) -> dict[str, Any]:
+        return self._call("tokenize", text)
+
+    async def atokenize(self, text: str) -> dict[str, Any]:
+        return await self._acall("atokenize", text)
+
+    def completion_async(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        """Completes messages by deferred operation, sharing cache of the first endpoint.
+
+        Submit fails over to another endpoint only when it was rejected, so the paid
+        operation is never started twice. Accepted operation is polled on its endpoint.
+        """
+        client = self._endpoints[0].client
+        with self.instrument("completion_async") as timings:
+            payload = client._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+            key = client._get_cache_key(encode_payload(payload))
+            cached = client._get_cached(key)
+            if cached is not None:
+                return client._with_timings(cached, timings)
+            endpoint, operation_id = self._route(
+                "submit_completion_async",
+                REJECTED_ERRORS,
+                (messages, tools, stop, tool_choice, response_format),
+                {}
+            )
+            operation = endpoint.client.wait_operation(operation_id, polling_policy, cancel_event)
+            response = client._set_cached(key, get_operation_result(operation))
+            return client._with_timings(response, timings)
+
+    async def acompletion_async(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        """Completes messages by deferred operation, sharing cache of the first endpoint.
+
+        Submit fails over to another endpoint only when it was rejected, so the paid
+        operation is never started twice. Accepted operation is polled on its endpoint.
+        """
+        client = self._endpoints[0].client
+        with self.instrument("completion_async") as timings:
+            payload = client._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+            key = client._get_cache_key(encode_payload(payload))
+            cached = await client._aget_cached(key)
+            if cached is not None:
+                return client._with_timings(cached, timings)
+            endpoint, operation_id = await self._aroute(
+                "asubmit_completion_async",
+                REJECTED_ERRORS,
+                (messages, tools, stop, tool_choice, response_format),
+                {}
+            )
+            operation = await endpoint.client.await_operation(operation_id, polling_policy, cancel_event)
+            response = await client._aset_cached(key, get_operation_result(operation))
+            return client._with_timings(response, timings)
+
+    def stream_completion(self, *args: Any, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        """Streams completion, fails over to another endpoint only before the first chunk"""
+        tried: list[Endpoint] = []
+        error: Optional[BaseException] = None
+        for _ in range(self._max_failovers + 1):
+            endpoint = self._select(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            started_at = time.monotonic()
+            received = False
+            try:
+                for chunk in endpoint.client.stream_completion(*args, **kwargs):
+                    received = True
+                    yield chunk
+            except Exception as e:
+                self._finish(endpoint, started_at, e)
+                if received or not isinstance(e, RetryableError):
+                    raise
+                error = e
+                continue
+            except BaseException:
+                # Stream closed by consumer proves the endpoint healthy only when it has answered
+                if received:
+                    self._finish(endpoint, started_at)
+                else:
+                    self._abandon(endpoint)
+                raise
+            self._finish(endpoint, started_at)
+            return
+        raise error
+
+    async def astream_completion(self, *args: Any, **kwargs: Any) -> AsyncIterator[dict[str, Any]]:
+        """Streams completion, fails over to another endpoint only before the first chunk"""
+        tried: list[Endpoint] = []
+        error: Optional[BaseException] = None
+        for _ in range(self._max_failovers + 1):
+            endpoint = self._select(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            started_at = time.monotonic()
+            received = False
+            try:
+                async for chunk in endpoint.client.astream_completion(*args, **kwargs):
+                    received = True
+                    yield chunk
+            except Exception as e:
+                self._finish(endpoint, started_at, e)
+                if received or not isinstance(e, RetryableError):
+                    raise
+                error = e
+                continue
+            except BaseException:
+                # Stream closed by consumer proves the endpoint healthy only when it has answered
+                if received:
+                    self._finish(endpoint, started_at)
+                else:
+                    self._abandon(endpoint)
+                raise
+            self._finish(endpoint, started_at)
+            return
+        raise error
+
+    def _partition(self, payloads: Iterable[dict[str, Any]]) -> list[BatchPart]:
+        """Splits batch between healthy endpoints in proportion to their weights"""
+        with self._lock:
+            candidates = [endpoint for endpoint in self._endpoints if endpoint.breaker.available()]
+        candidates = candidates or list(self._endpoints)
+        total = sum(endpoint.weight for endpoint in candidates)
+        weights = [0.0] * len(candidates)
+        parts: list[BatchPart] = [(endpoint.client, [], []) for endpoint in candidates]
+        for index, payload in enumerate(payloads):
+            for position, endpoint in enumerate(candidates):
+                weights[position] += endpoint.weight
+            position = max(range(len(candidates)), key=weights.__getitem__)
+            weights[position] -= total
+            _, indexes, part = parts[position]
+            indexes.append(index)
+            part.append(payload)
+        return parts
+
+    def batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> list[BatchItem]:
+        """Runs deferred completions split between endpoints, returns outcomes in payloads order"""
+        items = self.iter_batch_completion_async(payloads, max_in_flight, polling_policy, cancel_event)
+        return sorted(items, key=lambda item: item.index)
+
+    def iter_batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[BatchItem]:
+        """Runs deferred completions split between endpoints, every endpoint keeps
+        at most max_in_flight operations pending, yields outcomes as they are known"""
+        parts = self._partition(payloads)
+        return iter_batch_parts(parts, max_in_flight, polling_policy, cancel_event)
+
+    async def abatch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> list[BatchItem]:
+        """Runs deferred completions split between endpoints, returns outcomes in payloads order"""
+        items = [
+            item async for item in self.aiter_batch_completion_async(
+                payloads, max_in_flight, polling_policy, cancel_event
+            )
+        ]
+        return sorted(items, key=lambda item: item.index)
+
+    def aiter_batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> AsyncIterator[BatchItem]:
+        """Runs deferred completions split between endpoints, every endpoint keeps
+        at most max_in_flight operations pending, yields outcomes as they are known"""
+        parts = self._partition(payloads)
+        return aiter_batch_parts(parts, max_in_flight, polling_policy, cancel_event)
+
+    def close(self) -> None:
+        for endpoint in self._endpoints:
+            endpoint.client.close()
+
+    async def aclose(self) -> None:
+        for endpoint in self._endpoints:
+            await endpoint.client.aclose()
+
+    def __enter__(self) -> "RoutingFoundationModelClient":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "RoutingFoundationModelClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
@@ -0,0 +1,313 @@
+from typing import Any, AsyncIterator, Iterator, Optional, Union
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+from .exceptions import DeadlineExceeded
+from .constants import (
+    Priority,
+    SCHEDULER_MAX_CONCURRENCY,
+    SCHEDULER_RESERVED_INTERACTIVE,
+    SCHEDULER_EWMA_ALPHA,
+    SCHEDULER_LATENCY_HALF_LIFE
+)
+
+WAITING, ADMITTED, DROPPED, CANCELLED, RELEASED = range(5)
+
+PRIORITY_RANK = {Priority.INTERACTIVE: 0, Priority.BATCH: 1}
+
+
+class ScheduledRequest:
+    """Request waiting for or holding a slot of the scheduler"""
+    __slots__ = ("priority", "tenant", "deadline", "start", "finish", "state", "waiter", "admitted_at")
+
+    def __init__(self, priority: Priority, tenant: str, deadline: Optional[float]) -> None:
+        self.priority = priority
+        self.tenant = tenant
+        self.deadline = deadline
+        self.start = 0.0
+        self.finish = 0.0
+        self.state = WAITING
+        self.waiter: Optional[Union[threading.Event, tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = None
+        self.admitted_at = 0.0
+
+
+class RequestScheduler:
+    """Admits requests in front of clients by priority class and tenant.
+
+    Interactive requests are always admitted before batch ones and some
+    concurrency is reserved for them, so batch work can't take all slots.
+    Within a class tenants share slots by weighted fair queuing on request cost.
+    Requests which waited in queue and can't meet their deadline, given the usual latency
+    of their class, are dropped with DeadlineExceeded before they are sent. The latency
+    estimate fades while no requests complete, and requests admitted without waiting
+    are dropped only when their deadline has passed, so one slow request can't make
+    the scheduler drop everything.
+
+        :param max_concurrency: Requests sent at once
+        :param reserved_interactive: Slots batch requests may not take
+        :param tenant_weights: Shares of tenants, 1 for tenants not listed
+        :param alpha: Smoothing factor of latency moving average
+        :param latency_half_life: Seconds after which latency estimate not renewed by completed requests halves
+    """
+    def __init__(
+            self,
+            max_concurrency: int = SCHEDULER_MAX_CONCURRENCY,
+            reserved_interactive: int = SCHEDULER_RESERVED_INTERACTIVE,
+            tenant_weights: Optional[dict[str, float]] = None,
+            alpha: float = SCHEDULER_EWMA_ALPHA,
+            latency_half_life: float = SCHEDULER_LATENCY_HALF_LIFE
+    ) -> None:
+        if not 0 <= reserved_interactive < max_concurrency:
+            raise ValueError("reserved_interactive must be less than max_concurrency")
+        self._max_concurrency = max_concurrency
+        self._reserved_interactive = reserved_interactive
+        self._tenant_weights = tenant_weights or {}
+        self._alpha = alpha
+        self._latency_half_life = latency_half_life
+        self._queue: list[tuple[int, float, int, ScheduledRequest]] = []
+        self._counter = itertools.count()
+        self._in_flight = {priority: 0 for priority in Priority}
+        self._queued = {priority: 0 for priority in Priority}
+        self._dropped = {priority: 0 for priority in Priority}
+        self._latency: dict[Priority, Optional[float]] = {priority: None for priority in Priority}
+        self._latency_updated_at = {priority: 0.0 for priority in Priority}
+        self._virtual_time = {priority: 0.0 for priority in Priority}
+        self._finish: dict[tuple[Priority, str], float] = {}
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                str(priority): {
+                    "in_flight": self._in_flight[priority],
+                    "queued": self._queued[priority],
+                    "dropped": self._dropped[priority],
+                    "latency": self._latency[priority]
+                }
+                for priority in Priority
+            }
+
+    def _enqueue(
+            self,
+            priority: Priority,
+            tenant: Optional[str],
+            deadline: Optional[float],
+            cost: float
+    ) -> ScheduledRequest:
+        """Queues request with its fair share finish tag and admits what fits, called under lock"""
+        request = ScheduledRequest(Priority(priority), tenant or "", deadline)
+        key = (request.priority, request.tenant)
+        request.start = max(self._virtual_time[request.priority], self._finish.get(key, 0.0))
+        request.finish = request.start + cost / self._tenant_weights.get(request.tenant, 1.0)
+        self._finish[key] = request.finish
+        heapq.heappush(self._queue, (PRIORITY_RANK[request.priority], request.finish, next(self._counter), request))
+        self._queued[request.priority] += 1
+        self._dispatch(request)
+        return request
+
+    def _has_capacity(self, priority: Priority) -> bool:
+        in_flight = sum(self._in_flight.values())
+        if in_flight >= self._max_concurrency:
+            return False
+        if priority == Priority.INTERACTIVE:
+            return True
+        return in_flight - self._in_flight[Priority.INTERACTIVE] < self._max_concurrency - self._reserved_interactive
+
+    def _estimate_latency(self, priority: Priority, now: float) -> float:
+        """Returns latency average of the class, halved for every half life without completed requests"""
+        latency = self._latency[priority]
+        if latency is None:
+            return 0.0
+        return latency * 0.5 ** ((now - self._latency_updated_at[priority]) / self._latency_half_life)
+
+    def _misses_deadline(self, request: ScheduledRequest, now: float, waited: bool) -> bool:
+        """Checks deadline of request, predicting latency only for request which waited for its slot"""
+        if request.deadline is None:
+            return False
+        if now >= request.deadline:
+            return True
+        return waited and now + self._estimate_latency(request.priority, now) > request.deadline
+
+    def _dispatch(self, arrived: Optional[ScheduledRequest] = None) -> None:
+        """Admits queued requests while there are slots for them, called under lock
+
+        :param arrived: Request being queued, which did not wait if admitted at once
+        """
+        now = time.monotonic()
+        while self._queue:
+            request = self._queue[0][3]
+            if request.state != WAITING:
+                heapq.heappop(self._queue)
+                continue
+            if not self._has_capacity(request.priority):
+                break
+            heapq.heappop(self._queue)
+            self._queued[request.priority] -= 1
+            if self._misses_deadline(request, now, request is not arrived):
+                request.state = DROPPED
+                self._dropped[request.priority] += 1
+            else:
+                request.state = ADMITTED
+                request.admitted_at = now
+                self._in_flight[request.priority] += 1
+                self._virtual_time[request.priority] = request.start
+            self._notify(request)
+        if not self._queue:
+            # Idle tenants start anew, which also forgets tenants gone for good
+            self._finish.clear()
+
+    def _notify(self, request: ScheduledRequest) -> None:
+        waiter = request.waiter
+        if waiter is None:
+            return
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(self._wake, request, future)
+
+    def _wake(self, request: ScheduledRequest, future: asyncio.Future) -> None:
+        if future.cancelled():
+            if request.state == ADMITTED:
+                self.release(request)
+        elif request.state == DROPPED:
+            future.set_exception(self._deadline_error(request))
+        else:
+            future.set_result(None)
+
+    def _cancel(self, request: ScheduledRequest) -> bool:
+        """Withdraws waiting request, returns False when it was admitted or dropped meanwhile"""
+        with self._lock:
+            if request.state != WAITING:
+                return False
+            request.state = CANCELLED
+            self._queued[request.priority] -= 1
+            self._dispatch()
+            return True
+
+    @staticmethod
+    def _deadline_error(request: ScheduledRequest) -> DeadlineExceeded:
+        return DeadlineExceeded(f"{request.priority} request can't be completed before its deadline")
+
+    @staticmethod
+    def _remaining(request: ScheduledRequest) -> Optional[float]:
+        if request.deadline is None:
+            return None
+        return max(0.0, request.deadline - time.monotonic())
+
+    def acquire(
+            self,
+            priority: Priority = Priority.INTERACTIVE,
+            tenant: Optional[str] = None,
+            deadline: Optional[float] = None,
+            cost: float = 1.0
+    ) -> ScheduledRequest:
+        """Waits for slot of the request
+
+        :param priority: Priority class
+        :param tenant: Tenant sharing slots of the class fairly with others
+        :param deadline: Monotonic time request must complete by, None for no deadline
+        :param cost: Share of slot time the request is expected to take, e.g. its tokens
+        :return: Admitted request to release
+        :raises DeadlineExceeded: When request can't meet its deadline
+        """
+        with self._lock:
+            request = self._enqueue(priority, tenant, deadline, cost)
+            if request.state == WAITING:
+                request.waiter = threading.Event()
+        if request.waiter is not None:
+            request.waiter.wait(self._remaining(request))
+            if self._cancel(request):
+                raise self._deadline_error(request)
+        if request.state == DROPPED:
+            raise self._deadline_error(request)
+        return request
+
+    async def aacquire(
+            self,
+            priority: Priority = Priority.INTERACTIVE,
+            tenant: Optional[str] = None,
+            deadline: Optional[float] = None,
+            cost: float = 1.0
+    ) -> ScheduledRequest:
+        """Waits for slot of the request
+
+        :param priority: Priority class
+        :param tenant: Tenant sharing slots of the class fairly with others
+        :param deadline: Monotonic time request must complete by, None for no deadline
+        :param cost: Share of slot time the request is expected to take, e.g. its tokens
+        :return: Admitted request to release
+        :raises DeadlineExceeded: When request can't meet its deadline
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            request = self._enqueue(priority, tenant, deadline, cost)
+            if request.state == WAITING:
+                future = loop.create_future()
+                request.waiter = (loop, future)
+        if request.state == DROPPED:
+            raise self._deadline_error(request)
+        if request.waiter is None:
+            return request
+        try:
+            await asyncio.wait_for(future, self._remaining(request))
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if self._cancel(request):
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._deadline_error(request) from None
+                raise
+            # Slot was handed over, a cancelled future is released by _wake
+            if not future.cancelled() and request.state == ADMITTED:
+                self.release(request)
+            raise
+        return request
+
+    def release(self, request: ScheduledRequest) -> None:
+        """Frees slot of admitted request, accounting its latency"""
+        with self._lock:
+            if request.state != ADMITTED:
+                return
+            request.state = RELEASED
+            self._in_flight[request.priority] -= 1
+            now = time.monotonic()
+            latency = now - request.admitted_at
+            if self._latency[request.priority] is None:
+                self._latency[request.priority] = latency
+            else:
+                average = self._estimate_latency(request.priority, now)
+                self._latency[request.priority] = average + self._alpha * (latency - average)
+            self._latency_updated_at[request.priority] = now
+            self._dispatch()
+
+    @contextmanager
+    def slot(
+            self,
+            priority: Priority = Priority.INTERACTIVE,
+            tenant: Optional[str] = None,
+            deadline: Optional[float] = None,
+            cost: float = 1.0
+    ) -> Iterator[None]:
+        request = self.acquire(priority, tenant, deadline, cost)
+        try:
+            yield
+        finally:
+            self.release(request)
+
+    @asynccontextmanager
+    async def aslot(
+            self,
+            priority: Priority = Priority.INTERACTIVE,
+            tenant: Optional[str] = None,
+            deadline: Optional[float] = None,
+            cost: float = 1.0
+    ) -> AsyncIterator[None]:
+        request = await self.aacquire(priority, tenant, deadline, cost)
+        try:
+            yield
+        finally:
+            self.release(request)
@@ -1,88 +1,514 @@
-from typing import Any, Optional, TYPE_CHECKING
+from typing import Any, Callable, Iterable, Iterator, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
+    import requests
     from .async_client import AsyncFoundationModelClient
 
 import time
-
-import requests
+import threading
+from collections import deque
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 from .base_client import BaseFoundationModelClient
-from .exceptions import CompletionError, BadRequest
-from .constants import (
-    OPERATIONS_ENDPOINT,
-    ASYNC_TIMEOUT,
-    STATUS_200_OK,
-    STATUS_400_BAD_REQUEST,
-    STATUS_500_INTERNAL_SERVER_ERROR
+from .batch import BatchItem, create_batch_item
+from .cache import create_cache_key
+from .codec import decode_completion, decode_operation, loads
+from .encoding import encode_payload
+from .exceptions import (
+    ClientError,
+    CompletionError,
+    ConnectionFailed,
+    RequestTimeout,
+    RetryableError,
+    OperationCancelled,
+    OperationTimeout
 )
+from .polling import PollingPolicy, PollingSchedule, get_operation_result
+from .retry import REJECTED_ERRORS, call_with_retry
+from .constants import EmbeddingModel, STATUS_200_OK, BATCH_MAX_IN_FLIGHT, BATCH_WORKERS
+
+
+def _convert_request_error(error: "requests.RequestException") -> ClientError:
+    import requests
+
+    if isinstance(error, requests.ConnectionError):
+        return ConnectionFailed(f"Connection failed: {error}")
+    elif isinstance(error, requests.Timeout):
+        return RequestTimeout(f"Request timed out: {error}")
+    return CompletionError(f"Request failed: {error}")
 
 
 class SyncFoundationModelClient(BaseFoundationModelClient):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._session: Optional["requests.Session"] = None
+        self._session_lock = threading.Lock()
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+
+    def _reset_state(self) -> None:
+        super()._reset_state()
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._hedge_executor = None
+
+    def _get_session(self) -> "requests.Session":
+        """Returns keep-alive session shared by all calls of the client"""
+        session = self._session
+        if session is not None:
+            return session
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_maxsize=self._pool_limit_per_host or self._pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def close(self) -> None:
+        """Close pooled connections of the client"""
+        with self._session_lock:
+            session, self._session = self._session, None
+            executor, self._hedge_executor = self._hedge_executor, None
+        if session is not None:
+            session.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def __enter__(self) -> "SyncFoundationModelClient":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
     def completion(
             self,
             messages: list[dict[str, str]],
             tools: Optional[list[dict[str, Any]]] = None,
-            stop: Optional[list[str]] = None
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        with self.instrument("completion") as timings:
+            return self._with_timings(self._completion(messages, tools, stop, tool_choice, response_format), timings)
+
+    def _completion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
     ) -> dict[str, Any]:
         url = f"{self._base_url}/completion"
+        payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+        body = encode_payload(payload)
+        key = self._get_cache_key(body)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+        if self._single_flight is None:
+            return self._set_cached(key, self._post(url, payload, body, hedge=True))
+        response, shared = self._single_flight.do(
+            key or create_cache_key(body),
+            lambda: self._set_cached(key, self._post(url, payload, body, hedge=True))
+        )
+        return self._with_coalesced_info(response, shared)
+
+    def stream_completion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> Iterator[dict[str, Any]]:
+        """Streams completion, yields response chunks as soon as they are received"""
+        import requests
+
+        url = f"{self._base_url}/completion"
+        payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=True)
+        timings = self._start_timings("stream_completion")
+        error: Optional[BaseException] = None
         try:
-            with requests.Session() as session:
-                response = session.post(
+            with self._rate_limit(payload, timings):
+                started_at = time.perf_counter()
+                with self._get_session().post(
                     url=url,
-                    headers=self._headers,
-                    json=self._build_payload(messages, tools, stop),
-                    timeout=self._timeout
-                )
-            status_code = response.status_code
-            if status_code == STATUS_200_OK:
-                return response.json()
-            elif STATUS_400_BAD_REQUEST <= status_code < STATUS_500_INTERNAL_SERVER_ERROR:
-                raise BadRequest(
-                    f"Bad request (status {status_code}):"
-                    f"{response.text}"
-                )
-            else:
-                raise CompletionError(
-                    f"Server error (status {status_code}):"
-                    f"{response.text}"
-                )
+                    headers=self._get_headers(),
+                    data=encode_payload(payload),
+                    timeout=self._timeout,
+                    stream=True
+                ) as response:
+                    if timings is not None:
+                        timings.add("ttfb", started_at)
+                    if response.status_code != STATUS_200_OK:
+                        self._raise_for_status(response.status_code, response.text, response.headers)
+                    for line in response.iter_lines():
+                        if line:
+                            yield self._with_chunk_timings(decode_completion(line), timings)
         except requests.RequestException as e:
-            raise CompletionError(f"Request failed: {e}") from e
+            error = _convert_request_error(e)
+            raise error from e
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish_timings(timings, error)
+
+    def tokenize(self, text: str) -> dict[str, Any]:
+        """Splits text into tokens of the model, returns response with ``tokens`` list"""
+        with self.instrument("tokenize"):
+            url = f"{self._base_url}/tokenize"
+            return self._post(url, {"modelUri": self._model_uri, "text": text}, decode=loads)
+
+    def text_embedding(self, text: str, model: EmbeddingModel = EmbeddingModel.TEXT_SEARCH_DOC) -> dict[str, Any]:
+        """Returns response with ``embedding`` vector of the text"""
+        with self.instrument("text_embedding"):
+            url = f"{self._base_url}/textEmbedding"
+            payload = {"modelUri": self._get_embedding_model_uri(model), "text": text}
+            return self._post(url, payload, decode=loads)
 
     def completion_async(
             self,
             messages: list[dict[str, str]],
             tools: Optional[list[dict[str, Any]]] = None,
             stop: Optional[list[str]] = None,
-            async_timeout: float = ASYNC_TIMEOUT
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
     ) -> dict[str, Any]:
-        if not self._iam_token:
-            raise ValueError("IAM-TOKEN required for this method")
+        """Completes messages by deferred operation, sharing cache with completion.
+
+        Identical calls waiting at once are coalesced into one operation,
+        so they share polling policy and cancel event of the first caller.
+        """
+        with self.instrument("completion_async") as timings:
+            payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+            body = encode_payload(payload)
+            key = self._get_cache_key(body)
+            cached = self._get_cached(key)
+            if cached is not None:
+                return self._with_timings(cached, timings)
+
+            def call() -> dict[str, Any]:
+                operation_id = self.submit_completion_async(messages, tools, stop, tool_choice, response_format)
+                operation = self.wait_operation(operation_id, polling_policy, cancel_event)
+                return self._set_cached(key, get_operation_result(operation))
+
+            if self._single_flight is None:
+                return self._with_timings(call(), timings)
+            response, shared = self._single_flight.do(f"completionAsync:{key or create_cache_key(body)}", call)
+            return self._with_timings(self._with_coalesced_info(response, shared), timings)
+
+    def submit_completion_async(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> str:
+        """Submits deferred completion, returns operation identifier"""
+        self._check_iam()
         url = f"{self._base_url}/completionAsync"
+        payload = self._build_payload(messages, tools, stop, tool_choice, response_format, stream=False)
+        body = encode_payload(payload)
+        key, operation_id = self._find_journaled(body)
+        if operation_id is not None:
+            return operation_id
+
+        def submit() -> str:
+            # Operation may have been journaled by identical submit finished meanwhile
+            operation_id = self._journal.find(key) if key is not None else None
+            if operation_id is not None:
+                return operation_id
+            data = self._post(url, payload, body, decode=decode_operation, idempotent=False)
+            return self._journal_submitted(key, data["id"])
+
+        if key is None:
+            return submit()
+        return self._submit_flight.do(key, submit)[0]
+
+    def wait_operation(
+            self,
+            operation_id: str,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> dict[str, Any]:
+        """Waits until deferred operation is done, returns the operation"""
+        for operation in self.wait_operations([operation_id], polling_policy, cancel_event):
+            return operation
+
+    def wait_operations(
+            self,
+            operation_ids: Iterable[str],
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[dict[str, Any]]:
+        """Polls many deferred operations in one loop over the pooled session,
+        yields every operation as soon as it is done.
+
+        Operations journaled as done, maybe by another process, are yielded without polling.
+
+        :param operation_ids: Identifiers of operations to wait for
+        :param polling_policy: Overrides polling schedule of the client
+        :param cancel_event: Event that stops waiting when set
+        :return: Iterator over done operations in completion order
+        """
+        pending = []
+        for operation_id in dict.fromkeys(operation_ids):
+            operation = self._get_journaled(operation_id)
+            if operation is None:
+                pending.append(operation_id)
+            else:
+                yield operation
+        clock = (polling_policy or self._polling_policy).start()
+        session = self._get_session()
+        timings = self._get_timings()
+        started_at = time.perf_counter()
+        while pending:
+            delay = clock.next_delay(pending)
+            if cancel_event is None:
+                time.sleep(delay)
+            elif cancel_event.wait(delay):
+                raise OperationCancelled(f"Waiting for operations cancelled: {pending}")
+            still_pending = []
+            for operation_id in pending:
+                operation = self._get_status_operation(session, operation_id)
+                if timings is not None:
+                    timings.polls += 1
+                if operation.get("done"):
+                    if timings is not None:
+                        timings.add("polling_wait", started_at)
+                    yield operation
+                else:
+                    still_pending.append(operation_id)
+            pending = still_pending
+
+    def resume_operations(
+            self,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[dict[str, Any]]:
+        """Resumes polling of journaled operations not done yet, e.g. submitted before restart,
+        yields every operation as soon as it is done"""
+        return self.wait_operations(self._check_journal().pending(), polling_policy, cancel_event)
+
+    def batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> list[BatchItem]:
+        """Runs deferred completions of many payloads, returns outcomes in payloads order"""
+        items = self.iter_batch_completion_async(payloads, max_in_flight, polling_policy, cancel_event)
+        return sorted(items, key=lambda item: item.index)
+
+    def iter_batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[BatchItem]:
+        """Submits deferred completions keeping at most max_in_flight operations pending,
+        polls pending operations in one loop, each on its own schedule and deadline,
+        and yields outcomes as they are known.
+
+        Errors of single payloads are captured in their items instead of failing the batch.
+
+        :param payloads: Keyword arguments of completion_async for every request
+        :param max_in_flight: Maximum number of submitted and not yet done operations
+        :param polling_policy: Overrides polling schedule of the client
+        :param cancel_event: Event that stops waiting when set
+        :return: Iterator over batch items in completion order
+        """
+        queue = deque(enumerate(payloads))
+        # Indexes of payloads by operation, identical payloads share one journaled operation
+        pending: dict[str, list[int]] = {}
+        schedule = PollingSchedule(polling_policy or self._polling_policy)
+        session = self._get_session()
+
+        def get_status(operation_id: str) -> Any:
+            try:
+                return self._get_status_operation(session, operation_id)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, BATCH_WORKERS))) as executor:
+            while queue or pending:
+                submitting = [
+                    queue.popleft() for _ in range(min(len(queue), max_in_flight - len(pending)))
+                ]
+                futures = [
+                    (index, executor.submit(self.submit_completion_async, **payload))
+                    for index, payload in submitting
+                ]
+                for index, future in futures:
+                    if future.exception() is not None:
+                        yield BatchItem(index, error=future.exception())
+                        continue
+                    operation_id = future.result()
+                    operation = self._get_journaled(operation_id)
+                    if operation is not None:
+                        yield create_batch_item(index, operation_id, operation)
+                    elif operation_id in pending:
+                        pending[operation_id].append(index)
+                    else:
+                        pending[operation_id] = [index]
+                        schedule.add(operation_id)
+                if not pending:
+                    continue
+                delay = schedule.next_delay()
+                if cancel_event is None:
+                    time.sleep(delay)
+                elif cancel_event.wait(delay):
+                    raise OperationCancelled(f"Batch cancelled: {list(pending)}")
+                operation_ids = schedule.due()
+                for operation_id, operation in zip(operation_ids, executor.map(get_status, operation_ids)):
+                    if isinstance(operation, Exception):
+                        schedule.remove(operation_id)
+                        for index in pending.pop(operation_id):
+                            yield BatchItem(index, operation_id, error=operation)
+                    elif operation.get("done"):
+                        schedule.remove(operation_id)
+                        for index in pending.pop(operation_id):
+                            yield create_batch_item(index, operation_id, operation)
+                    elif not schedule.reschedule(operation_id):
+                        error = OperationTimeout(f"Operation is not done before deadline: {operation_id}")
+                        for index in pending.pop(operation_id):
+                            yield BatchItem(index, operation_id, error=error)
+
+    def _post(
+            self,
+            url: str,
+            payload: dict[str, Any],
+            body: Optional[bytes] = None,
+            decode: Callable[[bytes], dict[str, Any]] = decode_completion,
+            hedge: bool = False,
+            idempotent: bool = True
+    ) -> dict[str, Any]:
+        """Sends payload with retries and hedging, returns response JSON
+
+        :param hedge: Whether slow request is duplicated, its latencies make the hedging delay
+        :param idempotent: Whether the request may be repeated after timeouts and server errors,
+            otherwise it is repeated only when rejected by the server and never hedged
+        """
+        if body is None:
+            body = encode_payload(payload)
+        stats = {"retries": 0, "hedges": 0}
+        if hedge and idempotent:
+            call = lambda: self._send_hedged(url, payload, body, stats, decode)
+        else:
+            call = lambda: self._send(url, payload, body, decode)
+        response = call_with_retry(
+            self._retry_policy,
+            call,
+            stats,
+            retry_on=(RetryableError,) if idempotent else REJECTED_ERRORS
+        )
+        return self._with_client_info(response, stats)
+
+    def _send_hedged(
+            self,
+            url: str,
+            payload: dict[str, Any],
+            body: bytes,
+            stats: dict[str, int],
+            decode: Callable[[bytes], dict[str, Any]] = decode_completion
+    ) -> dict[str, Any]:
+        """Sends payload, duplicates it when no response arrived within hedging delay"""
+        delay = self._hedge_policy.delay() if self._hedge_policy is not None else None
+        if delay is None:
+            return self._send(url, payload, body, decode, hedge=True)
+        executor = self._get_hedge_executor()
+        futures = {executor.submit(copy_context().run, self._send, url, payload, body, decode, True)}
+        sent = 1
+        error: Optional[BaseException] = None
+        while futures:
+            timeout = delay if sent <= self._hedge_policy.max_hedges else None
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not done:
+                futures.add(executor.submit(copy_context().run, self._send, url, payload, body, decode, True))
+                sent += 1
+                stats["hedges"] += 1
+        raise error
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        with self._session_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    thread_name_prefix="foundation-model-hedge"
+                )
+            return self._hedge_executor
+
+    def _send(
+            self,
+            url: str,
+            payload: dict[str, Any],
+            body: bytes,
+            decode: Callable[[bytes], dict[str, Any]] = decode_completion,
+            hedge: bool = False
+    ) -> dict[str, Any]:
+        """Sends payload within rate limits, returns response JSON, records latency of hedged requests"""
+        import requests
+
+        timings = self._get_timings()
         try:
-            with requests.Session() as session:
-                response = session.post(
+            with self._rate_limit(payload, timings):
+                started_at = time.perf_counter()
+                response = self._get_session().post(
                     url=url,
-                    headers=self._headers,
-                    json=self._build_payload(messages, tools, stop)
-                    )
-                data = response.json()
-                operation_id = data["id"]
-                while True:
-                    status_operation = self._get_status_operation(session, operation_id)
-                    time.sleep(async_timeout)
-                    done = status_operation["done"]
-                    if done:
-                        return status_operation
+                    headers=self._get_headers(),
+                    data=body,
+                    timeout=self._timeout,
+                    stream=True
+                )
+                if timings is not None:
+                    timings.add("ttfb", started_at)
+                if response.status_code != STATUS_200_OK:
+                    self._raise_for_status(response.status_code, response.text, response.headers)
+                read_at = time.perf_counter()
+                content = response.content
         except requests.RequestException as e:
-            raise CompletionError(f"Request failed: {e}") from e
+            raise _convert_request_error(e) from e
+        decoded_at = time.perf_counter()
+        if hedge and self._hedge_policy is not None:
+            self._hedge_policy.record(decoded_at - started_at)
+        data = decode(content)
+        if timings is not None:
+            timings.add("body_read", read_at, decoded_at - read_at)
+            timings.add("decode", decoded_at)
+        return data
 
-    def _get_status_operation(self, session: requests.Session, id: str) -> dict[str, Any]:
-        url = f"{OPERATIONS_ENDPOINT}/{id}"
-        headers = {"Authorization": f"Bearer {self._iam_token}"}
-        response = session.get(url=url, headers=headers)
-        return response.json()
+    def _get_status_operation(self, session: "requests.Session", id: str) -> dict[str, Any]:
+        operation = call_with_retry(self._retry_policy, lambda: self._send_status_operation(session, id))
+        return self._journal_done(id, operation)
+
+    def _send_status_operation(self, session: "requests.Session", id: str) -> dict[str, Any]:
+        import requests
+
+        url = f"{self._operations_url}/{id}"
+        try:
+            response = session.get(url=url, headers=self._get_operation_headers(), timeout=self._timeout)
+            if response.status_code != STATUS_200_OK:
+                self._raise_for_status(response.status_code, response.text, response.headers)
+            return decode_operation(response.content)
+        except requests.RequestException as e:
+            raise _convert_request_error(e) from e
 
     def as_async(self) -> "AsyncFoundationModelClient":
         from .async_client import AsyncFoundationModelClient
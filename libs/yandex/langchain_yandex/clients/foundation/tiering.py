@@ -0,0 +1,601 @@
+from typing import Any, AsyncIterator, Callable, ContextManager, Iterable, Iterator, Optional, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .client import FoundationModelClient
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import copy_context
+
+from .batch import BatchItem, BatchPart, iter_batch_parts, aiter_batch_parts
+from .exceptions import RetryableError, RequestTimeout
+from .polling import PollingPolicy
+from .rate_limit import estimate_tokens
+from .routing import RoutingFoundationModelClient
+from .constants import (
+    FoundationModel,
+    BATCH_MAX_IN_FLIGHT,
+    BATCH_WORKERS,
+    ROUTING_EWMA_ALPHA,
+    PARTIAL_ALTERNATIVE_STATUS,
+    CLIENT_INFO_KEY
+)
+
+Client = Union["FoundationModelClient", RoutingFoundationModelClient]
+
+PROMPT_TOKENS_REASON = "prompt_tokens"
+TOOLS_REASON = "tools"
+VALIDATOR_REASON = "validator"
+
+OK_OUTCOME = "ok"
+TIMEOUT_OUTCOME = "timeout"
+OVERLOADED_OUTCOME = "overloaded"
+DEADLINE_OUTCOME = "deadline"
+ERROR_OUTCOME = "error"
+
+
+class TieringPolicy:
+    """Policy of sending requests to the cheap model and escalating them to the strong one.
+
+    Request is escalated when any predicate holds, or when the output of the cheap
+    model is rejected by validator. Escalated request falls back to the cheap model
+    when the strong one is overloaded or slower than fallback_latency.
+
+    Sync calls can't be interrupted: a call given up after fallback_latency or deadline
+    keeps running in background and is billed, so a fallback pays for both models.
+    Async calls are cancelled, which closes the connection, though the server may
+    still bill tokens generated before that. Prefer async methods with fallback_latency.
+
+        :param escalate_prompt_tokens: Estimated prompt tokens escalating request
+        :param escalate_tools: Number of tools escalating request
+        :param validator: Function accepting completion response of the cheap model
+        :param fallback_latency: Seconds to wait for the strong model before falling back
+        :param deadline: Seconds the whole request including escalation and fallback may take
+        :param on_decision: Function called with decision of every routed request
+    """
+    def __init__(
+            self,
+            escalate_prompt_tokens: Optional[int] = None,
+            escalate_tools: Optional[int] = None,
+            validator: Optional[Callable[[dict[str, Any]], bool]] = None,
+            fallback_latency: Optional[float] = None,
+            deadline: Optional[float] = None,
+            on_decision: Optional[Callable[["RoutingDecision"], None]] = None
+    ) -> None:
+        self.escalate_prompt_tokens = escalate_prompt_tokens
+        self.escalate_tools = escalate_tools
+        self.validator = validator
+        self.fallback_latency = fallback_latency
+        self.deadline = deadline
+        self.on_decision = on_decision
+
+    def escalation_reason(
+            self,
+            messages: list[dict[str, Any]],
+            tools: Optional[list[dict[str, Any]]] = None
+    ) -> Optional[str]:
+        """Returns reason to send request to the strong model right away, None to try the cheap one"""
+        if self.escalate_tools is not None and len(tools or ()) >= self.escalate_tools:
+            return TOOLS_REASON
+        if (
+                self.escalate_prompt_tokens is not None
+                and estimate_tokens({"messages": messages}) >= self.escalate_prompt_tokens
+        ):
+            return PROMPT_TOKENS_REASON
+        return None
+
+    def is_valid(self, response: dict[str, Any]) -> bool:
+        return self.validator is None or self.validator(response)
+
+    def identifying_params(self) -> dict[str, Any]:
+        """Returns thresholds and validator deciding which model answers, e.g. to key response caches"""
+        validator = None
+        if self.validator is not None:
+            validator = (
+                f"{getattr(self.validator, '__module__', None)}."
+                f"{getattr(self.validator, '__qualname__', type(self.validator).__qualname__)}"
+            )
+        return {
+            "escalate_prompt_tokens": self.escalate_prompt_tokens,
+            "escalate_tools": self.escalate_tools,
+            "validator": validator,
+            "fallback_latency": self.fallback_latency,
+            "deadline": self.deadline
+        }
+
+
+class RoutingDecision:
+    """How one request was routed between models
+
+        :param model: Model which response was returned
+        :param reason: Why request was escalated, None when it was not
+        :param fallback: Outcome of the strong model that made request fall back
+        :param attempts: Model, outcome and seconds of every attempt
+    """
+    __slots__ = ("model", "reason", "fallback", "attempts")
+
+    def __init__(self) -> None:
+        self.model: Optional[str] = None
+        self.reason: Optional[str] = None
+        self.fallback: Optional[str] = None
+        self.attempts: list[tuple[str, str, float]] = []
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "reason": self.reason,
+            "fallback": self.fallback,
+            "attempts": [
+                {"model": model, "outcome": outcome, "latency": round(latency, 6)}
+                for model, outcome, latency in self.attempts
+            ]
+        }
+
+
+class ModelStats:
+    """Requests, latency and tokens of one model"""
+    __slots__ = ("requests", "failures", "escalations", "fallbacks", "latency", "input_tokens", "output_tokens")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.failures = 0
+        self.escalations = 0
+        self.fallbacks = 0
+        self.latency: Optional[float] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TieredFoundationModelClient:
+    """Client sending requests to the cheap model and escalating them to the strong one.
+
+    Presents the interface of FoundationModelClient. Responses carry the model used
+    and the routing decision in client info, models statistics are kept by the client.
+
+        :param client: Client of the cheap model, YandexGPT Lite usually
+        :param escalation_client: Client of the strong model, copy of client with YandexGPT Pro by default
+        :param policy: When to escalate and fall back
+        :param alpha: Weight of the latest request in latency average
+    """
+    def __init__(
+            self,
+            client: Client,
+            escalation_client: Optional[Client] = None,
+            policy: Optional[TieringPolicy] = None,
+            alpha: float = ROUTING_EWMA_ALPHA
+    ) -> None:
+        self._client = client
+        self._escalation_client = escalation_client or client.with_model(FoundationModel.YANDEXGPT_PRO)
+        self._policy = policy or TieringPolicy()
+        self._alpha = alpha
+        self._stats = {
+            str(self._client._model): ModelStats(),
+            str(self._escalation_client._model): ModelStats()
+        }
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def client(self) -> Client:
+        return self._client
+
+    @property
+    def escalation_client(self) -> Client:
+        return self._escalation_client
+
+    @property
+    def _model(self) -> str:
+        return self._client._model
+
+    @property
+    def _model_uri(self) -> str:
+        return self._client._model_uri
+
+    @property
+    def uses_iam_token(self) -> bool:
+        return self._client.uses_iam_token and self._escalation_client.uses_iam_token
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Returns requests, latency and tokens of both models"""
+        with self._lock:
+            return {model: stats.as_dict() for model, stats in self._stats.items()}
+
+    def instrument(self, operation: str) -> ContextManager[Any]:
+        return self._client.instrument(operation)
+
+    def _remaining(self, started_at: float) -> Optional[float]:
+        if self._policy.deadline is None:
+            return None
+        return self._policy.deadline - (time.monotonic() - started_at)
+
+    def _escalation_timeout(self, started_at: float) -> Optional[float]:
+        remaining = self._remaining(started_at)
+        if self._policy.fallback_latency is None:
+            return remaining
+        if remaining is None:
+            return self._policy.fallback_latency
+        return min(self._policy.fallback_latency, remaining)
+
+    def _record(
+            self,
+            decision: RoutingDecision,
+            model: str,
+            outcome: str,
+            latency: float,
+            response: Optional[dict[str, Any]] = None
+    ) -> None:
+        decision.attempts.append((model, outcome, latency))
+        with self._lock:
+            stats = self._stats.setdefault(model, ModelStats())
+            stats.requests += 1
+            if outcome != OK_OUTCOME:
+                stats.failures += 1
+                return
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += self._alpha * (latency - stats.latency)
+            usage = response.get("result", {}).get("usage") or {}
+            stats.input_tokens += int(usage.get("inputTextTokens", 0))
+            stats.output_tokens += int(usage.get("completionTokens", 0))
+
+    @staticmethod
+    def _outcome(error: BaseException) -> str:
+        if isinstance(error, RequestTimeout):
+            return TIMEOUT_OUTCOME
+        if isinstance(error, RetryableError):
+            return OVERLOADED_OUTCOME
+        return ERROR_OUTCOME
+
+    def _finish(self, response: dict[str, Any], decision: RoutingDecision, model: str) -> dict[str, Any]:
+        """Returns response with model and routing decision in client info"""
+        decision.model = model
+        with self._lock:
+            if decision.reason is not None:
+                self._stats[str(self._escalation_client._model)].escalations += 1
+            if decision.fallback is not None:
+                self._stats[str(self._client._model)].fallbacks += 1
+        if self._policy.on_decision is not None:
+            self._policy.on_decision(decision)
+        return {
+            **response,
+            CLIENT_INFO_KEY: {
+                **response.get(CLIENT_INFO_KEY, {}),
+                "model_name": model,
+                "routing": decision.as_dict()
+            }
+        }
+
+    def _finish_chunk(self, chunk: dict[str, Any], decision: RoutingDecision, model: str) -> dict[str, Any]:
+        """Adds model and routing decision to the last chunk of stream"""
+        alternatives = chunk.get("result", {}).get("alternatives") or [{}]
+        if alternatives[0].get("status") == PARTIAL_ALTERNATIVE_STATUS:
+            return chunk
+        return self._finish(chunk, decision, model)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=BATCH_WORKERS,
+                    thread_name_prefix="foundation-model-tiering"
+                )
+            return self._executor
+
+    def _attempt(
+            self,
+            client: Client,
+            method: str,
+            args: tuple[Any, ...],
+            timeout: Optional[float],
+            decision: RoutingDecision
+    ) -> dict[str, Any]:
+        """Calls client, giving up after timeout, the abandoned call finishes in background and is billed"""
+        model = str(client._model)
+        if timeout is not None and timeout <= 0:
+            decision.attempts.append((model, DEADLINE_OUTCOME, 0.0))
+            raise RequestTimeout("Deadline of the request exceeded")
+        started_at = time.monotonic()
+        try:
+            if timeout is None:
+                response = getattr(client, method)(*args)
+            else:
+                future = self._get_executor().submit(copy_context().run, getattr(client, method), *args)
+                try:
+                    response = future.result(timeout)
+                except FutureTimeoutError:
+                    future.cancel()
+                    raise RequestTimeout(f"Model {model} did not respond in {timeout:.3f} seconds") from None
+        except Exception as e:
+            self._record(decision, model, self._outcome(e), time.monotonic() - started_at)
+            raise
+        self._record(decision, model, OK_OUTCOME, time.monotonic() - started_at, response)
+        return response
+
+    async def _aattempt(
+            self,
+            client: Client,
+            method: str,
+            args: tuple[Any, ...],
+            timeout: Optional[float],
+            decision: RoutingDecision
+    ) -> dict[str, Any]:
+        """Calls client, cancelling the call after timeout"""
+        model = str(client._model)
+        if timeout is not None and timeout <= 0:
+            decision.attempts.append((model, DEADLINE_OUTCOME, 0.0))
+            raise RequestTimeout("Deadline of the request exceeded")
+        started_at = time.monotonic()
+        try:
+            try:
+                response = await asyncio.wait_for(getattr(client, method)(*args), timeout)
+            except asyncio.TimeoutError:
+                raise RequestTimeout(f"Model {model} did not respond in {timeout:.3f} seconds") from None
+        except Exception as e:
+            self._record(decision, model, self._outcome(e), time.monotonic() - started_at)
+            raise
+        self._record(decision, model, OK_OUTCOME, time.monotonic() - started_at, response)
+        return response
+
+    def _route(self, method: str, args: tuple[Any, ...]) -> dict[str, Any]:
+        started_at = time.monotonic()
+        decision = RoutingDecision()
+        decision.reason = self._policy.escalation_reason(*args[:2])
+        response: Optional[dict[str, Any]] = None
+        if decision.reason is None:
+            response = self._attempt(self._client, method, args, self._remaining(started_at), decision)
+            if self._policy.is_valid(response):
+                return self._finish(response, decision, str(self._client._model))
+            decision.reason = VALIDATOR_REASON
+        try:
+            escalated = self._attempt(
+                self._escalation_client, method, args, self._escalation_timeout(started_at), decision
+            )
+        except RetryableError as e:
+            decision.fallback = self._outcome(e)
+            if response is None:
+                response = self._attempt(self._client, method, args, self._remaining(started_at), decision)
+            return self._finish(response, decision, str(self._client._model))
+        return self._finish(escalated, decision, str(self._escalation_client._model))
+
+    async def _aroute(self, method: str, args: tuple[Any, ...]) -> dict[str, Any]:
+        started_at = time.monotonic()
+        decision = RoutingDecision()
+        decision.reason = self._policy.escalation_reason(*args[:2])
+        response: Optional[dict[str, Any]] = None
+        if decision.reason is None:
+            response = await self._aattempt(self._client, method, args, self._remaining(started_at), decision)
+            if self._policy.is_valid(response):
+                return self._finish(response, decision, str(self._client._model))
+            decision.reason = VALIDATOR_REASON
+        try:
+            escalated = await self._aattempt(
+                self._escalation_client, method, args, self._escalation_timeout(started_at), decision
+            )
+        except RetryableError as e:
+            decision.fallback = self._outcome(e)
+            if response is None:
+                response = await self._aattempt(self._client, method, args, self._remaining(started_at), decision)
+            return self._finish(response, decision, str(self._client._model))
+        return self._finish(escalated, decision, str(self._escalation_client._model))
+
+    def completion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        return self._route("completion", (messages, tools, stop, tool_choice, response_format))
+
+    async def acompletion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        return await self._aroute("acompletion", (messages, tools, stop, tool_choice, response_format))
+
+    def tokenize(self, text: str) -> dict[str, Any]:
+        """Splits text into tokens with tokenizer of the cheap model"""
+        return self._client.tokenize(text)
+
+    async def atokenize(self, text: str) -> dict[str, Any]:
+        """Splits text into tokens with tokenizer of the cheap model"""
+        return await self._client.atokenize(text)
+
+    def completion_async(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        return self._route(
+            "completion_async",
+            (messages, tools, stop, None, None, tool_choice, response_format)
+        )
+
+    async def acompletion_async(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> dict[str, Any]:
+        return await self._aroute(
+            "acompletion_async",
+            (messages, tools, stop, None, None, tool_choice, response_format)
+        )
+
+    def stream_completion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> Iterator[dict[str, Any]]:
+        """Streams completion of the model chosen by predicates, validator and deadline
+        don't apply, escalated stream falls back only before the first chunk"""
+        decision = RoutingDecision()
+        decision.reason = self._policy.escalation_reason(messages, tools)
+        clients = [self._client] if decision.reason is None else [self._escalation_client, self._client]
+        for client in clients:
+            model = str(client._model)
+            started_at = time.monotonic()
+            chunks = client.stream_completion(messages, tools, stop, tool_choice, response_format)
+            try:
+                first = next(chunks, None)
+            except RetryableError as e:
+                self._record(decision, model, self._outcome(e), time.monotonic() - started_at)
+                if client is self._client:
+                    raise
+                decision.fallback = self._outcome(e)
+                continue
+            self._record(decision, model, OK_OUTCOME, time.monotonic() - started_at, {})
+            if first is not None:
+                yield self._finish_chunk(first, decision, model)
+            for chunk in chunks:
+                yield self._finish_chunk(chunk, decision, model)
+            return
+
+    async def astream_completion(
+            self,
+            messages: list[dict[str, str]],
+            tools: Optional[list[dict[str, Any]]] = None,
+            stop: Optional[list[str]] = None,
+            tool_choice: Optional[dict[str, Any]] = None,
+            response_format: Optional[dict[str, Any]] = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Streams completion of the model chosen by predicates, validator and deadline
+        don't apply, escalated stream falls back only before the first chunk"""
+        decision = RoutingDecision()
+        decision.reason = self._policy.escalation_reason(messages, tools)
+        clients = [self._client] if decision.reason is None else [self._escalation_client, self._client]
+        for client in clients:
+            model = str(client._model)
+            started_at = time.monotonic()
+            chunks = client.astream_completion(messages, tools, stop, tool_choice, response_format)
+            try:
+                first = await anext(chunks, None)
+            except RetryableError as e:
+                self._record(decision, model, self._outcome(e), time.monotonic() - started_at)
+                if client is self._client:
+                    raise
+                decision.fallback = self._outcome(e)
+                continue
+            self._record(decision, model, OK_OUTCOME, time.monotonic() - started_at, {})
+            if first is not None:
+                yield self._finish_chunk(first, decision, model)
+            async for chunk in chunks:
+                yield self._finish_chunk(chunk, decision, model)
+            return
+
+    def _partition(self, payloads: Iterable[dict[str, Any]]) -> tuple[list[BatchPart], dict[int, str]]:
+        """Splits batch by escalation predicates, validator and fallback don't apply to deferred batches"""
+        parts: list[BatchPart] = [(self._client, [], []), (self._escalation_client, [], [])]
+        for index, payload in enumerate(payloads):
+            reason = self._policy.escalation_reason(payload["messages"], payload.get("tools"))
+            _, indexes, part = parts[0 if reason is None else 1]
+            indexes.append(index)
+            part.append(payload)
+        models = {index: str(client._model) for client, indexes, _ in parts for index in indexes}
+        return parts, models
+
+    @staticmethod
+    def _with_model(item: BatchItem, models: dict[int, str]) -> BatchItem:
+        if item.result is not None:
+            item.result = {
+                **item.result,
+                CLIENT_INFO_KEY: {**item.result.get(CLIENT_INFO_KEY, {}), "model_name": models[item.index]}
+            }
+        return item
+
+    def batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> list[BatchItem]:
+        """Runs deferred completions split between models, returns outcomes in payloads order"""
+        items = self.iter_batch_completion_async(payloads, max_in_flight, polling_policy, cancel_event)
+        return sorted(items, key=lambda item: item.index)
+
+    def iter_batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[BatchItem]:
+        """Runs deferred completions split between models, yields outcomes as they are known"""
+        parts, models = self._partition(payloads)
+        for item in iter_batch_parts(parts, max_in_flight, polling_policy, cancel_event):
+            yield self._with_model(item, models)
+
+    async def abatch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> list[BatchItem]:
+        """Runs deferred completions split between models, returns outcomes in payloads order"""
+        items = [
+            item async for item in self.aiter_batch_completion_async(
+                payloads, max_in_flight, polling_policy, cancel_event
+            )
+        ]
+        return sorted(items, key=lambda item: item.index)
+
+    async def aiter_batch_completion_async(
+            self,
+            payloads: Iterable[dict[str, Any]],
+            max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+            polling_policy: Optional[PollingPolicy] = None,
+            cancel_event: Optional[asyncio.Event] = None
+    ) -> AsyncIterator[BatchItem]:
+        """Runs deferred completions split between models, yields outcomes as they are known"""
+        parts, models = self._partition(payloads)
+        async for item in aiter_batch_parts(parts, max_in_flight, polling_policy, cancel_event):
+            yield self._with_model(item, models)
+
+    def _shutdown_executor(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def close(self) -> None:
+        self._shutdown_executor()
+        self._client.close()
+        self._escalation_client.close()
+
+    async def aclose(self) -> None:
+        self._shutdown_executor()
+        await self._client.aclose()
+        await self._escalation_client.aclose()
+
+    def __enter__(self) -> "TieredFoundationModelClient":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "TieredFoundationModelClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
@@ -0,0 +1,278 @@
+from typing import Optional
+
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+
+from .exceptions import BudgetExceeded
+from .constants import FoundationModel, USAGE_PERIOD, USAGE_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Model, folder and caller tag usage is accounted by
+UsageKey = tuple[str, str, str]
+
+INPUT_TOKENS, OUTPUT_TOKENS, REASONING_TOKENS, REQUESTS = range(4)
+
+
+class TokenBudget:
+    """Tokens a caller may spend within ledger period
+
+        :param limit: Input and output tokens after which requests are rejected
+        :param downgrade_at: Tokens after which requests are sent to downgrade_model, None to never downgrade
+        :param downgrade_model: Cheaper model used once downgrade_at tokens are spent
+    """
+    def __init__(
+            self,
+            limit: int,
+            downgrade_at: Optional[int] = None,
+            downgrade_model: FoundationModel = FoundationModel.YANDEXGPT_LITE
+    ) -> None:
+        self.limit = limit
+        self.downgrade_at = downgrade_at
+        self.downgrade_model = downgrade_model
+
+
+class UsageLedger:
+    """Token usage accounted by model, folder and caller tag.
+
+    Requests add usage to counters of the process, which are flushed
+    in background to SQLite database shared by worker processes,
+    and totals of all processes are read back with every flush.
+    Budgets are checked against these totals before requests are sent,
+    so concurrent processes may overspend by usage not flushed yet.
+
+        :param path: Path to database file, None to account usage of the process only
+        :param budgets: Token budgets by caller tag
+        :param default_budget: Token budget of callers without their own one
+        :param period: Seconds after which usage starts anew, None to account it forever
+        :param flush_interval: Seconds between flushes to database
+    """
+    def __init__(
+            self,
+            path: Optional[str] = None,
+            budgets: Optional[dict[str, TokenBudget]] = None,
+            default_budget: Optional[TokenBudget] = None,
+            period: Optional[float] = USAGE_PERIOD,
+            flush_interval: float = USAGE_FLUSH_INTERVAL
+    ) -> None:
+        self._path = path
+        self._budgets = budgets or {}
+        self._default_budget = default_budget
+        self._period = period
+        self._flush_interval = flush_interval
+        self._period_start = self._get_period_start()
+        # Usage not flushed yet by start of period it was recorded in
+        self._pending: dict[float, dict[UsageKey, list[int]]] = {}
+        # Usage being written to database, counted until totals are read back
+        self._flushing: dict[float, dict[UsageKey, list[int]]] = {}
+        self._totals: dict[UsageKey, list[int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if path is not None:
+            with self._connect() as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS usage ("
+                    "period_start REAL NOT NULL, model TEXT NOT NULL, folder_id TEXT NOT NULL, "
+                    "tag TEXT NOT NULL, input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, "
+                    "reasoning_tokens INTEGER NOT NULL, requests INTEGER NOT NULL, "
+                    "PRIMARY KEY (period_start, model, folder_id, tag))"
+                )
+            self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _get_period_start(self) -> float:
+        if self._period is None:
+            return 0.0
+        return time.time() // self._period * self._period
+
+    def _roll_period(self) -> None:
+        """Starts new period when current one is over, called under lock"""
+        period_start = self._get_period_start()
+        if period_start != self._period_start:
+            self._period_start = period_start
+            self._totals = {}
+
+    def record(
+            self,
+            model: str,
+            input_tokens: int,
+            output_tokens: int,
+            reasoning_tokens: int = 0,
+            folder_id: Optional[str] = None,
+            tag: Optional[str] = None
+    ) -> None:
+        """Adds usage of one request"""
+        key = (str(model), folder_id or "", tag or "")
+        with self._lock:
+            self._roll_period()
+            counters = self._pending.setdefault(self._period_start, {}).setdefault(key, [0, 0, 0, 0])
+            counters[INPUT_TOKENS] += input_tokens
+            counters[OUTPUT_TOKENS] += output_tokens
+            counters[REASONING_TOKENS] += reasoning_tokens
+            counters[REQUESTS] += 1
+        if self._path is None:
+            self.flush()
+        elif self._thread is None:
+            self._start_flusher()
+
+    def usage(
+            self,
+            tag: Optional[str] = None,
+            model: Optional[str] = None,
+            folder_id: Optional[str] = None
+    ) -> dict[str, int]:
+        """Returns usage of current period, summed over keys matching given filters"""
+        usage = [0, 0, 0, 0]
+        with self._lock:
+            self._roll_period()
+            for counters in (
+                    self._totals,
+                    self._pending.get(self._period_start, {}),
+                    self._flushing.get(self._period_start, {})
+            ):
+                for (key_model, key_folder_id, key_tag), values in counters.items():
+                    if tag is not None and key_tag != tag:
+                        continue
+                    if model is not None and key_model != model:
+                        continue
+                    if folder_id is not None and key_folder_id != folder_id:
+                        continue
+                    for index, value in enumerate(values):
+                        usage[index] += value
+        return {
+            "input_tokens": usage[INPUT_TOKENS],
+            "output_tokens": usage[OUTPUT_TOKENS],
+            "reasoning_tokens": usage[REASONING_TOKENS],
+            "total_tokens": usage[INPUT_TOKENS] + usage[OUTPUT_TOKENS],
+            "requests": usage[REQUESTS]
+        }
+
+    def get_budget(self, tag: Optional[str]) -> Optional[TokenBudget]:
+        return self._budgets.get(tag or "", self._default_budget)
+
+    def admit(self, model: FoundationModel, tag: Optional[str] = None) -> FoundationModel:
+        """Checks budget of the caller before request is sent
+
+        :param model: Model the request is meant for
+        :param tag: Caller tag
+        :return: Model to send the request to, cheaper one when budget is nearly spent
+        :raises BudgetExceeded: When budget is spent
+        """
+        budget = self.get_budget(tag)
+        if budget is None:
+            return model
+        spent = self.usage(tag or "")["total_tokens"]
+        if spent >= budget.limit:
+            raise BudgetExceeded(f"Token budget of {tag or 'default caller'} is spent: {spent} of {budget.limit}")
+        if budget.downgrade_at is not None and spent >= budget.downgrade_at:
+            return budget.downgrade_model
+        return model
+
+    def flush(self) -> None:
+        """Writes usage of the process to database and reads totals of all processes"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._path is None:
+                    self._merge(self._totals, pending.get(self._period_start, {}))
+                    return
+                self._flushing = pending
+            try:
+                self._write(pending)
+            except sqlite3.Error:
+                with self._lock:
+                    self._flushing = {}
+                    for period_start, counters in pending.items():
+                        self._merge(self._pending.setdefault(period_start, {}), counters)
+                raise
+            self._load()
+
+    @staticmethod
+    def _merge(target: dict[UsageKey, list[int]], source: dict[UsageKey, list[int]]) -> None:
+        for key, values in source.items():
+            counters = target.setdefault(key, [0, 0, 0, 0])
+            for index, value in enumerate(values):
+                counters[index] += value
+
+    def _write(self, pending: dict[float, dict[UsageKey, list[int]]]) -> None:
+        if not pending:
+            return
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT INTO usage (period_start, model, folder_id, tag, input_tokens, output_tokens, "
+                "reasoning_tokens, requests) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (period_start, model, folder_id, tag) DO UPDATE SET "
+                "input_tokens = input_tokens + excluded.input_tokens, "
+                "output_tokens = output_tokens + excluded.output_tokens, "
+                "reasoning_tokens = reasoning_tokens + excluded.reasoning_tokens, "
+                "requests = requests + excluded.requests",
+                [
+                    (period_start, *key, *values)
+                    for period_start, counters in pending.items()
+                    for key, values in counters.items()
+                ]
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _load(self) -> None:
+        with self._lock:
+            self._roll_period()
+            period_start = self._period_start
+        rows = self._connect().execute(
+            "SELECT model, folder_id, tag, input_tokens, output_tokens, reasoning_tokens, requests "
+            "FROM usage WHERE period_start = ?",
+            (period_start,)
+        ).fetchall()
+        with self._lock:
+            self._flushing = {}
+            if period_start == self._period_start:
+                self._totals = {(model, folder_id, tag): list(values) for model, folder_id, tag, *values in rows}
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._stop.is_set():
+                return
+            self._thread = threading.Thread(
+                target=_run_flusher,
+                args=(weakref.ref(self), self._stop, self._flush_interval),
+                name="foundation-model-usage",
+                daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stops background flushing and flushes remaining usage"""
+        self._stop.set()
+        self.flush()
+
+
+def _run_flusher(reference: "weakref.ref[UsageLedger]", stop: threading.Event, interval: float) -> None:
+    """Flushes usage periodically, holding ledger weakly so forgotten ledger stops flushing"""
+    while not stop.wait(interval):
+        ledger = reference()
+        if ledger is None:
+            return
+        try:
+            ledger.flush()
+        except Exception as e:
+            logger.warning("Failed to flush token usage: %s", e)
+        del ledger
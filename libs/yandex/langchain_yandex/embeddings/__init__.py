@@ -0,0 +1,21 @@
+from typing import TYPE_CHECKING
+
+from .._imports import lazy_exports
+
+__all__ = (
+    "FoundationEmbeddings",
+    "BaseVectorCache",
+    "InMemoryVectorCache",
+    "MemmapVectorCache",
+)
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "FoundationEmbeddings": ".foundation",
+    "BaseVectorCache": ".cache",
+    "InMemoryVectorCache": ".cache",
+    "MemmapVectorCache": ".cache",
+})
+
+if TYPE_CHECKING:
+    from .foundation import FoundationEmbeddings
+    from .cache import BaseVectorCache, InMemoryVectorCache, MemmapVectorCache
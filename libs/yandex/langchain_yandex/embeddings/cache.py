@@ -0,0 +1,191 @@
+from typing import Any, Optional, Sequence
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from ..clients.foundation.constants import CACHE_MAXSIZE
+
+# Keys looked up by one query, below SQLite limit of query parameters
+KEYS_PER_QUERY = 500
+
+
+class BaseVectorCache:
+    """Base class of embedding vectors storage keyed by model and text hash"""
+    def get_many(self, keys: Sequence[str]) -> dict[str, list[float]]:
+        """Returns vectors of the keys which are cached"""
+        raise NotImplementedError
+
+    def set_many(self, vectors: dict[str, list[float]]) -> None:
+        raise NotImplementedError
+
+    def as_stored(self, vector: list[float]) -> list[float]:
+        """Returns vector as the cache reads it back, so fresh and cached vectors are equal"""
+        return vector
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryVectorCache(BaseVectorCache):
+    """Least recently used vector cache of the process
+
+        :param maxsize: Maximum number of cached vectors
+    """
+    def __init__(self, maxsize: int = CACHE_MAXSIZE) -> None:
+        self._maxsize = maxsize
+        self._vectors: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, list[float]]:
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                vector = self._vectors.get(key)
+                if vector is not None:
+                    self._vectors.move_to_end(key)
+                    vectors[key] = vector
+        return vectors
+
+    def set_many(self, vectors: dict[str, list[float]]) -> None:
+        with self._lock:
+            for key, vector in vectors.items():
+                self._vectors[key] = vector
+                self._vectors.move_to_end(key)
+            while len(self._vectors) > self._maxsize:
+                self._vectors.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors.clear()
+
+
+class MemmapVectorCache(BaseVectorCache):
+    """Vector cache on disk shared by worker processes.
+
+    Vectors are appended as float32 rows to a file read through numpy memmap,
+    so lookups copy only requested rows, and SQLite index maps keys to rows.
+    Vectors are never evicted, the cache grows with the embedded corpus.
+    Clearing the cache while other processes read it is not supported.
+
+        :param path: Directory of the vectors file and its index, created when missing
+    """
+    def __init__(self, path: str) -> None:
+        try:
+            import numpy
+        except ImportError as e:
+            raise ImportError(
+                "Memmap vector cache requires numpy, "
+                "install it with `pip install numpy`"
+            ) from e
+        self._numpy = numpy
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._index_path = os.path.join(path, "index.sqlite3")
+        self._matrix: Optional[Any] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        open(self._vectors_path, "ab").close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._index_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _get_dimension(connection: sqlite3.Connection) -> Optional[int]:
+        row = connection.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+        return None if row is None else row[0]
+
+    def _get_matrix(self, rows: int, dimension: int) -> Any:
+        """Returns memmap of vectors file holding at least given rows, remapped when the file has grown"""
+        with self._lock:
+            matrix = self._matrix
+            if matrix is None or matrix.shape[0] < rows or matrix.shape[1] != dimension:
+                size = os.path.getsize(self._vectors_path) // (dimension * 4)
+                matrix = self._numpy.memmap(self._vectors_path, dtype="<f4", mode="r", shape=(size, dimension))
+                self._matrix = matrix
+            return matrix
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, list[float]]:
+        connection = self._connect()
+        rows: list[tuple[str, int]] = []
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            chunk = keys[start:start + KEYS_PER_QUERY]
+            rows.extend(connection.execute(
+                f"SELECT key, row FROM vectors WHERE key IN ({', '.join('?' * len(chunk))})",
+                list(chunk)
+            ).fetchall())
+        if not rows:
+            return {}
+        matrix = self._get_matrix(max(row for _, row in rows) + 1, self._get_dimension(connection))
+        return {key: matrix[row].tolist() for key, row in rows}
+
+    def as_stored(self, vector: list[float]) -> list[float]:
+        return self._numpy.asarray(vector, dtype="<f4").tolist()
+
+    def set_many(self, vectors: dict[str, list[float]]) -> None:
+        if not vectors:
+            return
+        connection = self._connect()
+        # Write lock of the index serializes appends of all processes
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            dimension = self._get_dimension(connection)
+            if dimension is None:
+                dimension = len(next(iter(vectors.values())))
+                connection.execute("INSERT INTO meta (name, value) VALUES ('dimension', ?)", (dimension,))
+            keys = list(vectors)
+            existing = set()
+            for start in range(0, len(keys), KEYS_PER_QUERY):
+                chunk = keys[start:start + KEYS_PER_QUERY]
+                existing.update(key for key, in connection.execute(
+                    f"SELECT key FROM vectors WHERE key IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ))
+            keys = [key for key in keys if key not in existing]
+            if keys:
+                matrix = self._numpy.asarray([vectors[key] for key in keys], dtype="<f4")
+                if matrix.ndim != 2 or matrix.shape[1] != dimension:
+                    raise ValueError(f"Vectors of the cache must have {dimension} dimensions")
+                first_row = connection.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+                # Rows are written before they are indexed, so readers never see unwritten rows
+                with open(self._vectors_path, "r+b") as file:
+                    file.seek(first_row * dimension * 4)
+                    file.write(matrix.tobytes())
+                connection.executemany(
+                    "INSERT INTO vectors (key, row) VALUES (?, ?)",
+                    [(key, first_row + index) for index, key in enumerate(keys)]
+                )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def clear(self) -> None:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM vectors")
+            connection.execute("DELETE FROM meta")
+            with self._lock:
+                self._matrix = None
+                os.truncate(self._vectors_path, 0)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+
+def create_vector_key(model_uri: str, text: str) -> str:
+    """Returns hash of embedding model and text"""
+    return hashlib.sha256(f"{model_uri}\0{text}".encode()).hexdigest()
@@ -0,0 +1,176 @@
+from functools import cached_property
+from typing import Optional
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel, ConfigDict
+
+from .cache import BaseVectorCache, create_vector_key
+
+from ..clients.foundation import (
+    FoundationModelClient,
+    EmbeddingModel,
+    URL,
+    POOL_SIZE,
+    POOL_LIMIT_PER_HOST,
+    DNS_CACHE_TTL,
+    KEEPALIVE_TIMEOUT,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_WAVE_SIZE,
+    RateLimiter,
+    RetryPolicy,
+    BaseInstrumentation,
+    BaseCredentials,
+    get_rate_limiter
+)
+
+
+class FoundationEmbeddings(BaseModel, Embeddings):
+    """Yandex Foundation Models text embeddings.
+
+    API embeds one text per request, so documents are sent in waves of concurrent
+    requests within rate limits of the client and identical texts are sent once.
+    With vector_cache set texts embedded before are not sent again,
+    and vectors of every wave are cached as soon as it is done.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    folder_id: Optional[str] = None
+    api_key: Optional[str] = None
+    iam_token: Optional[str] = None
+    doc_model: EmbeddingModel = EmbeddingModel.TEXT_SEARCH_DOC
+    query_model: EmbeddingModel = EmbeddingModel.TEXT_SEARCH_QUERY
+    base_url: str = URL
+    timeout: Optional[float] = None
+    pool_size: int = POOL_SIZE
+    pool_limit_per_host: int = POOL_LIMIT_PER_HOST
+    dns_cache_ttl: Optional[int] = DNS_CACHE_TTL
+    keepalive_timeout: float = KEEPALIVE_TIMEOUT
+    # Requests sent at once and texts embedded between vector cache writes
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY
+    wave_size: int = EMBEDDING_WAVE_SIZE
+    client_rate_limiter: Optional[RateLimiter] = None
+    requests_per_second: Optional[float] = None
+    retry_policy: Optional[RetryPolicy] = None
+    instrumentation: Optional[BaseInstrumentation] = None
+    credentials: Optional[BaseCredentials] = None
+    vector_cache: Optional[BaseVectorCache] = None
+    # Ready client, e.g. one of chat model, whose connections and credentials are shared
+    client: Optional[FoundationModelClient] = None
+
+    @cached_property
+    def _client(self) -> FoundationModelClient:
+        """Returns given or created foundation model API client"""
+        return self.client or self._create_client()
+
+    def _get_rate_limiter(self) -> Optional[RateLimiter]:
+        """Returns explicit rate limiter or the one shared by folder embedding quota"""
+        if self.client_rate_limiter is not None:
+            return self.client_rate_limiter
+        if self.requests_per_second is None:
+            return None
+        return get_rate_limiter(self.folder_id, self.doc_model, requests_per_second=self.requests_per_second)
+
+    def _create_client(self) -> FoundationModelClient:
+        if self.folder_id is None:
+            raise ValueError("Either folder_id or client is required")
+        return FoundationModelClient(
+            folder_id=self.folder_id,
+            api_key=self.api_key,
+            iam_token=self.iam_token,
+            base_url=self.base_url,
+            timeout=self.timeout,
+            pool_size=self.pool_size,
+            pool_limit_per_host=self.pool_limit_per_host,
+            dns_cache_ttl=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            rate_limiter=self._get_rate_limiter(),
+            retry_policy=self.retry_policy,
+            instrumentation=self.instrumentation,
+            credentials=self.credentials
+        )
+
+    def _get_cached(
+            self,
+            texts: list[str],
+            model: EmbeddingModel
+    ) -> tuple[dict[str, str], dict[str, list[float]]]:
+        """Returns cache keys of unique texts and vectors of the texts found in cache"""
+        model_uri = self._client._get_embedding_model_uri(model)
+        keys = {text: create_vector_key(model_uri, text) for text in texts}
+        if self.vector_cache is None:
+            return keys, {}
+        cached = self.vector_cache.get_many(list(keys.values()))
+        return keys, {text: cached[key] for text, key in keys.items() if key in cached}
+
+    def _get_waves(self, texts: list[str], vectors: dict[str, list[float]]) -> list[list[str]]:
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+        return [missing[start:start + self.wave_size] for start in range(0, len(missing), self.wave_size)]
+
+    def _cache(self, keys: dict[str, str], vectors: dict[str, list[float]]) -> dict[str, list[float]]:
+        """Caches vectors of texts, returns them as the cache reads them back"""
+        if self.vector_cache is None:
+            return vectors
+        self.vector_cache.set_many({keys[text]: vector for text, vector in vectors.items()})
+        return {text: self.vector_cache.as_stored(vector) for text, vector in vectors.items()}
+
+    def _embed_text(self, text: str, model: EmbeddingModel) -> list[float]:
+        response = self._client.text_embedding(text, model)
+        return [float(value) for value in response["embedding"]]
+
+    async def _aembed_text(self, text: str, model: EmbeddingModel, semaphore: asyncio.Semaphore) -> list[float]:
+        async with semaphore:
+            response = await self._client.atext_embedding(text, model)
+        return [float(value) for value in response["embedding"]]
+
+    def _embed(self, texts: list[str], model: EmbeddingModel) -> list[list[float]]:
+        keys, vectors = self._get_cached(texts, model)
+        waves = self._get_waves(texts, vectors)
+        if waves:
+            with ThreadPoolExecutor(
+                    max_workers=min(self.max_concurrency, len(waves[0])),
+                    thread_name_prefix="foundation-model-embeddings"
+            ) as executor:
+                for wave in waves:
+                    # Contexts are copied in the calling thread, so workers see its context variables
+                    embedded = dict(zip(wave, executor.map(
+                        lambda pair: pair[1].run(self._embed_text, pair[0], model),
+                        [(text, copy_context()) for text in wave]
+                    )))
+                    vectors.update(self._cache(keys, embedded))
+        return [list(vectors[text]) for text in texts]
+
+    async def _aembed(self, texts: list[str], model: EmbeddingModel) -> list[list[float]]:
+        keys, vectors = self._get_cached(texts, model)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        for wave in self._get_waves(texts, vectors):
+            embedded = dict(zip(wave, await asyncio.gather(
+                *(self._aembed_text(text, model, semaphore) for text in wave)
+            )))
+            vectors.update(self._cache(keys, embedded))
+        return [list(vectors[text]) for text in texts]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, self.doc_model)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], self.query_model)[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._aembed(texts, self.doc_model)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self._aembed([text], self.query_model))[0]
+
+    def close(self) -> None:
+        """Close pooled connections of the API client created by the embeddings"""
+        if "_client" in self.__dict__ and self.client is None:
+            self._client.close()
+
+    async def aclose(self) -> None:
+        """Close pooled connections of the API client created by the embeddings"""
+        if "_client" in self.__dict__ and self.client is None:
+            await self._client.aclose()
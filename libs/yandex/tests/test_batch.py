@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.mock_server import MockFoundationModelServer, MockServerConfig
+from langchain_yandex.clients.foundation import FoundationModelClient, PollingPolicy, SQLiteOperationJournal
+
+BATCH_SIZE = 100
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockFoundationModelServer(MockServerConfig(operation_polls=2)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server, tmp_path):
+    client = FoundationModelClient(
+        folder_id="folder",
+        iam_token="token",
+        base_url=server.base_url,
+        operations_url=server.operations_url,
+        journal=SQLiteOperationJournal(str(tmp_path / "journal.sqlite3")),
+        polling_policy=PollingPolicy(first_delay=0.01, interval=0.01)
+    )
+    yield client
+    client.close()
+
+
+def identical_payloads() -> list[dict]:
+    return [{"messages": [{"role": "user", "text": "same"}]} for _ in range(BATCH_SIZE)]
+
+
+def check_items(items, server) -> None:
+    assert [item.index for item in items] == list(range(BATCH_SIZE))
+    assert all(item.ok for item in items)
+    assert len({item.operation_id for item in items}) == 1
+    assert server.stats["requests"] == 1
+
+
+def test_identical_payloads_share_journaled_operation(client, server):
+    server.reset_stats()
+    items = client.batch_completion_async(identical_payloads(), max_in_flight=16)
+    check_items(items, server)
+
+
+def test_identical_payloads_share_journaled_operation_async(client, server):
+    async def run():
+        try:
+            return await client.abatch_completion_async(identical_payloads(), max_in_flight=16)
+        finally:
+            await client.aclose()
+
+    server.reset_stats()
+    items = asyncio.run(run())
+    check_items(items, server)
+
+
+class ThreadRecordingJournal(SQLiteOperationJournal):
+    """Journal recording threads its methods run in"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.threads = set()
+
+    def find(self, key):
+        self.threads.add(threading.get_ident())
+        return super().find(key)
+
+    def add(self, key, operation_id):
+        self.threads.add(threading.get_ident())
+        super().add(key, operation_id)
+
+    def complete(self, operation_id, operation):
+        self.threads.add(threading.get_ident())
+        super().complete(operation_id, operation)
+
+    def get(self, operation_id):
+        self.threads.add(threading.get_ident())
+        return super().get(operation_id)
+
+    def pending(self):
+        self.threads.add(threading.get_ident())
+        return super().pending()
+
+
+def test_async_client_accesses_journal_off_event_loop(server, tmp_path):
+    journal = ThreadRecordingJournal(str(tmp_path / "journal.sqlite3"))
+    client = FoundationModelClient(
+        folder_id="folder",
+        iam_token="token",
+        base_url=server.base_url,
+        operations_url=server.operations_url,
+        journal=journal,
+        polling_policy=PollingPolicy(first_delay=0.01, interval=0.01)
+    )
+
+    async def run():
+        try:
+            items = await client.abatch_completion_async(identical_payloads()[:4])
+            await client.acompletion_async([{"role": "user", "text": "other"}])
+            resumed = [operation async for operation in client.aresume_operations()]
+            return items, resumed
+        finally:
+            await client.aclose()
+
+    loop_thread = threading.get_ident()
+    items, resumed = asyncio.run(run())
+    assert all(item.ok for item in items)
+    assert resumed == []
+    assert journal.threads
+    assert loop_thread not in journal.threads
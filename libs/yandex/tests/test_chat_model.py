@@ -0,0 +1,51 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.mock_server import MockFoundationModelServer, MockServerConfig
+from langchain_yandex.chat_model import ChatFoundationModel
+from langchain_yandex.clients.foundation import AsyncFoundationModelClient, SyncFoundationModelClient
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockFoundationModelServer(MockServerConfig()).start()
+    yield server
+    server.stop()
+
+
+def test_model_accepts_sync_client(server):
+    client = SyncFoundationModelClient(folder_id="folder", api_key="key", base_url=server.base_url)
+    model = ChatFoundationModel(client=client)
+    assert model.invoke("Hello").content
+    model.close()
+    asyncio.run(model.aclose())
+
+
+def test_model_accepts_async_client(server):
+    client = AsyncFoundationModelClient(folder_id="folder", api_key="key", base_url=server.base_url)
+    model = ChatFoundationModel(client=client)
+
+    async def run():
+        try:
+            return await model.ainvoke("Hello")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()).content
+    model.close()
+
+
+def test_model_module_does_not_load_clients():
+    code = (
+        "import sys\n"
+        "import langchain_yandex.chat_model.foundation\n"
+        "print(sorted(name for name in sys.modules if name.startswith('langchain_yandex.clients.foundation.')\n"
+        "    and name.endswith(('sync_client', 'async_client', '.client'))))"
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,50 @@
+import pytest
+
+from langchain_yandex.clients.foundation.codec import JSONCodec, MsgspecCodec, OrjsonCodec, msgspec, orjson
+
+COMPLETION = (
+    '{"result":{"alternatives":[{"message":{"role":"assistant","text":"Привет"},'
+    '"status":"ALTERNATIVE_STATUS_FINAL","score":0.5}],'
+    '"usage":{"inputTextTokens":"12","completionTokens":"3","totalTokens":"15",'
+    '"completionTokensDetails":{"reasoningTokens":"0"}},"modelVersion":"23.10.2024"}}'
+).encode()
+
+OPERATION = (
+    '{"id":"op","done":true,"metadata":null,"createdAt":"2024-01-01T00:00:00Z",'
+    '"response":{"@type":"type.googleapis.com/CompletionResponse",'
+    '"alternatives":[],"usage":{"totalTokens":"7"}}}'
+).encode()
+
+
+def _codecs():
+    codecs = []
+    if orjson is not None:
+        codecs.append(OrjsonCodec())
+    if msgspec is not None:
+        codecs.append(MsgspecCodec())
+    return codecs
+
+
+@pytest.fixture(params=_codecs(), ids=lambda codec: codec.name)
+def codec(request):
+    return request.param
+
+
+def test_decode_completion_matches_json(codec):
+    expected = JSONCodec().decode_completion(COMPLETION)
+    decoded = codec.decode_completion(COMPLETION)
+    assert decoded == expected
+    assert decoded["result"]["alternatives"][0]["score"] == 0.5
+    assert decoded["result"]["usage"]["totalTokens"] == "15"
+
+
+def test_decode_operation_matches_json(codec):
+    expected = JSONCodec().decode_operation(OPERATION)
+    decoded = codec.decode_operation(OPERATION)
+    assert decoded == expected
+    assert decoded["response"]["@type"] == "type.googleapis.com/CompletionResponse"
+
+
+def test_dumps_matches_json(codec):
+    value = JSONCodec().loads(COMPLETION)
+    assert codec.dumps(value) == JSONCodec().dumps(value) == COMPLETION
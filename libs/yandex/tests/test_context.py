@@ -0,0 +1,131 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from langchain_yandex.chat_model import (
+    BaseTokenCounter,
+    ContextWindow,
+    DropToolResultsStrategy,
+    SummarizeStrategy,
+    TokenizerTokenCounter,
+    TrimStrategy
+)
+from langchain_yandex.chat_model.context import TOOL_RESULT_PLACEHOLDER
+
+
+class ContentTokenCounter(BaseTokenCounter):
+    """Counts one token per character of message content"""
+    def __init__(self) -> None:
+        self.counted = []
+
+    def count(self, messages, client=None):
+        self.counted.extend(messages)
+        return [len(message.content) for message in messages]
+
+
+class FakeTokenizeClient:
+    _model_uri = "gpt://folder/yandexgpt-lite"
+
+    def __init__(self) -> None:
+        self.tokenized = []
+
+    def tokenize(self, text):
+        self.tokenized.append(text)
+        return {"tokens": text.split()}
+
+    async def atokenize(self, text):
+        return self.tokenize(text)
+
+
+def tool_turn(call_id: str, result: str) -> list:
+    return [
+        AIMessage(content="", tool_calls=[{"name": "search", "args": {"query": call_id}, "id": call_id}]),
+        ToolMessage(content=result, tool_call_id=call_id, name="search")
+    ]
+
+
+def test_drop_tool_results_counts_placeholder_with_configured_counter():
+    messages = [HumanMessage(content="question"), *tool_turn("a", "x" * 100), *tool_turn("b", "y" * 100)]
+    counter = ContentTokenCounter()
+    counts = counter.count(messages)
+    budget = sum(counts) - 100 + len(TOOL_RESULT_PLACEHOLDER)
+    strategy = DropToolResultsStrategy(keep_last=0)
+    result = strategy.apply(messages, counts, budget, counter)
+    assert result[2].content == TOOL_RESULT_PLACEHOLDER
+    assert result[2].tool_call_id == "a"
+    assert result[4] is messages[4]
+    assert result[2] in counter.counted
+
+
+def test_drop_tool_results_keeps_latest():
+    messages = [HumanMessage(content="question"), *tool_turn("a", "x" * 100), *tool_turn("b", "y" * 100)]
+    counts = ContentTokenCounter().count(messages)
+    result = asyncio.run(DropToolResultsStrategy(keep_last=1).aapply(messages, counts, 0, ContentTokenCounter()))
+    assert result[2].content == TOOL_RESULT_PLACEHOLDER
+    assert result[4] is messages[4]
+    assert result[0] is messages[0]
+
+
+def test_trim_drops_tool_results_with_their_calls():
+    system = SystemMessage(content="system")
+    last = HumanMessage(content="last question")
+    messages = [system, HumanMessage(content="question"), *tool_turn("a", "result"), last]
+    counts = [1, 10, 10, 10, 1]
+    result = TrimStrategy(keep_last=1).apply(messages, counts, budget=12)
+    assert result == [system, last]
+    assert not any(isinstance(message, ToolMessage) for message in result)
+
+
+def test_trim_keeps_system_and_latest_messages():
+    messages = [SystemMessage(content="system"), *(HumanMessage(content=str(index)) for index in range(5))]
+    result = TrimStrategy(keep_last=2).apply(messages, [1] * 6, budget=0)
+    assert result == [messages[0], *messages[-2:]]
+
+
+def test_summarize_reuses_previous_summary():
+    calls = []
+
+    def summarizer(messages):
+        calls.append(messages)
+        return f"summary {len(calls)}"
+
+    strategy = SummarizeStrategy(summarizer, keep_last=1)
+    messages = [SystemMessage(content="system"), *(HumanMessage(content=str(index)) for index in range(3))]
+    result = strategy.apply(messages, [1] * 4, budget=2)
+    assert [message.content for message in result][1:] == ["Summary of the earlier conversation:\nsummary 1", "2"]
+    assert calls[0] == messages[1:3]
+
+    assert strategy.apply(messages, [1] * 4, budget=2)[1] is result[1]
+    assert len(calls) == 1
+
+    extended = [*messages, HumanMessage(content="3")]
+    strategy.apply(extended, [1] * 5, budget=2)
+    assert calls[1] == [result[1], messages[3]]
+
+
+def test_tokenizer_counter_caches_counts():
+    client = FakeTokenizeClient()
+    counter = TokenizerTokenCounter(client)
+    messages = [HumanMessage(content="one two"), HumanMessage(content="three")]
+    first = counter.count(messages)
+    assert sorted(client.tokenized) == ["one two", "three"]
+    assert counter.count(messages) == first
+    assert asyncio.run(counter.acount([*messages, HumanMessage(content="four five six")])) == [*first, first[1] + 2]
+    assert len(client.tokenized) == 3
+
+
+def test_tokenizer_counter_evicts_oldest_counts():
+    client = FakeTokenizeClient()
+    counter = TokenizerTokenCounter(client, cache_size=1)
+    counter.count([HumanMessage(content="one")])
+    counter.count([HumanMessage(content="two")])
+    counter.count([HumanMessage(content="one")])
+    assert client.tokenized == ["one", "two", "one"]
+
+
+def test_context_window_passes_counter_to_strategies():
+    messages = [HumanMessage(content="question"), *tool_turn("a", "x" * 100), HumanMessage(content="last")]
+    counter = ContentTokenCounter()
+    window = ContextWindow([DropToolResultsStrategy(keep_last=0)], counter=counter)
+    result = window.fit(messages, budget=len("question") + len(TOOL_RESULT_PLACEHOLDER) + len("last"))
+    assert result[2].content == TOOL_RESULT_PLACEHOLDER
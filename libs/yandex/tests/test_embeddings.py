@@ -0,0 +1,40 @@
+from contextvars import ContextVar
+
+import pytest
+
+from benchmarks.mock_server import MockFoundationModelServer, MockServerConfig
+from langchain_yandex.clients.foundation import FoundationModelClient
+from langchain_yandex.embeddings import FoundationEmbeddings
+
+request_tag: ContextVar[str] = ContextVar("request_tag", default="unset")
+
+
+class TagRecordingClient(FoundationModelClient):
+    """Client recording context variable seen by every embedding request"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.tags = []
+
+    def text_embedding(self, *args, **kwargs):
+        self.tags.append(request_tag.get())
+        return super().text_embedding(*args, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockFoundationModelServer(MockServerConfig()).start()
+    yield server
+    server.stop()
+
+
+def test_embedding_requests_see_caller_context(server):
+    client = TagRecordingClient(folder_id="folder", api_key="key", base_url=server.base_url)
+    embeddings = FoundationEmbeddings(client=client, max_concurrency=4, wave_size=4)
+    token = request_tag.set("caller")
+    try:
+        vectors = embeddings.embed_documents([f"text {index}" for index in range(10)])
+    finally:
+        request_tag.reset(token)
+        client.close()
+    assert len(vectors) == 10
+    assert client.tags == ["caller"] * 10
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_server import MockFoundationModelServer, MockServerConfig
+from langchain_yandex.clients.foundation import FoundationModelClient, RoutingFoundationModelClient
+from langchain_yandex.clients.foundation.exceptions import ServerError, ServiceUnavailable
+
+MESSAGES = [{"role": "user", "text": "Hello"}]
+
+
+class FakeEndpointClient(FoundationModelClient):
+    """Client counting submitted operations, its submit or poll may fail"""
+    def __init__(self, *args, submitted: list, submit_error=None, poll_error=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.submitted = submitted
+        self.submit_error = submit_error
+        self.poll_error = poll_error
+
+    def submit_completion_async(self, *args, **kwargs) -> str:
+        if self.submit_error is not None:
+            raise self.submit_error
+        self.submitted.append(self)
+        return super().submit_completion_async(*args, **kwargs)
+
+    async def asubmit_completion_async(self, *args, **kwargs) -> str:
+        if self.submit_error is not None:
+            raise self.submit_error
+        self.submitted.append(self)
+        return await super().asubmit_completion_async(*args, **kwargs)
+
+    def wait_operation(self, *args, **kwargs) -> dict:
+        if self.poll_error is not None:
+            raise self.poll_error
+        return super().wait_operation(*args, **kwargs)
+
+    async def await_operation(self, *args, **kwargs) -> dict:
+        if self.poll_error is not None:
+            raise self.poll_error
+        return await super().await_operation(*args, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockFoundationModelServer(MockServerConfig(operation_polls=1)).start()
+    yield server
+    server.stop()
+
+
+def create_client(server, submitted, **kwargs) -> FakeEndpointClient:
+    return FakeEndpointClient(
+        folder_id="folder",
+        iam_token="token",
+        base_url=server.base_url,
+        operations_url=server.operations_url,
+        submitted=submitted,
+        **kwargs
+    )
+
+
+def test_poll_error_does_not_resubmit_operation(server):
+    submitted = []
+    first = create_client(server, submitted, poll_error=ServerError("poll failed"))
+    second = create_client(server, submitted, poll_error=ServerError("poll failed"))
+    with RoutingFoundationModelClient([first, second]) as client:
+        with pytest.raises(ServerError):
+            client.completion_async(MESSAGES)
+        assert len(submitted) == 1
+        with pytest.raises(ServerError):
+            asyncio.run(client.acompletion_async(MESSAGES))
+        assert len(submitted) == 2
+
+
+def test_rejected_submit_fails_over(server):
+    submitted = []
+    rejected = create_client(server, submitted, submit_error=ServiceUnavailable("overloaded"))
+    accepting = create_client(server, submitted)
+    with RoutingFoundationModelClient([rejected, accepting]) as client:
+        response = client.completion_async(MESSAGES)
+    assert response["result"]["alternatives"]
+    assert submitted == [accepting]
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from langchain_yandex.clients.foundation import Priority, RequestScheduler
+from langchain_yandex.clients.foundation.exceptions import DeadlineExceeded
+
+
+def hold_slot(scheduler: RequestScheduler, seconds: float) -> None:
+    with scheduler.slot(Priority.INTERACTIVE):
+        time.sleep(seconds)
+
+
+def acquire_in_background(scheduler: RequestScheduler, deadline: float) -> tuple[threading.Thread, list]:
+    outcome: list = []
+
+    def acquire() -> None:
+        try:
+            scheduler.release(scheduler.acquire(Priority.INTERACTIVE, deadline=deadline))
+            outcome.append("admitted")
+        except DeadlineExceeded:
+            outcome.append("dropped")
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    return thread, outcome
+
+
+def test_slow_request_does_not_drop_requests_while_idle():
+    scheduler = RequestScheduler(max_concurrency=2, reserved_interactive=0)
+    hold_slot(scheduler, 0.3)
+    for _ in range(5):
+        request = scheduler.acquire(Priority.INTERACTIVE, deadline=time.monotonic() + 0.05)
+        scheduler.release(request)
+    assert scheduler.stats()[str(Priority.INTERACTIVE)]["dropped"] == 0
+
+
+def test_request_with_passed_deadline_is_dropped():
+    scheduler = RequestScheduler(max_concurrency=2, reserved_interactive=0)
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire(Priority.INTERACTIVE, deadline=time.monotonic() - 1)
+
+
+def test_queued_request_is_dropped_when_usual_latency_misses_deadline():
+    scheduler = RequestScheduler(max_concurrency=1, reserved_interactive=0)
+    hold_slot(scheduler, 0.3)
+    request = scheduler.acquire(Priority.INTERACTIVE)
+    thread, outcome = acquire_in_background(scheduler, time.monotonic() + 0.2)
+    time.sleep(0.05)
+    scheduler.release(request)
+    thread.join()
+    assert outcome == ["dropped"]
+
+
+def test_latency_estimate_fades_without_completed_requests():
+    scheduler = RequestScheduler(max_concurrency=1, reserved_interactive=0, latency_half_life=0.05)
+    hold_slot(scheduler, 0.3)
+    time.sleep(0.3)
+    request = scheduler.acquire(Priority.INTERACTIVE)
+    thread, outcome = acquire_in_background(scheduler, time.monotonic() + 0.2)
+    time.sleep(0.05)
+    scheduler.release(request)
+    thread.join()
+    assert outcome == ["admitted"]
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, Field
+
+from langchain_yandex.chat_model import ChatFoundationModel
+from langchain_yandex.chat_model.structured import IncrementalJsonParser, StructuredOutputParser
+from langchain_yandex.clients.foundation import SyncFoundationModelClient
+
+DOCUMENT = '{"name": "Ann \\"A\\"", "age": 31, "tags": ["a", {"b": [1, 2.5, null]}], "ok": true, "none": {}}'
+
+
+class Person(BaseModel):
+    name: str
+    age: int = Field(ge=0)
+    tags: list[str] = []
+
+
+class CannedClient(SyncFoundationModelClient):
+    """Client answering every request with the same text, streamed by pieces"""
+    def __init__(self, text: str, piece: int = 4) -> None:
+        super().__init__(folder_id="folder", api_key="key")
+        self.text = text
+        self.piece = piece
+        self.response_formats = []
+
+    def _response(self, text, status):
+        return {"result": {
+            "alternatives": [{"message": {"role": "assistant", "text": text}, "status": status}],
+            "usage": {"inputTextTokens": "1", "completionTokens": "1", "totalTokens": "2"}
+        }}
+
+    def completion(self, messages, tools=None, stop=None, tool_choice=None, response_format=None):
+        self.response_formats.append(response_format)
+        return self._response(self.text, "ALTERNATIVE_STATUS_FINAL")
+
+    def stream_completion(self, messages, tools=None, stop=None, tool_choice=None, response_format=None):
+        self.response_formats.append(response_format)
+        for end in range(self.piece, len(self.text), self.piece):
+            yield self._response(self.text[:end], "ALTERNATIVE_STATUS_PARTIAL")
+        yield self._response(self.text, "ALTERNATIVE_STATUS_FINAL")
+
+
+def feed(text, piece):
+    parser = IncrementalJsonParser()
+    for start in range(0, len(text), piece):
+        parser.feed(text[start:start + piece])
+    return parser.close()
+
+
+@pytest.mark.parametrize("piece", [1, 2, 7, len(DOCUMENT)])
+def test_parser_matches_json(piece):
+    assert feed(DOCUMENT, piece) == json.loads(DOCUMENT)
+
+
+def test_parser_skips_text_around_document():
+    assert feed('```json\n[1, "x", []]\n```', 3) == [1, "x", []]
+
+
+@pytest.mark.parametrize("text", ['{"a": 1,}', "[1,]", '{"a": [1, 2,]}', '[{"a": 1,}]', "[,]", '{,"a": 1}'])
+def test_parser_rejects_misplaced_commas(text):
+    with pytest.raises(ValueError):
+        feed(text, 1)
+
+
+def test_snapshot_copies_only_open_containers():
+    parser = IncrementalJsonParser()
+    parser.feed('{"done": {"x": [1]}, "open": [1, ')
+    snapshot = parser.snapshot()
+    parser.feed('2], "more": 3}')
+    assert snapshot == {"done": {"x": [1]}, "open": [1]}
+    assert snapshot["done"] is parser.value["done"]
+    assert parser.snapshot() is parser.value
+
+
+def test_stream_yields_partial_per_top_level_field():
+    parser = StructuredOutputParser(pydantic_object=Person)
+    chunks = ['{"name": "Ann", ', '"tags": ["a", ', '"b"], ', '"age": 3', "1}"]
+    *partials, result = parser.transform(iter(chunks))
+    assert partials == [{"name": "Ann"}, {"name": "Ann", "tags": ["a", "b"]}]
+    assert result == Person(name="Ann", age=31, tags=["a", "b"])
+
+
+def test_stream_throttles_nested_partials():
+    parser = StructuredOutputParser(partial_interval=10)
+    chunks = ['{"items": [', "1, ", "2, ", "3, ", "4, ", "5, ", "6]}"]
+    *partials, result = parser.transform(iter(chunks))
+    assert partials == [{"items": [1]}, {"items": [1, 2, 3, 4, 5]}]
+    assert result == {"items": [1, 2, 3, 4, 5, 6]}
+
+
+def test_stream_stops_at_invalid_field():
+    parser = StructuredOutputParser(pydantic_object=Person)
+
+    def chunks():
+        yield '{"age": -1, '
+        raise AssertionError("stream was not stopped")
+
+    with pytest.raises(OutputParserException, match="age"):
+        list(parser.transform(chunks()))
+
+
+def test_json_schema_checks_required_fields():
+    parser = StructuredOutputParser(json_schema={
+        "type": "object", "properties": {"a": {"type": "integer"}}, "required": ["a", "b"]
+    })
+    with pytest.raises(OutputParserException, match="missing required fields b"):
+        parser.parse('{"a": 1}')
+
+
+def test_with_structured_output_invoke_and_stream():
+    client = CannedClient('{"name": "Ann", "age": 31, "tags": ["x"]}')
+    model = ChatFoundationModel(client=client).with_structured_output(Person)
+    assert model.invoke("Who?") == Person(name="Ann", age=31, tags=["x"])
+    *partials, result = model.stream("Who?")
+    assert partials == [{"name": "Ann"}, {"name": "Ann", "age": 31}, {"name": "Ann", "age": 31, "tags": ["x"]}]
+    assert result == Person(name="Ann", age=31, tags=["x"])
+    assert all(response_format["jsonSchema"]["schema"]["required"] == ["name", "age"]
+               for response_format in client.response_formats)
+
+
+def test_with_structured_output_include_raw():
+    client = CannedClient('{"name": "Ann", "age": "old"}')
+    model = ChatFoundationModel(client=client).with_structured_output(Person, include_raw=True)
+    output = model.invoke("Who?")
+    assert output["parsed"] is None
+    assert isinstance(output["parsing_error"], OutputParserException)
+    assert output["raw"].content == '{"name": "Ann", "age": "old"}'
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+
+from langchain_yandex.chat_model import ChatFoundationModel, ToolRunner
+from langchain_yandex.chat_model.serialization import serialize_messages
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Adds two numbers"""
+    return a + b
+
+
+@tool
+async def multiply(a: int, b: int) -> int:
+    """Multiplies two numbers"""
+    await asyncio.sleep(0.05)
+    return a * b
+
+
+@tool
+def sleep(seconds: float) -> str:
+    """Sleeps given seconds"""
+    time.sleep(seconds)
+    return "woke up"
+
+
+@tool
+async def asleep(seconds: float) -> str:
+    """Sleeps given seconds asynchronously"""
+    await asyncio.sleep(seconds)
+    return "woke up"
+
+
+@tool
+def fail() -> str:
+    """Always fails"""
+    raise RuntimeError("tool failed")
+
+
+def create_runner(**kwargs) -> ToolRunner:
+    model = ChatFoundationModel(folder_id="folder", api_key="key")
+    return ToolRunner(model, [add, multiply, sleep, asleep, fail], **kwargs)
+
+
+def create_message(*tool_calls: tuple[str, dict]) -> AIMessage:
+    return AIMessage(
+        content="",
+        tool_calls=[
+            {"name": name, "args": args, "id": f"call-{index}"}
+            for index, (name, args) in enumerate(tool_calls)
+        ]
+    )
+
+
+def test_mixed_turn_results_are_packed_in_one_message():
+    message = create_message(("multiply", {"a": 2, "b": 3}), ("add", {"a": 1, "b": 2}))
+    with create_runner() as runner:
+        results = asyncio.run(runner.aexecute(message))
+        assert runner.execute(message) == results
+    assert [result.content for result in results] == ["6", "3"]
+    assert [result.tool_call_id for result in results] == ["call-0", "call-1"]
+    serialized = serialize_messages([message, *results])
+    assert len(serialized) == 2
+    tool_results = serialized[1]["toolResultList"]["toolResults"]
+    assert [result["functionResult"]["content"] for result in tool_results] == ["6", "3"]
+
+
+def test_calls_of_one_turn_run_concurrently():
+    message = create_message(("asleep", {"seconds": 0.2}), ("sleep", {"seconds": 0.2}), ("sleep", {"seconds": 0.2}))
+    with create_runner() as runner:
+        started_at = time.monotonic()
+        asyncio.run(runner.aexecute(message))
+        assert time.monotonic() - started_at < 0.35
+        started_at = time.monotonic()
+        runner.execute(message)
+        assert time.monotonic() - started_at < 0.35
+
+
+def test_per_tool_timeouts():
+    message = create_message(("sleep", {"seconds": 0.3}), ("asleep", {"seconds": 0.3}), ("add", {"a": 1, "b": 1}))
+    with create_runner(timeouts={"sleep": 0.05, "asleep": 0.05}) as runner:
+        for results in (runner.execute(message), asyncio.run(runner.aexecute(message))):
+            assert [result.status for result in results] == ["error", "error", "success"]
+            assert "timed out after 0.05 seconds" in results[0].content
+            assert results[2].content == "2"
+
+
+def test_errors_are_raised_without_handling():
+    message = create_message(("add", {"a": 1, "b": 1}), ("fail", {}))
+    with create_runner(handle_errors=False) as runner:
+        with pytest.raises(RuntimeError, match="tool failed"):
+            runner.execute(message)
+        with pytest.raises(RuntimeError, match="tool failed"):
+            asyncio.run(runner.aexecute(message))
+    with create_runner(handle_errors=False, timeout=0.05) as runner:
+        with pytest.raises(TimeoutError):
+            runner.execute(create_message(("sleep", {"seconds": 0.3})))
+
+
+def test_errors_are_returned_to_model():
+    with create_runner() as runner:
+        results = runner.execute(create_message(("fail", {}), ("unknown", {})))
+    assert [result.status for result in results] == ["error", "error"]
+    assert results[0].content == "Error: tool failed"
+
+
+def test_tool_message_results_are_not_mutated():
+    result = ToolMessage(content="done", tool_call_id="call-0")
+    with create_runner() as runner:
+        created = runner._create_result({"name": "add", "args": {}, "id": "call-0"}, result)
+    assert created.name == "add"
+    assert result.name is None
@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+
+import pytest
+
+from langchain_yandex.clients.foundation import TokenBudget, UsageLedger
+from langchain_yandex.clients.foundation.exceptions import BudgetExceeded
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "usage.sqlite3"), budgets={"tenant": TokenBudget(limit=100)})
+    yield ledger
+    ledger.close()
+
+
+def test_usage_is_visible_while_it_is_flushed(ledger, monkeypatch):
+    ledger.record("yandexgpt-lite", 60, 40, tag="tenant")
+    writing = threading.Event()
+    resume = threading.Event()
+    write = ledger._write
+
+    def slow_write(pending):
+        writing.set()
+        resume.wait(5)
+        write(pending)
+
+    monkeypatch.setattr(ledger, "_write", slow_write)
+    flusher = threading.Thread(target=ledger.flush)
+    flusher.start()
+    assert writing.wait(5)
+    try:
+        assert ledger.usage("tenant")["total_tokens"] == 100
+        with pytest.raises(BudgetExceeded):
+            ledger.admit("yandexgpt-lite", "tenant")
+    finally:
+        resume.set()
+        flusher.join()
+    assert ledger.usage("tenant")["total_tokens"] == 100
+
+
+def test_failed_flush_keeps_usage_pending(ledger, monkeypatch):
+    ledger.record("yandexgpt-lite", 10, 5, tag="tenant")
+
+    def failing_write(pending):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(ledger, "_write", failing_write)
+    with pytest.raises(sqlite3.OperationalError):
+        ledger.flush()
+    assert ledger.usage("tenant")["total_tokens"] == 15
+    monkeypatch.undo()
+    ledger.flush()
+    assert ledger.usage("tenant") == {
+        "input_tokens": 10,
+        "output_tokens": 5,
+        "reasoning_tokens": 0,
+        "total_tokens": 15,
+        "requests": 1
+    }